@@ -0,0 +1,359 @@
+"""
+Microbenchmarks of the RunningMate hot path, written as JSON and compared
+against a baseline run.
+
+    python -m benchmarks.hotpath --output results.json
+    python -m benchmarks.hotpath --output new.json --baseline results.json
+
+With --baseline, each benchmark's median is compared with the baseline's, and
+the run exits with status 1 when any is slower by more than --threshold.
+--quick runs small sizes and few rounds, as a smoke test.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from itertools import product
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd  # type: ignore
+import peewee  # type: ignore
+
+from mate.alerts import (
+    Alert,
+    AlertWebhookTarget,
+    FeatureAlertKind,
+    SlackAlertTarget,
+    TerminalAlertTarget,
+)
+from mate.backends import MemoryBackend, SqliteBackend
+from mate.db import (
+    FeatureAlert,
+    FeatureValue,
+    Mate,
+    connect_db,
+    db,
+    get_features,
+    version_or_create_mate,
+)
+from mate.generators import generate_baseline_stats
+from mate.reports import generate_feature_stats_summary_report
+from mate.run import RunningMate
+
+DATA = pathlib.Path(__file__).parent.parent / "examples" / "_data"
+
+# a benchmark is slower than its baseline when its median is more than this
+# fraction above the baseline's
+REGRESSION_THRESHOLD = 0.2
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: Dict[str, Any]
+    timings: List[float] = field(repr=False)
+    # rows processed per call, for throughput
+    rows: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{name}={value}" for name, value in self.params.items())
+        return f"{self.name}[{params}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        median = statistics.median(self.timings)
+        result = {
+            "name": self.name,
+            "params": self.params,
+            "rounds": len(self.timings),
+            "min": min(self.timings),
+            "median": median,
+            "mean": statistics.mean(self.timings),
+            "stdev": statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0,
+        }
+        if self.rows is not None:
+            result["rows_per_second"] = self.rows / median
+
+        return result
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+
+def make_frame(rows: int, features: int, seed: int = 0) -> pd.DataFrame:
+    """
+    `rows` rows of the insurance data (without the target), widened to
+    `features` columns by repeating its columns.
+    """
+    insurance = pd.read_csv(DATA / "insurance.csv").drop(["charges"], axis=1)
+    sample = insurance.sample(rows, replace=True, random_state=seed)
+    names = list(insurance.columns)
+
+    columns = {}
+    for i in range(features):
+        source = names[i % len(names)]
+        columns[source if i < len(names) else f"{source}_{i}"] = sample[
+            source
+        ].to_numpy()
+
+    return pd.DataFrame(columns)
+
+
+def _time(function: Callable[[], Any], rounds: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        function()
+
+    timings = []
+    for _ in range(rounds):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+
+    return timings
+
+
+def _connect(backend: str, path: pathlib.Path):
+    if db.obj is not None:
+        db.close()
+    connect_db(MemoryBackend() if backend == "memory" else SqliteBackend(path))
+
+
+def _prepare_mate(features: int, training_rows: int) -> Mate:
+    mate = version_or_create_mate(f"bench-{features}")
+    generate_baseline_stats(make_frame(training_rows, features, seed=1), mate.name)
+
+    return mate
+
+
+def bench_running_mate(
+    backends: List[str],
+    feature_counts: List[int],
+    row_counts: List[int],
+    rounds: int,
+    directory: pathlib.Path,
+) -> Iterator[BenchmarkResult]:
+    """
+    RunningMate construction (checks and recording) and __exit__ (runtime
+    update and alert delivery, with no targets).
+    """
+    for backend, features in product(backends, feature_counts):
+        _connect(backend, directory / f"mate-{features}.db")
+        name = _prepare_mate(features, 2000).name
+
+        for rows, save_all in product(row_counts, (False, True)):
+            df = make_frame(rows, features, seed=2)
+            params = {
+                "backend": backend,
+                "features": features,
+                "rows": rows,
+                "save_all": save_all,
+            }
+
+            def construct():
+                return RunningMate(
+                    name, 1, df, [], should_save_all_feature_values=save_all
+                )
+
+            yield BenchmarkResult(
+                "running_mate_init", params, _time(construct, rounds), rows
+            )
+
+            def enter_exit():
+                running_mate = construct()
+                start = perf_counter()
+                running_mate.__enter__()
+                running_mate.__exit__(None, None, None)
+                return perf_counter() - start
+
+            enter_exit()
+            yield BenchmarkResult(
+                "running_mate_exit",
+                params,
+                [enter_exit() for _ in range(rounds)],
+            )
+
+
+def bench_baseline_stats(
+    feature_counts: List[int], row_counts: List[int], rounds: int
+) -> Iterator[BenchmarkResult]:
+    connect_db(MemoryBackend())
+
+    for features, rows in product(feature_counts, row_counts):
+        df = make_frame(rows, features)
+        name = f"baseline-{features}-{rows}"
+        version_or_create_mate(name)
+
+        yield BenchmarkResult(
+            "generate_baseline_stats",
+            {"features": features, "rows": rows},
+            _time(lambda: generate_baseline_stats(df, name), rounds, warmup=0),
+            rows,
+        )
+
+
+def bench_report(feature_counts: List[int], rounds: int) -> Iterator[BenchmarkResult]:
+    connect_db(MemoryBackend())
+
+    for features in feature_counts:
+        name = _prepare_mate(features, 2000).name
+
+        yield BenchmarkResult(
+            "summary_report",
+            {"features": features},
+            _time(lambda: generate_feature_stats_summary_report(name), rounds),
+        )
+
+
+def bench_alert_formatting(
+    alert_counts: List[int], rounds: int
+) -> Iterator[BenchmarkResult]:
+    """
+    Formatting only; nothing is sent.
+    """
+    connect_db(MemoryBackend())
+    mate = _prepare_mate(6, 2000)
+    features = get_features(mate)
+    targets = {
+        "terminal": TerminalAlertTarget(),
+        "webhook": AlertWebhookTarget("http://localhost/alerts"),
+        "slack": SlackAlertTarget("/XXXXX/XXXXXX/XXXXXXXXXXXXXXXXXXXX"),
+    }
+
+    for count in alert_counts:
+        feature_alerts = [
+            FeatureAlert(
+                name=features[i % len(features)].name,
+                kind=FeatureAlertKind.OUTLIER.value,
+                feature_value=FeatureValue(value=str(i)),
+                feature=features[i % len(features)],
+            )
+            for i in range(count)
+        ]
+        alert = Alert(mate.name, feature_alerts, None)
+
+        for target_name, target in targets.items():
+            yield BenchmarkResult(
+                "alert_formatting",
+                {"target": target_name, "alerts": count},
+                _time(lambda: target._format_alert(alert), rounds),
+            )
+
+
+def run_benchmarks(quick: bool = False) -> List[BenchmarkResult]:
+    rounds = 3 if quick else 20
+    results: List[BenchmarkResult] = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        results.extend(
+            bench_running_mate(
+                backends=["memory", "disk"],
+                feature_counts=[6] if quick else [6, 60],
+                row_counts=[1, 100] if quick else [1, 100, 1000],
+                rounds=rounds,
+                directory=pathlib.Path(directory),
+            )
+        )
+        db.close()
+
+    results.extend(
+        bench_baseline_stats(
+            feature_counts=[6] if quick else [6, 60],
+            row_counts=[1000] if quick else [10_000, 100_000],
+            rounds=1 if quick else 3,
+        )
+    )
+    results.extend(bench_report([6] if quick else [6, 60], rounds))
+    results.extend(bench_alert_formatting([1, 10] if quick else [1, 100], rounds))
+    db.close()
+
+    return results
+
+
+def to_json(results: List[BenchmarkResult]) -> Dict[str, Any]:
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "peewee": peewee.__version__,
+        },
+        "datetime": datetime.datetime.now().isoformat(),
+        "benchmarks": {result.key: result.to_dict() for result in results},
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> List[Regression]:
+    """
+    Benchmarks (in both runs) whose median is more than `threshold` slower
+    than the baseline's.
+    """
+    regressions = []
+
+    for key, result in current["benchmarks"].items():
+        previous = baseline["benchmarks"].get(key)
+        if previous is None:
+            continue
+
+        if result["median"] > previous["median"] * (1 + threshold):
+            regressions.append(Regression(key, previous["median"], result["median"]))
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", type=pathlib.Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=pathlib.Path, help="results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("mate").setLevel(logging.WARNING)
+    current = to_json(run_benchmarks(quick=args.quick))
+
+    for key, result in current["benchmarks"].items():
+        print(f"{key:<80}{result['median'] * 1000:>10.3f} ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+
+    if args.baseline:
+        regressions = compare(
+            current, json.loads(args.baseline.read_text()), args.threshold
+        )
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression.key}: {regression.baseline * 1000:.3f} ms "
+                + f"-> {regression.current * 1000:.3f} ms ({regression.ratio:.2f}x)"
+            )
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Throughput of concurrent RunningMate contexts on a disk-based SQLite database.
+
+    python -m benchmarks.serving --requests 2000 --threads 1 4 8
+
+Each request checks one row and records all of its feature values. Modes:
+
+    per-thread  one connection per thread, writes on the request thread
+    pooled      SqliteBackend(max_connections=4), writes on the request thread
+    recorder    writes queued to a BackgroundRecorder (single writer thread)
+"""
+
+import argparse
+import logging
+import pathlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import pandas as pd  # type: ignore
+
+from mate.backends import SqliteBackend
+from mate.db import Inference, connect_db, db, version_or_create_mate
+from mate.generators import generate_baseline_stats
+from mate.recorder import BackgroundRecorder
+from mate.run import RunningMate
+
+DATA = pathlib.Path(__file__).parent.parent / "examples" / "_data"
+
+
+def run(mode: str, threads: int, requests: int, df: pd.DataFrame) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "mate.db"
+        connect_db(SqliteBackend(path, max_connections=4 if mode == "pooled" else None))
+        version_or_create_mate("insurance")
+        generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+        recorder = BackgroundRecorder() if mode == "recorder" else None
+
+        def infer(row: int):
+            with RunningMate(
+                "insurance",
+                1,
+                df.iloc[[row % len(df)]],
+                [],
+                should_save_all_feature_values=True,
+                recorder=recorder,
+            ):
+                pass
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(infer, range(requests)))
+        if recorder is not None:
+            recorder.shutdown()
+        elapsed = perf_counter() - start
+
+        assert Inference.select().count() == requests
+        db.close()
+
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    logging.getLogger("mate").setLevel(logging.WARNING)
+    df = pd.read_csv(DATA / "insurance.csv")
+
+    print(f"{'mode':<12}{'threads':>8}{'requests/s':>12}")
+    for mode in ("per-thread", "pooled", "recorder"):
+        for threads in args.threads:
+            throughput = run(mode, threads, args.requests, df)
+            print(f"{mode:<12}{threads:>8}{throughput:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
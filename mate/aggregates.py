@@ -0,0 +1,419 @@
+import atexit
+import datetime
+import logging
+import math
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd  # type: ignore
+from peewee import chunked  # type: ignore
+
+from mate.baseline import CompiledBaseline
+from mate.db import (
+    INSERT_BATCH_SIZE,
+    Feature,
+    FeatureAggregate,
+    Mate,
+    db,
+    write_transaction,
+)
+from mate.metrics import DB_WRITES, get_metrics_sink
+from mate.sketches import QuantileSketch
+
+logger = logging.getLogger("mate")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+# (feature id, bucket seconds, bucket start)
+_BucketKey = Tuple[int, int, datetime.datetime]
+
+# aggregates of this process, restarted in forked children
+_aggregates: "weakref.WeakSet[RollingAggregates]" = weakref.WeakSet()
+
+
+@dataclass
+class RollingStatistics:
+    """
+    Mergeable summary of the values of one feature over a time range
+    """
+
+    count: int = 0
+    null_count: int = 0
+    mean: Optional[float] = None
+    m2: Optional[float] = None  # sum of squared differences from the mean
+    min: Optional[float] = None
+    max: Optional[float] = None
+    sketch: Optional[QuantileSketch] = None
+
+    @property
+    def num_present(self) -> int:
+        return self.count - self.null_count
+
+    @property
+    def std_dev(self) -> float:
+        if self.m2 is None or self.num_present < 2:
+            return math.nan
+
+        return math.sqrt(self.m2 / (self.num_present - 1))
+
+    @classmethod
+    def from_values(
+        cls, values: np.ndarray, nulls: int, sketch: bool = True
+    ) -> "RollingStatistics":
+        """
+        Summarizes the non-null float `values` of a column that also had `nulls` nulls.
+        """
+        statistics = cls(count=len(values) + nulls, null_count=nulls)
+
+        if len(values):
+            statistics.mean = float(values.mean())
+            statistics.m2 = float(((values - statistics.mean) ** 2).sum())
+            statistics.min = float(values.min())
+            statistics.max = float(values.max())
+
+            if sketch:
+                statistics.sketch = QuantileSketch()
+                statistics.sketch.update(values)
+
+        return statistics
+
+    @classmethod
+    def from_model(cls, aggregate: FeatureAggregate) -> "RollingStatistics":
+        return cls(
+            count=aggregate.count,
+            null_count=aggregate.null_count,
+            mean=aggregate.mean,
+            m2=aggregate.m2,
+            min=aggregate.min,
+            max=aggregate.max,
+            sketch=(
+                QuantileSketch.from_bytes(aggregate.sketch)
+                if aggregate.sketch
+                else None
+            ),
+        )
+
+    def merge(self, other: "RollingStatistics"):
+        if other.mean is not None and other.m2 is not None:
+            if self.mean is None or self.m2 is None:
+                self.mean, self.m2 = other.mean, other.m2
+            else:
+                n = self.num_present + other.num_present
+                delta = other.mean - self.mean
+                self.mean += delta * other.num_present / n
+                self.m2 += (
+                    other.m2 + delta**2 * self.num_present * other.num_present / n
+                )
+
+        if other.min is not None and other.max is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+        if other.sketch is not None:
+            if self.sketch is None:
+                # merged into a new sketch, so `other` is never shared
+                self.sketch = QuantileSketch(k=other.sketch.k)
+            self.sketch.merge(other.sketch)
+
+        self.count += other.count
+        self.null_count += other.null_count
+
+
+def bucket_start(
+    timestamp: datetime.datetime, bucket_seconds: int
+) -> datetime.datetime:
+    """
+    Start of the `bucket_seconds` wide bucket that holds `timestamp`, as a
+    naive UTC datetime, so that replicas in any timezone (or across a DST
+    change) key the same interval the same way. Naive timestamps are local.
+    """
+    seconds = int(timestamp.timestamp())
+    start = datetime.datetime.fromtimestamp(
+        seconds - seconds % bucket_seconds, tz=datetime.timezone.utc
+    )
+    return start.replace(tzinfo=None)
+
+
+class RollingAggregates(object):
+    """
+    Per-feature rolling production statistics in time buckets
+
+    RunningMate calls `update` with every inference. The values of each
+    feature are summarized (count, null count, mean and variance, min/max and,
+    for numerical features, a quantile sketch) into one in-memory
+    RollingStatistics per feature and bucket, so the cost per inference is a
+    few NumPy reductions per feature. Every `flush_interval` seconds a
+    background thread merges the pending buckets into the
+    `feature_aggregate` table, one row per feature and bucket, so dashboards
+    read O(buckets) rows instead of every FeatureValue and requests never
+    wait on the write. Buckets that fail to be written stay pending for the
+    next flush. In a forked child, the thread is restarted with no pending
+    buckets; the parent's stay with the parent.
+
+        Parameters:
+            bucket_seconds (int or list of ints): Bucket widths to keep, e.g. [MINUTE, HOUR] (defaults to MINUTE)
+            flush_interval (float): Seconds between writes (defaults to 10.0)
+            sketches (bool): Keep a quantile sketch per numerical bucket (defaults to True)
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: Union[int, Sequence[int]] = MINUTE,
+        flush_interval: float = 10.0,
+        sketches: bool = True,
+    ):
+        self.bucket_seconds = (
+            [bucket_seconds] if isinstance(bucket_seconds, int) else bucket_seconds
+        )
+        if flush_interval <= 0:
+            raise ValueError("flush_interval must be positive.")
+
+        self.flush_interval = flush_interval
+        self.sketches = sketches
+
+        self._closed = False
+        self._start()
+
+        atexit.register(self.shutdown)
+        _aggregates.add(self)
+
+    def _start(self):
+        self._pending: Dict[_BucketKey, RollingStatistics] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="mate-aggregates", daemon=True
+        )
+        self._thread.start()
+
+    def _after_fork(self):
+        # threads don't survive fork, and the lock may be held
+        if not self._closed:
+            self._start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        """
+        Stops the flush thread and writes the pending buckets.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def update(
+        self,
+        baseline: CompiledBaseline,
+        df: pd.DataFrame,
+        timestamp: Optional[datetime.datetime] = None,
+    ):
+        """
+        Adds the rows of `df` to the buckets that hold `timestamp` (defaults to now).
+        """
+        timestamp = timestamp or datetime.datetime.now()
+        starts = [
+            (seconds, bucket_start(timestamp, seconds))
+            for seconds in self.bucket_seconds
+        ]
+
+        updates = []
+        for i, feature in enumerate(baseline.features):
+            if feature.name not in df:
+                continue
+
+            col = df[feature.name]
+
+            if baseline.is_numerical(i):
+                values = pd.to_numeric(col, errors="coerce").to_numpy(dtype=float)
+                values = values[~np.isnan(values)]
+                statistics = RollingStatistics.from_values(
+                    values, len(col) - len(values), self.sketches
+                )
+            else:
+                statistics = RollingStatistics(
+                    count=len(col), null_count=int(col.isna().sum())
+                )
+
+            updates.append((feature.id, statistics))
+
+        with self._lock:
+            for feature_id, statistics in updates:
+                for seconds, start in starts:
+                    key = (feature_id, seconds, start)
+                    self._pending.setdefault(key, RollingStatistics()).merge(statistics)
+
+    def flush(self):
+        """
+        Merges the pending buckets into the `feature_aggregate` table. Called
+        by the flush thread; call it to write them now. The rows of the
+        buckets are locked while they are merged, so replicas flushing into
+        a shared database add to each other's counts.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        keys = sorted(pending)
+
+        try:
+            with write_transaction():
+                # every bucket gets a row first, so that _load_buckets locks
+                # it and flushes of other replicas wait instead of
+                # overwriting the counts merged here
+                for batch in chunked(keys, INSERT_BATCH_SIZE):
+                    FeatureAggregate.insert_many(
+                        [_to_row(key, RollingStatistics()) for key in batch]
+                    ).on_conflict_ignore().execute()
+
+                merged = _load_buckets(keys)
+                for key, statistics in pending.items():
+                    merged.setdefault(key, RollingStatistics()).merge(statistics)
+
+                for batch in chunked(merged.items(), INSERT_BATCH_SIZE):
+                    FeatureAggregate.insert_many(
+                        [_to_row(key, statistics) for key, statistics in batch]
+                    ).on_conflict(
+                        # ON CONFLICT DO UPDATE works on SQLite and PostgreSQL
+                        conflict_target=_BUCKET_COLUMNS,
+                        preserve=_STATISTICS_COLUMNS,
+                    ).execute()
+        except Exception:
+            logger.exception(
+                f"Failed to write {len(pending)} feature aggregates. "
+                + "They will be retried on the next flush."
+            )
+            with self._lock:
+                for key, statistics in pending.items():
+                    # merged into the buckets updated since, if any
+                    statistics.merge(self._pending.get(key, RollingStatistics()))
+                    self._pending[key] = statistics
+            return
+
+        metrics = get_metrics_sink()
+        if metrics is not None:
+            metrics.increment(DB_WRITES, len(pending), {"table": "feature_aggregate"})
+
+
+# the unique index of feature_aggregate, and the columns a flush overwrites
+_BUCKET_COLUMNS = [
+    FeatureAggregate.feature,
+    FeatureAggregate.bucket_seconds,
+    FeatureAggregate.bucket_start,
+]
+_STATISTICS_COLUMNS = [
+    FeatureAggregate.count,
+    FeatureAggregate.null_count,
+    FeatureAggregate.mean,
+    FeatureAggregate.m2,
+    FeatureAggregate.min,
+    FeatureAggregate.max,
+    FeatureAggregate.sketch,
+]
+
+
+def _to_row(key: _BucketKey, statistics: RollingStatistics) -> dict:
+    feature_id, seconds, start = key
+    return {
+        "feature": feature_id,
+        "bucket_start": start,
+        "bucket_seconds": seconds,
+        "count": statistics.count,
+        "null_count": statistics.null_count,
+        "mean": statistics.mean,
+        "m2": statistics.m2,
+        "min": statistics.min,
+        "max": statistics.max,
+        "sketch": statistics.sketch.to_bytes() if statistics.sketch else None,
+    }
+
+
+def _load_buckets(keys: List[_BucketKey]) -> Dict[_BucketKey, RollingStatistics]:
+    feature_ids = {feature_id for feature_id, _, _ in keys}
+    seconds = {seconds for _, seconds, _ in keys}
+    starts = {start for _, _, start in keys}
+    wanted = set(keys)
+
+    stored = (
+        FeatureAggregate.select().where(
+            FeatureAggregate.feature.in_(feature_ids)
+            & FeatureAggregate.bucket_seconds.in_(seconds)
+            & FeatureAggregate.bucket_start.in_(starts)
+        )
+        # in one order, so concurrent flushes can't deadlock
+        .order_by(*_BUCKET_COLUMNS)
+    )
+    if db.for_update:
+        # SELECT ... FOR UPDATE on PostgreSQL; SQLite's write lock is taken
+        # by write_transaction
+        stored = stored.for_update()
+
+    result = {}
+    for aggregate in stored:
+        key = (aggregate.feature_id, aggregate.bucket_seconds, aggregate.bucket_start)
+        if key in wanted:
+            result[key] = RollingStatistics.from_model(aggregate)
+
+    return result
+
+
+def get_feature_aggregates(
+    mate: Mate,
+    feature_name: Optional[str] = None,
+    bucket_seconds: int = MINUTE,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> List[FeatureAggregate]:
+    """
+    Stored buckets of `mate`, oldest first, optionally for one feature and
+    for buckets starting in [start, end). Bucket starts are naive UTC.
+    """
+    query = (
+        FeatureAggregate.select()
+        .join(Feature)
+        .where(
+            (Feature.mate == mate) & (FeatureAggregate.bucket_seconds == bucket_seconds)
+        )
+    )
+
+    if feature_name is not None:
+        query = query.where(Feature.name == feature_name)
+    if start is not None:
+        query = query.where(FeatureAggregate.bucket_start >= start)
+    if end is not None:
+        query = query.where(FeatureAggregate.bucket_start < end)
+
+    return list(query.order_by(FeatureAggregate.bucket_start))
+
+
+def combine_aggregates(aggregates: Sequence[FeatureAggregate]) -> RollingStatistics:
+    """
+    Merges stored buckets (of one feature) into statistics for the whole range.
+    """
+    result = RollingStatistics()
+
+    for aggregate in aggregates:
+        result.merge(RollingStatistics.from_model(aggregate))
+
+    return result
+
+
+def _restart_aggregates_after_fork():
+    for aggregates in list(_aggregates):
+        aggregates._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_aggregates_after_fork)
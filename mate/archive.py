@@ -0,0 +1,313 @@
+import datetime
+import logging
+import os
+import pathlib
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd  # type: ignore
+from peewee import chunked  # type: ignore
+
+from mate.db import (
+    Feature,
+    FeatureAlert,
+    FeatureValue,
+    Inference,
+    Mate,
+    db,
+    write_transaction,
+)
+
+logger = logging.getLogger("mate")
+
+MATE_ARCHIVE_PATH_VAR = "MATE_ARCHIVE_PATH"
+
+# inferences exported (and deleted) per batch
+ARCHIVE_BATCH_SIZE = 10_000
+
+# ids per DELETE ... WHERE id IN (...)
+DELETE_BATCH_SIZE = 500
+
+TABLES = ("inference", "feature_value", "feature_alert")
+
+# (mate name, mate version, date)
+_Partition = Tuple[str, int, datetime.date]
+
+
+def get_archive_path(path: Optional[Union[str, pathlib.Path]] = None) -> pathlib.Path:
+    """
+    `path`, else $MATE_ARCHIVE_PATH, else "mate_archive" next to mate.db.
+    """
+    return pathlib.Path(
+        path or os.getenv(MATE_ARCHIVE_PATH_VAR) or pathlib.Path.cwd() / "mate_archive"
+    )
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # type: ignore # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def archive_inferences(
+    before: datetime.datetime,
+    mate_name: Optional[str] = None,
+    path: Optional[Union[str, pathlib.Path]] = None,
+    format: str = "auto",
+) -> int:
+    """
+    Moves inferences created before `before`, with their feature values and
+    alerts, from SQLite to columnar files and returns how many were moved.
+
+    Files are partitioned as `mate=<name>/version=<version>/date=<YYYY-MM-DD>/`
+    under the archive path, one file per table and batch. `format` is
+    "parquet" (requires pyarrow), "npz" (NumPy only) or "auto" (parquet when
+    pyarrow is installed). Each batch is deleted from SQLite only after its
+    files are written.
+    """
+    root = get_archive_path(path)
+    if format == "auto":
+        format = "parquet" if has_pyarrow() else "npz"
+
+    query = (
+        Inference.select(Inference.id).join(Mate).where(Inference.created_at < before)
+    )
+    if mate_name is not None:
+        query = query.where(Mate.name == mate_name)
+
+    archived = 0
+    last_id = 0
+
+    while True:
+        # keyset pagination, so each batch is an index range scan
+        ids = [
+            inference_id
+            for (inference_id,) in query.where(Inference.id > last_id)
+            .order_by(Inference.id)
+            .limit(ARCHIVE_BATCH_SIZE)
+            .tuples()
+        ]
+        if not ids:
+            break
+
+        # nothing writes to old inferences, so the batch is read in a plain
+        # (snapshot) transaction and written to files without holding the
+        # write lock, which is only taken for the deletes
+        with db.atomic():
+            partitions = _export_batch(ids)
+        for partition, tables in partitions.items():
+            _write_partition(root, partition, tables, format)
+
+        with write_transaction():
+            for Model, column in (
+                (FeatureAlert, FeatureAlert.inference),
+                (FeatureValue, FeatureValue.inference),
+                (Inference, Inference.id),
+            ):
+                for batch in chunked(ids, DELETE_BATCH_SIZE):
+                    Model.delete().where(column.in_(batch)).execute()
+
+        archived += len(ids)
+        last_id = ids[-1]
+
+    logger.info(f"Archived {archived} inferences to {root}.")
+
+    return archived
+
+
+def _export_batch(ids: List[int]) -> Dict[_Partition, Dict[str, pd.DataFrame]]:
+    inferences = pd.DataFrame(
+        list(
+            Inference.select(
+                Inference.id,
+                Inference.runtime,
+                Inference.created_at,
+                Mate.name,
+                Mate.version,
+            )
+            .join(Mate)
+            .where(Inference.id.in_(ids))
+            .tuples()
+        ),
+        columns=["id", "runtime", "created_at", "mate_name", "mate_version"],
+    )
+    values = pd.DataFrame(
+        list(
+            FeatureValue.select(
+                FeatureValue.id,
+                Feature.name,
+                FeatureValue.inference,
+                FeatureValue.value,
+                FeatureValue.value_int,
+                FeatureValue.value_real,
+                FeatureValue.sample_rate,
+                FeatureValue.created_at,
+            )
+            .join(Feature)
+            .where(FeatureValue.inference.in_(ids))
+            .tuples()
+        ),
+        columns=[
+            "id",
+            "feature_name",
+            "inference_id",
+            "value",
+            "value_int",
+            "value_real",
+            "sample_rate",
+            "created_at",
+        ],
+    )
+    alerts = pd.DataFrame(
+        list(
+            FeatureAlert.select(
+                FeatureAlert.id,
+                FeatureAlert.name,
+                FeatureAlert.kind,
+                FeatureAlert.feature_value,
+                FeatureAlert.inference,
+            )
+            .where(FeatureAlert.inference.in_(ids))
+            .tuples()
+        ),
+        columns=["id", "feature_name", "kind", "feature_value_id", "inference_id"],
+    )
+
+    # float columns (NaN for NULL) whatever mix of values a batch has
+    for column in ("value_int", "value_real", "sample_rate"):
+        values[column] = pd.to_numeric(values[column]).astype(float)
+
+    inferences["date"] = pd.to_datetime(inferences["created_at"]).dt.date
+    partition_of = {
+        row.id: (row.mate_name, int(row.mate_version), row.date)
+        for row in inferences.itertuples()
+    }
+
+    result: Dict[_Partition, Dict[str, pd.DataFrame]] = defaultdict(dict)
+    for name, table, key in (
+        ("inference", inferences, inferences["id"]),
+        ("feature_value", values, values["inference_id"]),
+        ("feature_alert", alerts, alerts["inference_id"]),
+    ):
+        for partition, rows in table.groupby(key.map(partition_of)):
+            if name == "inference":
+                rows = rows[["id", "runtime", "created_at"]]
+            result[partition][name] = rows.reset_index(drop=True)
+
+    return result
+
+
+def _partition_dir(root: pathlib.Path, name: str, version: int) -> pathlib.Path:
+    return root / f"mate={name}" / f"version={version}"
+
+
+def _write_partition(
+    root: pathlib.Path,
+    partition: _Partition,
+    tables: Dict[str, pd.DataFrame],
+    format: str,
+):
+    name, version, date = partition
+    directory = _partition_dir(root, name, version) / f"date={date.isoformat()}"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # named after the first inference, so re-archiving a batch overwrites it
+    first_id = int(tables["inference"]["id"].min())
+
+    for table, rows in tables.items():
+        file_path = directory / f"{table}-{first_id}.{format}"
+
+        if format == "parquet":
+            rows.to_parquet(file_path, index=False)
+        else:
+            _write_npz(file_path, rows)
+
+
+def _write_npz(file_path: pathlib.Path, rows: pd.DataFrame):
+    arrays = {}
+
+    for column, series in rows.items():
+        if series.dtype == object:
+            # fixed-width unicode plus a null mask, so loading needs no pickle
+            arrays[f"{column}__null"] = series.isna().to_numpy()
+            arrays[column] = series.fillna("").astype(str).to_numpy(dtype=str)
+        else:
+            arrays[column] = series.to_numpy()
+
+    np.savez_compressed(file_path, **arrays)
+
+
+def _read_npz(file_path: pathlib.Path) -> pd.DataFrame:
+    with np.load(file_path) as data:
+        columns = {}
+        for column in data.files:
+            if column.endswith("__null"):
+                continue
+
+            values = data[column]
+            null_column = f"{column}__null"
+            if null_column in data.files:
+                values = values.astype(object)
+                values[data[null_column]] = None
+            columns[column] = values
+
+    return pd.DataFrame(columns)
+
+
+def _table_files(
+    root: pathlib.Path, name: str, version: int, table: str
+) -> Iterator[pathlib.Path]:
+    directory = _partition_dir(root, name, version)
+    if not directory.exists():
+        return
+
+    file_paths = [
+        file_path
+        for file_path in directory.glob(f"date=*/{table}-*")
+        if file_path.suffix in {".parquet", ".npz"}
+    ]
+    # by date, then by first inference id
+    yield from sorted(
+        file_paths,
+        key=lambda file_path: (
+            file_path.parent.name,
+            int(file_path.stem.split("-")[1]),
+        ),
+    )
+
+
+def iter_archive(
+    mate: Mate,
+    table: str = "feature_value",
+    path: Optional[Union[str, pathlib.Path]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Archived rows of one of TABLES for a mate version, one file at a time.
+    """
+    for file_path in _table_files(
+        get_archive_path(path), mate.name, mate.version, table
+    ):
+        if file_path.suffix == ".parquet":
+            yield pd.read_parquet(file_path)
+        else:
+            yield _read_npz(file_path)
+
+
+def read_archive(
+    mate: Mate,
+    table: str = "feature_value",
+    path: Optional[Union[str, pathlib.Path]] = None,
+) -> pd.DataFrame:
+    """
+    Archived rows of one of TABLES for a mate version, as a DataFrame.
+    """
+    frames = list(iter_archive(mate, table, path))
+
+    if not frames:
+        return pd.DataFrame()
+
+    return pd.concat(frames, ignore_index=True).sort_values("id", kind="mergesort")
@@ -0,0 +1,262 @@
+import os
+import pathlib
+import sqlite3
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple, Type, Union
+from urllib.parse import urlparse
+
+from peewee import (  # type: ignore
+    Database,
+    Field,
+    Model,
+    PostgresqlDatabase,
+    SqliteDatabase,
+    chunked,
+)
+from playhouse.db_url import parse  # type: ignore
+from playhouse.pool import (  # type: ignore
+    PooledPostgresqlDatabase,
+    PooledSqliteDatabase,
+)
+
+MATE_DATABASE_URL_VAR = "MATE_DATABASE_URL"
+
+# applied to every connection; WAL lets readers (reports, drift jobs) run
+# alongside the serving writer, and NORMAL sync is durable in WAL mode.
+# auto_vacuum only takes effect on new databases (see enable_incremental_vacuum)
+SQLITE_PRAGMAS = {
+    "auto_vacuum": "incremental",
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -64 * 1024,  # KiB, so 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+class StorageBackend(ABC):
+    """
+    Where mate stores its models: creates the peewee database bound to the
+    `db` proxy and owns the write paths that differ between databases.
+    """
+
+    # rows per multi-row INSERT
+    insert_batch_size = 100
+
+    @abstractmethod
+    def create_database(self) -> Database:
+        pass
+
+    def bulk_insert(
+        self, model: Type[Model], fields: List[Field], rows: List[Tuple]
+    ) -> List[int]:
+        """
+        Inserts rows (tuples aligned with `fields`) with multi-row INSERTs and
+        returns their IDs in insertion order. Call inside `db.atomic()`.
+        """
+        ids: List[int] = []
+
+        for batch in chunked(rows, self.insert_batch_size):
+            cursor = model.insert_many(batch, fields=fields).returning(model.id)
+            ids.extend(row_id for (row_id,) in cursor.tuples().execute())
+
+        return ids
+
+
+class SqliteBackend(StorageBackend):
+    """
+    A SQLite file; one per serving node
+
+        Parameters:
+            path (str): Database file (defaults to mate.db in the working directory)
+            busy_timeout (float): Seconds a connection waits for another writer's lock before "database is locked" (defaults to 10.0)
+            max_connections (int): Pool connections, shared by threads, up to this many (defaults to one connection per thread, unpooled)
+            pool_timeout (float): Seconds a thread waits for a free pooled connection (defaults to 10.0)
+
+    peewee keeps one connection per thread. With `max_connections`, threads
+    check connections out of a pool instead, and RunningMate returns its
+    connection when the context exits.
+    """
+
+    # keeps each statement under SQLite's variable limit
+    insert_batch_size = 100
+
+    def __init__(
+        self,
+        path: Optional[Union[str, pathlib.Path]] = None,
+        busy_timeout: float = 10.0,
+        max_connections: Optional[int] = None,
+        pool_timeout: float = 10.0,
+    ):
+        self.path = path or pathlib.Path.cwd() / "mate.db"
+        self.busy_timeout = busy_timeout
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+
+    def create_database(self) -> Database:
+        return self._create_database(self.path)
+
+    def _create_database(self, path, **kwargs) -> Database:
+        pragmas = {**SQLITE_PRAGMAS, "busy_timeout": int(self.busy_timeout * 1000)}
+
+        if self.max_connections is None:
+            return SqliteDatabase(path, pragmas=pragmas, **kwargs)
+
+        return PooledSqliteDatabase(
+            path,
+            max_connections=self.max_connections,
+            timeout=self.pool_timeout,
+            pragmas=pragmas,
+            # pooled connections move between threads
+            check_same_thread=False,
+            **kwargs,
+        )
+
+    def bulk_insert(
+        self, model: Type[Model], fields: List[Field], rows: List[Tuple]
+    ) -> List[int]:
+        # SQLite has a single writer, so the rows of one INSERT get
+        # consecutive rowids ending at the last one
+        ids: List[int] = []
+
+        for batch in chunked(rows, self.insert_batch_size):
+            last_id = model.insert_many(batch, fields=fields).execute()
+            ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+
+        return ids
+
+
+class MemoryBackend(SqliteBackend):
+    """
+    An in-memory SQLite database, for tests and throwaway runs
+
+        Parameters:
+            busy_timeout (float): Seconds a connection waits for another writer's lock (defaults to 10.0)
+            max_connections (int): Pool connections, shared by threads (defaults to one connection per thread, unpooled)
+
+    Unlike ":memory:", which gives every connection its own empty database,
+    every thread (and the recorder, dispatcher and aggregates threads) sees
+    the same database. Each `create_database` makes a new, empty one, which
+    lives until the backend is garbage collected.
+    """
+
+    def __init__(
+        self, busy_timeout: float = 10.0, max_connections: Optional[int] = None
+    ):
+        super().__init__(
+            ":memory:", busy_timeout=busy_timeout, max_connections=max_connections
+        )
+        # holds the database open while no other connection is
+        self._keeper: Optional[sqlite3.Connection] = None
+
+    def create_database(self) -> Database:
+        name = f"mate-{uuid.uuid4().hex}"
+        if sqlite3.sqlite_version_info >= (3, 36):
+            # memdb databases lock like files, so writers wait on the busy
+            # timeout; shared-cache ones fail at once with "table is locked"
+            uri = f"file:/{name}?vfs=memdb"
+        else:
+            uri = f"file:{name}?mode=memory&cache=shared"
+
+        if self._keeper is not None:
+            self._keeper.close()
+        self._keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+        return self._create_database(uri, uri=True)
+
+
+class PostgresBackend(StorageBackend):
+    """
+    A PostgreSQL database shared by every serving node, through a pool of
+    connections (peewee's PooledPostgresqlDatabase; requires psycopg2)
+
+        Parameters:
+            database (str): Database name
+            max_connections (int): Pool size per process (defaults to 20)
+            stale_timeout (int): Seconds before an idle connection is recycled (defaults to 300)
+            timeout (int): Seconds to wait for a free connection when the pool is exhausted (defaults to 10)
+
+    Other keyword arguments (host, port, user, password, ...) are passed to
+    psycopg2.
+    """
+
+    # Postgres allows 65535 parameters per statement
+    insert_batch_size = 1000
+
+    def __init__(
+        self,
+        database: str,
+        max_connections: int = 20,
+        stale_timeout: int = 300,
+        timeout: int = 10,
+        **connect_kwargs,
+    ):
+        self.database = database
+        self.max_connections = max_connections
+        self.stale_timeout = stale_timeout
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+
+    def create_database(self) -> Database:
+        # concurrent writers make ids non-consecutive, so inserts use RETURNING
+        return PooledPostgresqlDatabase(
+            self.database,
+            max_connections=self.max_connections,
+            stale_timeout=self.stale_timeout,
+            timeout=self.timeout,
+            **self.connect_kwargs,
+        )
+
+
+def backend_from_url(url: str) -> StorageBackend:
+    """
+    A backend from a database URL:
+
+        memory://                          in-memory SQLite
+        sqlite:///mate.db                  SQLite file (sqlite:////abs/path for absolute paths);
+                                           options as query parameters, e.g. ?max_connections=8
+        postgresql://user:pw@host/mate     pooled PostgreSQL; pool options as query
+                                           parameters, e.g. ?max_connections=10
+    """
+    scheme = urlparse(url).scheme
+
+    if scheme == "memory":
+        return MemoryBackend()
+
+    if scheme in ("sqlite", "sqlite+pool"):
+        options = parse(url)
+        path = options.pop("database")
+        if path in ("", ":memory:"):
+            return MemoryBackend()
+
+        return SqliteBackend(path, **options)
+
+    if scheme in ("postgres", "postgresql", "postgres+pool", "postgresql+pool"):
+        return PostgresBackend(**parse(url))
+
+    raise ValueError(f"Unsupported database URL scheme: '{scheme}'.")
+
+
+def get_default_backend() -> StorageBackend:
+    """
+    $MATE_DATABASE_URL when set, else in-memory SQLite when $TESTING is set,
+    else mate.db in the working directory.
+    """
+    url = os.getenv(MATE_DATABASE_URL_VAR)
+
+    if url:
+        return backend_from_url(url)
+    if int(os.getenv("TESTING", "0")):
+        return MemoryBackend()
+
+    return SqliteBackend()
+
+
+def backend_for(database: Database) -> StorageBackend:
+    """
+    The backend matching a database bound to the `db` proxy directly.
+    """
+    if isinstance(database, PostgresqlDatabase):
+        return PostgresBackend(database.database)
+
+    return SqliteBackend(database.database)
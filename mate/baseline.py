@@ -0,0 +1,239 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from mate.cache import baseline_cache
+from mate.checks import CheckThresholds
+from mate.db import Feature, Mate, NumericalStats, StringStats, get_features, get_mate
+from mate.plan import CheckPlan, compile_check_plan
+from mate.sketches import Histogram, QuantileSketch, TopK
+from mate.stats import FeatureType
+
+logger = logging.getLogger("mate")
+
+NUMERICAL_TYPES = (FeatureType.INTEGER.value, FeatureType.FRACTION.value)
+
+
+@dataclass(frozen=True)
+class CompiledBaseline:
+    """
+    Immutable, array-backed view of a mate version's features and baseline stats.
+
+    Arrays are aligned with `names`. Numerical stats are NaN for features
+    without NumericalStats and `num_missing` is -1 for features without stats.
+    `categories` holds the exact set of baseline values of a string feature,
+    or None when it is unknown (no top-k sketch, or too many distinct values).
+    `quantiles` and `histograms` hold the quantile sketch and histogram of a
+    numerical feature, if any. `median`, `mad`, `q1` and `q3` are NaN for
+    baselines generated before they were stored. `thresholds` holds the
+    check thresholds persisted for a feature (see set_feature_thresholds).
+    """
+
+    mate: Mate
+    features: Tuple[Feature, ...]
+    names: Tuple[str, ...]
+    inferred_types: Tuple[str, ...]
+    index: Mapping[str, int]
+    feature_ids: np.ndarray
+    mean: np.ndarray
+    std_dev: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    median: np.ndarray
+    mad: np.ndarray
+    q1: np.ndarray
+    q3: np.ndarray
+    num_missing: np.ndarray
+    categories: Tuple[Optional[FrozenSet[str]], ...]
+    quantiles: Tuple[Optional[QuantileSketch], ...] = ()
+    tail_quantiles: Tuple[Optional[Mapping[float, float]], ...] = ()
+    histograms: Tuple[Optional[Histogram], ...] = ()
+    thresholds: Tuple[Optional[CheckThresholds], ...] = ()
+    _percentile_bounds: Dict[Tuple[float, float], Tuple[np.ndarray, np.ndarray]] = (
+        field(default_factory=dict, compare=False, repr=False)
+    )
+    _check_plans: Dict[
+        Tuple[Optional[Tuple[float, float]], CheckThresholds], CheckPlan
+    ] = field(default_factory=dict, compare=False, repr=False)
+
+    def is_numerical(self, i: int) -> bool:
+        return self.inferred_types[i] in NUMERICAL_TYPES
+
+    def percentile_bounds(
+        self, lower_percentile: float, upper_percentile: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-feature values at the lower and upper percentiles (0 to 100), NaN
+        for features without a quantile sketch. Exact when the baseline stored
+        both percentiles (see TAIL_PERCENTILES), else from the sketch.
+        Computed once per pair.
+        """
+        key = (lower_percentile, upper_percentile)
+
+        if key not in self._percentile_bounds:
+            tail_quantiles = self.tail_quantiles or (None,) * len(self.quantiles)
+            bounds = np.array(
+                [
+                    _bounds(sketch, tails, lower_percentile, upper_percentile)
+                    for sketch, tails in zip(self.quantiles, tail_quantiles)
+                ],
+                dtype=float,
+            ).reshape(-1, 2)
+            self._percentile_bounds[key] = (
+                _frozen(bounds[:, 0], float),
+                _frozen(bounds[:, 1], float),
+            )
+
+        return self._percentile_bounds[key]
+
+    def check_plan(
+        self,
+        percentile_bounds: Optional[Tuple[float, float]] = None,
+        thresholds: Optional[CheckThresholds] = None,
+    ) -> CheckPlan:
+        """
+        The compiled checks (see mate.plan), compiled once per
+        `percentile_bounds` and default `thresholds`.
+        """
+        key = (percentile_bounds, thresholds or CheckThresholds())
+
+        if key not in self._check_plans:
+            self._check_plans[key] = compile_check_plan(self, *key)
+
+        return self._check_plans[key]
+
+
+def _bounds(
+    sketch: Optional[QuantileSketch],
+    tails: Optional[Mapping[float, float]],
+    lower_percentile: float,
+    upper_percentile: float,
+) -> List[float]:
+    if tails is not None and lower_percentile in tails and upper_percentile in tails:
+        return [tails[lower_percentile], tails[upper_percentile]]
+    if sketch is None:
+        return [np.nan, np.nan]
+
+    q = np.array([lower_percentile, upper_percentile]) / 100
+    return list(sketch.quantile(q))
+
+
+def _frozen(values, dtype) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+def compile_baseline(mate: Mate) -> CompiledBaseline:
+    """
+    Loads the features and stats of `mate` with one query per table.
+    """
+    features = list(get_features(mate))
+    for feature in features:
+        # avoid a lazy SELECT per feature when alerts read feature.mate
+        feature.mate = mate
+
+    numerical: Dict[int, NumericalStats] = {
+        stats.feature_id: stats
+        for stats in NumericalStats.select().where(NumericalStats.feature.in_(features))
+    }
+    string: Dict[int, StringStats] = {
+        stats.feature_id: stats
+        for stats in StringStats.select().where(StringStats.feature.in_(features))
+    }
+
+    def numerical_column(attr: str):
+        values = [
+            getattr(numerical[f.id], attr) if f.id in numerical else None
+            for f in features
+        ]
+        return [np.nan if value is None else float(value) for value in values]
+
+    num_missing = []
+    for feature in features:
+        stats = numerical.get(feature.id) or string.get(feature.id)
+        num_missing.append(stats.num_missing if stats is not None else -1)
+
+    categories = []
+    for feature in features:
+        stats = string.get(feature.id)
+        top_k = TopK.from_bytes(stats.top_k) if stats and stats.top_k else None
+        categories.append(top_k.categories() if top_k else None)
+
+    quantiles = []
+    histograms = []
+    tail_quantiles = []
+    for feature in features:
+        stats = numerical.get(feature.id)
+        tail_quantiles.append(
+            MappingProxyType(
+                {
+                    float(percentile): value
+                    for percentile, value in json.loads(stats.tail_quantiles).items()
+                }
+            )
+            if stats and stats.tail_quantiles
+            else None
+        )
+        quantiles.append(
+            QuantileSketch.from_bytes(stats.quantile_sketch)
+            if stats and stats.quantile_sketch
+            else None
+        )
+        histograms.append(
+            Histogram.from_bytes(stats.histogram) if stats and stats.histogram else None
+        )
+
+    names = tuple(feature.name for feature in features)
+
+    return CompiledBaseline(
+        mate=mate,
+        features=tuple(features),
+        names=names,
+        inferred_types=tuple(feature.inferred_type for feature in features),
+        index=MappingProxyType({name: i for i, name in enumerate(names)}),
+        feature_ids=_frozen([feature.id for feature in features], np.int64),
+        mean=_frozen(numerical_column("mean"), float),
+        std_dev=_frozen(numerical_column("std_dev"), float),
+        min=_frozen(numerical_column("min"), float),
+        max=_frozen(numerical_column("max"), float),
+        median=_frozen(numerical_column("median"), float),
+        mad=_frozen(numerical_column("mad"), float),
+        q1=_frozen(numerical_column("q1"), float),
+        q3=_frozen(numerical_column("q3"), float),
+        num_missing=_frozen(num_missing, np.int64),
+        categories=tuple(categories),
+        quantiles=tuple(quantiles),
+        tail_quantiles=tuple(tail_quantiles),
+        histograms=tuple(histograms),
+        thresholds=tuple(
+            (
+                CheckThresholds.from_json(feature.thresholds)
+                if feature.thresholds
+                else None
+            )
+            for feature in features
+        ),
+    )
+
+
+def get_compiled_baseline(name: str, version: int) -> Optional[CompiledBaseline]:
+    """
+    Returns the compiled baseline for a mate version, compiling it on first use.
+    """
+    baseline = baseline_cache.get(name, version)
+
+    if baseline is None:
+        mate = get_mate(name, version)
+        if mate is None:
+            return None
+
+        baseline = compile_baseline(mate)
+        baseline_cache.set(name, version, baseline)
+        logger.info(f"Compiled baseline for version {version} of the '{name}' mate.")
+
+    return baseline
@@ -0,0 +1,47 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class BaselineCache(object):
+    """
+    Process-level cache of compiled baselines keyed by (mate name, version).
+
+    The cache is per process. Writers in this process (`version_or_create_mate`
+    and `generate_baseline_stats`) invalidate it; changes made by other
+    processes are not seen until the entry is invalidated or the process restarts.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, int], Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, version: int) -> Optional[Any]:
+        return self._entries.get((name, version))
+
+    def set(self, name: str, version: int, value: Any):
+        with self._lock:
+            self._entries[(name, version)] = value
+
+    def invalidate(self, name: str, version: Optional[int] = None):
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == name and (version is None or key[1] == version):
+                    del self._entries[key]
+
+    def _after_fork(self):
+        # the parent may have forked while another thread held the lock
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+baseline_cache = BaselineCache()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=baseline_cache._after_fork)
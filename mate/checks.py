@@ -1,18 +1,159 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from mate.sketches import QuantileSketch
+
+ArrayLike = Union[float, np.ndarray]
+
+# 1 / 1.4826: scales the MAD to the standard deviation of a normal
+# distribution, so robust z-scores read like z-scores
+MAD_SCALE = 0.6745
+
+
+@dataclass(frozen=True)
+class CheckThresholds:
+    """
+    The outlier checks to run and their thresholds; None disables a check
+
+        Parameters:
+            z_score (float): Cutoff of the absolute z-score (defaults to 4.0)
+            robust_z_score (float): Cutoff of the absolute robust z-score, e.g. 3.5
+            iqr (float): Multiplier of the IQR for the fences, e.g. 1.5 (or 3.0 for far outliers)
+    """
+
+    z_score: Optional[float] = 4.0
+    robust_z_score: Optional[float] = None
+    iqr: Optional[float] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "CheckThresholds":
+        return cls(**json.loads(data))
+
+
 def is_out_of_bounds(
-    feature_value: float, lower_bound: float, upper_bound: float
-) -> bool:
+    feature_value: ArrayLike, lower_bound: ArrayLike, upper_bound: ArrayLike
+) -> Union[bool, np.ndarray]:
     """
     Checks if the feature_value is outside of the lower or upper bounds.
+
+    Accepts a scalar or a NumPy array of values. Arrays return a boolean mask.
+    The bounds may be arrays that broadcast against the values, e.g. one
+    bound per column of a (rows x features) matrix.
     """
 
-    return (feature_value < lower_bound) or (feature_value > upper_bound)
+    return (feature_value < lower_bound) | (feature_value > upper_bound)
 
 
 def is_outlier(
-    feature_value: float, mean: float, std_dev: float, outlier_cutoff: float = 4.0
-) -> bool:
+    feature_value: ArrayLike,
+    mean: ArrayLike,
+    std_dev: ArrayLike,
+    outlier_cutoff: ArrayLike = 4.0,
+) -> Union[bool, np.ndarray]:
     """
-    Checks if the Median Absolute Deviation (MAD) is greater than the outlier_cutoff (defaults to 4.0).
+    Checks if the absolute z-score, (feature_value - mean) / std_dev, is greater than the outlier_cutoff (defaults to 4.0).
+
+    Accepts a scalar or a NumPy array of values. Arrays return a boolean mask.
     """
 
+    if (
+        isinstance(feature_value, np.ndarray)
+        or isinstance(mean, np.ndarray)
+        or isinstance(std_dev, np.ndarray)
+    ):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (np.abs(feature_value - mean) / std_dev) > outlier_cutoff
+
     return (abs(feature_value - mean) / std_dev) > outlier_cutoff
+
+
+def is_outside_percentiles(
+    feature_value: ArrayLike,
+    quantiles: QuantileSketch,
+    lower_percentile: float = 0.5,
+    upper_percentile: float = 99.5,
+) -> Union[bool, np.ndarray]:
+    """
+    Checks if the feature_value is below the lower_percentile or above the upper_percentile of the baseline quantile sketch.
+
+    Accepts a scalar or a NumPy array of values. Arrays return a boolean mask.
+    """
+
+    lower_bound, upper_bound = quantiles.quantile(
+        np.array([lower_percentile, upper_percentile]) / 100
+    )
+    return is_out_of_bounds(feature_value, lower_bound, upper_bound)
+
+
+def robust_z_score(
+    feature_value: ArrayLike, median: ArrayLike, mad: ArrayLike
+) -> ArrayLike:
+    """
+    The modified z-score of Iglewicz and Hoaglin: 0.6745 * (feature_value - median) / MAD.
+
+    Unlike the z-score, the median and the Median Absolute Deviation (MAD)
+    are not skewed by outliers in the baseline.
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return MAD_SCALE * np.subtract(feature_value, median) / mad
+
+
+def is_robust_outlier(
+    feature_value: ArrayLike,
+    median: ArrayLike,
+    mad: ArrayLike,
+    outlier_cutoff: ArrayLike = 3.5,
+) -> Union[bool, np.ndarray]:
+    """
+    Checks if the absolute robust z-score is greater than the outlier_cutoff (defaults to 3.5).
+
+    Values never fail when the MAD is 0 (more than half of the baseline is a
+    single value), where every other value would.
+    """
+
+    with np.errstate(invalid="ignore"):
+        return (np.abs(robust_z_score(feature_value, median, mad)) > outlier_cutoff) & (
+            np.asarray(mad) > 0
+        )
+
+
+def iqr_fences(
+    q1: ArrayLike, q3: ArrayLike, multiplier: ArrayLike = 1.5
+) -> Tuple[ArrayLike, ArrayLike]:
+    """
+    Tukey's fences, q1 - multiplier * IQR and q3 + multiplier * IQR.
+
+    The fences are NaN, so no value is outside of them, when the IQR is 0.
+    """
+
+    iqr = np.subtract(q3, q1)
+    spread = np.where(iqr > 0, iqr, np.nan)
+    lower, upper = q1 - multiplier * spread, q3 + multiplier * spread
+
+    if np.ndim(lower) == 0:
+        return float(lower), float(upper)
+    return lower, upper
+
+
+def is_outside_iqr_fences(
+    feature_value: ArrayLike,
+    q1: ArrayLike,
+    q3: ArrayLike,
+    multiplier: ArrayLike = 1.5,
+) -> Union[bool, np.ndarray]:
+    """
+    Checks if the feature_value is outside of the IQR fences (see iqr_fences).
+
+    Accepts a scalar or a NumPy array of values. Arrays return a boolean mask.
+    """
+
+    lower_bound, upper_bound = iqr_fences(q1, q3, multiplier)
+    with np.errstate(invalid="ignore"):
+        return is_out_of_bounds(feature_value, lower_bound, upper_bound)
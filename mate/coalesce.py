@@ -0,0 +1,220 @@
+import logging
+import threading
+from datetime import datetime
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from mate.alerts import Alert, AlertTarget, FeatureAlertSummary
+
+logger = logging.getLogger("mate")
+
+# (mate name, mate version, feature name, alert kind)
+GroupKey = Tuple[str, int, str, str]
+
+
+class TokenBucket(object):
+    """
+    Token bucket allowing `rate` events per second with bursts of up to `capacity`
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+
+            if self._tokens < tokens:
+                return False
+
+            self._tokens -= tokens
+            return True
+
+
+class RateLimitedAlertTarget(AlertTarget):
+    """
+    Forward alerts to `target` at no more than `rate_per_minute`, with bursts of up to `burst`
+
+    Alerts over the limit are dropped and counted in `suppressed_count`.
+    """
+
+    def __init__(
+        self,
+        target: AlertTarget,
+        rate_per_minute: float,
+        burst: int = 1,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.target = target
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst, clock)
+        self.suppressed_count = 0
+
+    def _alert_webhook_url(self) -> str:
+        return self.target._alert_webhook_url()
+
+    def _format_alert(self, alert: Alert):
+        return self.target._format_alert(alert)
+
+    def send_alert(self, alert: Alert) -> Optional[bool]:
+        if not self._acquire():
+            return None
+
+        return self.target.send_alert(alert)
+
+    def deliver(
+        self, alert: Alert, max_retries: int = 0, backoff_factor: float = 0.0
+    ) -> Optional[bool]:
+        if not self._acquire():
+            return None
+
+        return self.target.deliver(alert, max_retries, backoff_factor)
+
+    def _acquire(self) -> bool:
+        if self.bucket.try_acquire():
+            return True
+
+        self.suppressed_count += 1
+        logger.warning(
+            f"Rate limit reached for {type(self.target).__name__}. Alert suppressed."
+        )
+        return False
+
+
+class _Group(object):
+    def __init__(self, first_seen: datetime):
+        self.count = 0
+        self.sample_values: List[str] = []
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+
+
+class AlertCoalescer(AlertTarget):
+    """
+    Coalesce feature alerts over a time window before sending them to targets
+
+    Feature alerts are grouped by (mate, version, feature, kind). When the
+    window closes, each mate gets one Alert with a FeatureAlertSummary per
+    group (count, up to `max_samples` sample values, first/last seen). Alerts
+    carrying an inference exception are forwarded immediately.
+
+        Parameters:
+            targets (list): Alert targets that receive the summaries
+            window_seconds (float): Length of the coalescing window (defaults to 60)
+            max_samples (int): Sample values kept per group (defaults to 5)
+            rate_per_minute (float): Optional per-target token-bucket rate limit
+            burst (int): Bucket capacity for the rate limit (defaults to 1)
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[AlertTarget],
+        window_seconds: float = 60.0,
+        max_samples: int = 5,
+        rate_per_minute: Optional[float] = None,
+        burst: int = 1,
+        clock: Callable[[], float] = monotonic,
+    ):
+        if rate_per_minute is not None:
+            targets = [
+                RateLimitedAlertTarget(target, rate_per_minute, burst, clock)
+                for target in targets
+            ]
+
+        self.targets = list(targets)
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self.clock = clock
+
+        self._groups: Dict[GroupKey, _Group] = {}
+        self._window_end: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def _alert_webhook_url(self) -> str:
+        return ""
+
+    def _format_alert(self, alert: Alert) -> str:
+        return f"{len(self._groups)} pending alert groups"
+
+    def send_alert(self, alert: Alert) -> bool:
+        if self._window_end is not None and self.clock() >= self._window_end:
+            self.flush()
+
+        if alert.exception is not None:
+            self._send(Alert(alert.mate_name, [], alert.exception))
+
+        now = datetime.now()
+        with self._lock:
+            for feature_alert in alert.features:
+                key = (
+                    alert.mate_name,
+                    feature_alert.feature.mate.version,
+                    feature_alert.name,
+                    feature_alert.kind,
+                )
+                group = self._groups.get(key)
+                if group is None:
+                    group = self._groups[key] = _Group(now)
+
+                group.count += 1
+                group.last_seen = now
+                if len(group.sample_values) < self.max_samples:
+                    group.sample_values.append(
+                        str(feature_alert.feature_value.typed_value)
+                    )
+
+            if self._groups and self._window_end is None:
+                self._window_end = self.clock() + self.window_seconds
+                self._timer = threading.Timer(self.window_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        return True
+
+    def flush(self):
+        """
+        Closes the current window and sends one summarized Alert per mate.
+        """
+        with self._lock:
+            groups, self._groups = self._groups, {}
+            self._window_end = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        alerts: Dict[str, Alert] = {}
+        for (mate_name, mate_version, feature_name, kind), group in groups.items():
+            alert = alerts.setdefault(mate_name, Alert(mate_name, [], None))
+            alert.summaries.append(
+                FeatureAlertSummary(
+                    mate_name=mate_name,
+                    mate_version=mate_version,
+                    feature_name=feature_name,
+                    kind=kind,
+                    count=group.count,
+                    sample_values=group.sample_values,
+                    first_seen=group.first_seen,
+                    last_seen=group.last_seen,
+                )
+            )
+
+        for alert in alerts.values():
+            self._send(alert)
+
+    def _send(self, alert: Alert):
+        for target in self.targets:
+            target.send_alert(alert)
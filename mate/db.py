@@ -1,25 +1,67 @@
 import datetime
 import logging
 import os
-import pathlib
-from typing import List, Union
+import threading
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
+import numpy as np
+import pandas as pd  # type: ignore
 from peewee import (  # type: ignore
+    BlobField,
     CharField,
+    Database,
     DatabaseProxy,
     DateTimeField,
+    Field,
     FloatField,
     ForeignKeyField,
     IntegerField,
     Model,
     SqliteDatabase,
+    TextField,
+    chunked,
+    fn,
+)
+from playhouse.migrate import SchemaMigrator, migrate  # type: ignore
+from playhouse.pool import PooledDatabase  # type: ignore
+
+from mate.backends import (  # noqa: F401
+    SQLITE_PRAGMAS,
+    StorageBackend,
+    backend_for,
+    backend_from_url,
+    get_default_backend,
 )
+from mate.cache import baseline_cache
+from mate.checks import CheckThresholds
+from mate.metrics import DB_WRITES, get_metrics_sink
+from mate.stats import FeatureType
 
 logger = logging.getLogger("mate")
 
+# rows per multi-row INSERT or IN (...) list; keeps each statement under
+# SQLite's variable limit
+INSERT_BATCH_SIZE = 100
+
 
 db = DatabaseProxy()
 
+# set by init_db; see get_backend
+_backend: Optional[StorageBackend] = None
+_backend_database: Optional[Database] = None
+
 
 class Mate(Model):
     name = CharField()
@@ -30,6 +72,7 @@ class Mate(Model):
     class Meta:
         database = db
         table_name = "mate"
+        indexes = ((("name", "version"), False),)
 
 
 class Inference(Model):
@@ -40,6 +83,7 @@ class Inference(Model):
     class Meta:
         database = db
         table_name = "inference"
+        indexes = ((("mate", "created_at"), False),)
 
 
 class Feature(Model):
@@ -47,10 +91,12 @@ class Feature(Model):
     inferred_type = CharField()
     mate = ForeignKeyField(Mate)
     created_at = DateTimeField(default=datetime.datetime.now)
+    thresholds = TextField(null=True)  # serialized CheckThresholds
 
     class Meta:
         database = db
         table_name = "feature"
+        indexes = ((("mate", "name"), False),)
 
 
 class NumericalStats(Model):
@@ -61,6 +107,14 @@ class NumericalStats(Model):
     std_dev = FloatField()
     min = IntegerField()
     max = IntegerField()
+    quantile_sketch = BlobField(null=True)
+    histogram = BlobField(null=True)
+    median = FloatField(null=True)
+    mad = FloatField(null=True)  # median absolute deviation from the median
+    q1 = FloatField(null=True)
+    q3 = FloatField(null=True)
+    # JSON {percentile: exact value} at TAIL_PERCENTILES (in-memory baselines)
+    tail_quantiles = TextField(null=True)
     feature = ForeignKeyField(Feature)
     created_at = DateTimeField(default=datetime.datetime.now)
 
@@ -73,6 +127,8 @@ class StringStats(Model):
     num_present = IntegerField()
     num_missing = IntegerField()
     distinct_count = IntegerField()
+    distinct_sketch = BlobField(null=True)  # serialized HyperLogLog
+    top_k = BlobField(null=True)  # serialized TopK
     feature = ForeignKeyField(Feature)
     created_at = DateTimeField(default=datetime.datetime.now)
 
@@ -82,7 +138,12 @@ class StringStats(Model):
 
 
 class FeatureValue(Model):
-    value = CharField(null=True)
+    value = CharField(null=True)  # strings and other non-numerical values
+    value_int = IntegerField(null=True)
+    value_real = FloatField(null=True)
+    # probability the value was recorded with (1.0 when every value is);
+    # NULL when it was recorded only because of an alert
+    sample_rate = FloatField(null=True)
     feature = ForeignKeyField(Feature)
     inference = ForeignKeyField(Inference)
     created_at = DateTimeField(default=datetime.datetime.now)
@@ -90,6 +151,19 @@ class FeatureValue(Model):
     class Meta:
         database = db
         table_name = "feature_value"
+        indexes = ((("feature", "created_at"), False),)
+
+    @property
+    def typed_value(self) -> Any:
+        """
+        The stored value, whichever column holds it.
+        """
+        if self.value_int is not None:
+            return self.value_int
+        if self.value_real is not None:
+            return self.value_real
+
+        return self.value
 
 
 class FeatureAlert(Model):
@@ -102,33 +176,261 @@ class FeatureAlert(Model):
     class Meta:
         database = db
         table_name = "feature_alert"
+        indexes = ((("feature", "kind"), False),)
 
 
-def connect_db():
-    db = init_db()
+class FeatureAggregate(Model):
+    feature = ForeignKeyField(Feature)
+    bucket_start = DateTimeField()
+    bucket_seconds = IntegerField()
+    count = IntegerField()  # values seen, nulls included
+    null_count = IntegerField()
+    mean = FloatField(null=True)
+    m2 = FloatField(null=True)  # sum of squared differences from the mean
+    min = FloatField(null=True)
+    max = FloatField(null=True)
+    sketch = BlobField(null=True)  # serialized QuantileSketch
+
+    class Meta:
+        database = db
+        table_name = "feature_aggregate"
+        indexes = ((("feature", "bucket_seconds", "bucket_start"), True),)
+
+
+MODELS = [
+    Mate,
+    Inference,
+    Feature,
+    NumericalStats,
+    StringStats,
+    FeatureValue,
+    FeatureAlert,
+    FeatureAggregate,
+]
+
+
+@dataclass
+class InferenceRecord:
+    """
+    Rows recorded for one RunningMate and written by `save_inference_records`.
+
+    Rows are kept as plain tuples so large batches avoid building a model
+    instance per value. Feature values point at their inference by position
+    (0 to inference_count - 1) and feature alerts point at their value by
+    position in `feature_values`, so a record can be built before any IDs exist.
+    """
+
+    mate: Mate
+    inference_count: int = 1
+    runtime: Optional[float] = None
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.now)
+    # (value, feature id, inference position, sample rate); see `typed_columns`
+    feature_values: List[Tuple[Any, int, int, Optional[float]]] = field(
+        default_factory=list
+    )
+    # (alert, value position, inference position)
+    feature_alerts: List[Tuple[FeatureAlert, int, int]] = field(default_factory=list)
+    inference_ids: List[int] = field(default_factory=list)
+
+
+def typed_columns(value: Any) -> Tuple[Optional[str], Optional[int], Optional[float]]:
+    """
+    Splits a feature value into the (value, value_int, value_real) columns
+    of FeatureValue. Integers and floats are stored natively; NaN and None
+    are stored as NULL; anything else is stored as text.
+    """
+    if value is None or isinstance(value, (bool, np.bool_)):
+        return (None if value is None else str(value), None, None)
+    if isinstance(value, (int, np.integer)):
+        return (None, int(value), None)
+    if isinstance(value, (float, np.floating)):
+        return (None, None, None) if value != value else (None, None, float(value))
+
+    return (str(value), None, None)
+
+
+def connect_db(backend: Optional[Union[StorageBackend, str]] = None):
+    db = init_db(backend)
     db.connect()
 
-    if (
-        not db.table_exists("mate")
-        or not db.table_exists("inference")
-        or not db.table_exists("feature")
-        or not db.table_exists("numerical_stats")
-        or not db.table_exists("string_stats")
-        or not db.table_exists("feature_alert")
-        or not db.table_exists("feature_value")
-    ):
-        db.create_tables(
+    migrate_db()
+
+
+def write_transaction():
+    """
+    `db.atomic()` that takes SQLite's write lock when it begins (BEGIN
+    IMMEDIATE). A deferred transaction that reads before it writes fails with
+    "database is locked" when another writer commits first, without waiting
+    on the busy timeout.
+    """
+    if isinstance(db.obj, SqliteDatabase):
+        return db.atomic("IMMEDIATE")
+
+    return db.atomic()
+
+
+def acquire_connection() -> bool:
+    """
+    Checks a connection out of the pool for the current thread, when the
+    database is pooled and the thread holds none. Returns whether it did, to
+    be passed to `release_connection`.
+    """
+    if isinstance(db.obj, PooledDatabase) and db.is_closed():
+        db.connect()
+        return True
+
+    return False
+
+
+def release_connection(acquired: bool):
+    if acquired and not db.is_closed():
+        db.close()
+
+
+def _reset_connections_after_fork():
+    # a forked child must neither use nor close the connections it inherited
+    # (they share the parent's file locks or sockets), so it forgets them and
+    # connects anew on first use
+    database = db.obj
+    if database is None:
+        return
+
+    database._state.reset()
+    database._lock = threading.RLock()
+    if isinstance(database, PooledDatabase):
+        database._connections = []
+        database._in_use = {}
+        database._pool_lock = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+
+
+def get_backend() -> StorageBackend:
+    """
+    The backend of the database bound to `db`, including one bound directly
+    with `db.initialize`.
+    """
+    if _backend is not None and _backend_database is db.obj:
+        return _backend
+
+    return backend_for(db.obj)
+
+
+def bulk_insert(
+    model: Type[Model], fields: List[Field], rows: List[Tuple]
+) -> List[int]:
+    """
+    Inserts rows (tuples aligned with `fields`) with multi-row INSERTs and
+    returns their IDs in insertion order. Call inside `db.atomic()`.
+    """
+    return get_backend().bulk_insert(model, fields, rows)
+
+
+def save_inference_records(records: Sequence[InferenceRecord]):
+    """
+    Writes the inferences, feature values and feature alerts of `records` in a
+    single transaction with one multi-row INSERT per table (per batch size).
+
+    The IDs of the new rows are stored on the records, and the FeatureAlert
+    instances (with their FeatureValue) are updated in place to point at them.
+    """
+
+    with write_transaction():
+        inference_ids = bulk_insert(
+            Inference,
+            [Inference.mate, Inference.runtime, Inference.created_at],
             [
-                Mate,
-                Inference,
-                Feature,
-                NumericalStats,
-                StringStats,
-                FeatureValue,
-                FeatureAlert,
+                (record.mate.id, record.runtime, record.created_at)
+                for record in records
+                for _ in range(record.inference_count)
+            ],
+        )
+
+        value_rows: List[Tuple] = []
+        new_ids = iter(inference_ids)
+        for record in records:
+            record.inference_ids = [
+                next(new_ids) for _ in range(record.inference_count)
             ]
+
+            value_rows.extend(
+                (
+                    *typed_columns(value),
+                    sample_rate,
+                    feature_id,
+                    record.inference_ids[position],
+                    record.created_at,
+                )
+                for value, feature_id, position, sample_rate in record.feature_values
+            )
+
+        value_ids = bulk_insert(
+            FeatureValue,
+            [
+                FeatureValue.value,
+                FeatureValue.value_int,
+                FeatureValue.value_real,
+                FeatureValue.sample_rate,
+                FeatureValue.feature,
+                FeatureValue.inference,
+                FeatureValue.created_at,
+            ],
+            value_rows,
         )
 
+        alert_rows: List[Tuple] = []
+        offset = 0
+        for record in records:
+            for feature_alert, value_position, position in record.feature_alerts:
+                feature_alert.inference = Inference(
+                    id=record.inference_ids[position],
+                    mate=record.mate,
+                    created_at=record.created_at,
+                )
+                feature_alert.feature_value.id = value_ids[offset + value_position]
+                feature_alert.feature_value.inference = feature_alert.inference
+                alert_rows.append(
+                    (
+                        feature_alert.name,
+                        feature_alert.kind,
+                        feature_alert.feature_value.id,
+                        feature_alert.feature.id,
+                        feature_alert.inference.id,
+                    )
+                )
+            offset += len(record.feature_values)
+
+        alert_ids = bulk_insert(
+            FeatureAlert,
+            [
+                FeatureAlert.name,
+                FeatureAlert.kind,
+                FeatureAlert.feature_value,
+                FeatureAlert.feature,
+                FeatureAlert.inference,
+            ],
+            alert_rows,
+        )
+
+        feature_alerts = [
+            feature_alert
+            for record in records
+            for feature_alert, _, _ in record.feature_alerts
+        ]
+        for feature_alert, alert_id in zip(feature_alerts, alert_ids):
+            feature_alert.id = alert_id
+
+    metrics = get_metrics_sink()
+    if metrics is not None:
+        for table, rows in (
+            ("inference", inference_ids),
+            ("feature_value", value_ids),
+            ("feature_alert", alert_ids),
+        ):
+            metrics.increment(DB_WRITES, len(rows), {"table": table})
+
 
 def get_current_mate(name: str) -> Union[Mate, None]:
     mate = Mate.select().where(Mate.name == name).order_by(Mate.version.desc()).limit(1)
@@ -145,32 +447,401 @@ def get_features(mate: Mate) -> List[Feature]:
     return features
 
 
-def get_feature_values(mate: Mate) -> List[FeatureValue]:
-    feature_values = FeatureValue.select().join(Feature).where(Feature.mate == mate)
+def _read_archived_values(mate: Mate) -> pd.DataFrame:
+    # imported here because mate.archive imports the models from this module
+    from mate.archive import read_archive
+
+    return read_archive(mate, "feature_value")
+
 
-    return feature_values
+def _iter_archived_values(mate: Mate) -> Iterator[pd.DataFrame]:
+    from mate.archive import iter_archive
+
+    return iter_archive(mate, "feature_value")
+
+
+def _none_if_nan(value: Any) -> Any:
+    return None if value is None or value != value else value
+
+
+def _not_in_database(archived: pd.DataFrame, hot: Dict[int, Any]) -> np.ndarray:
+    """
+    Mask of the archived rows that are not also in the database, which they
+    are when their delete failed after their file was written. `hot` maps the
+    ids of database rows to their created_at: rows are matched on both, as
+    SQLite reuses the ids of deleted rows.
+    """
+    hot_created_at = pd.to_datetime(archived["id"].map(hot))
+
+    return (hot_created_at != pd.to_datetime(archived["created_at"])).to_numpy()
+
+
+def get_feature_values(mate: Mate, include_archive: bool = False) -> List[FeatureValue]:
+    """
+    Recorded values of `mate` still in the database, as a query.
+
+    With `include_archive`, the archived values (see mate.archive) are read
+    too, and a list is returned with them first. That loads every value of
+    the mate into memory; use iter_feature_values to stream them instead.
+    """
+    query = FeatureValue.select().join(Feature).where(Feature.mate == mate)
+    if not include_archive:
+        return query
+
+    feature_values = list(query)
+    archived = _read_archived_values(mate)
+    if archived.empty:
+        return feature_values
+
+    archived = archived[
+        _not_in_database(
+            archived,
+            {
+                feature_value.id: feature_value.created_at
+                for feature_value in feature_values
+            },
+        )
+    ]
+    features = {feature.name: feature for feature in get_features(mate)}
+
+    return [
+        FeatureValue(
+            id=row.id,
+            value=_none_if_nan(row.value),
+            value_int=(
+                int(row.value_int) if _none_if_nan(row.value_int) is not None else None
+            ),
+            value_real=_none_if_nan(row.value_real),
+            sample_rate=_none_if_nan(getattr(row, "sample_rate", None)),
+            feature=features.get(row.feature_name),
+            inference_id=row.inference_id,
+            created_at=row.created_at,
+        )
+        for row in archived.itertuples()
+    ] + feature_values
+
+
+@dataclass
+class FeatureValueFilter:
+    """
+    Server-side filters for the feature value iterators. Ranges include
+    `start`/`min_inference_id` and exclude `end`/`max_inference_id`.
+    """
+
+    feature_name: Optional[str] = None
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    min_inference_id: Optional[int] = None
+    max_inference_id: Optional[int] = None
+
+
+@dataclass
+class FeatureValueChunk:
+    """
+    Up to `chunk_size` FeatureValue rows as aligned NumPy columns.
+
+    `numbers` holds the value_int/value_real columns as floats (NaN when the
+    value is NULL or stored as text) and `texts` the text column.
+    `sample_rates` holds the probability each value was recorded with, NaN
+    for values recorded only because of an alert: weight sampled values by
+    1 / rate and leave out the NaN ones for unbiased statistics.
+    """
+
+    ids: np.ndarray
+    feature_ids: np.ndarray
+    inference_ids: np.ndarray
+    created_at: np.ndarray
+    numbers: np.ndarray
+    texts: np.ndarray
+    sample_rates: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple]) -> "FeatureValueChunk":
+        (
+            ids,
+            feature_ids,
+            inference_ids,
+            created_at,
+            numbers,
+            texts,
+            sample_rates,
+        ) = zip(*rows)
+
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            feature_ids=np.array(feature_ids, dtype=np.int64),
+            inference_ids=np.array(inference_ids, dtype=np.int64),
+            created_at=np.array(created_at, dtype="datetime64[us]"),
+            numbers=np.array(numbers, dtype=float),
+            texts=np.array(texts, dtype=object),
+            sample_rates=np.array(sample_rates, dtype=float),
+        )
+
+
+def _feature_value_query(mate: Mate, filters: FeatureValueFilter):
+    query = (
+        FeatureValue.select(
+            FeatureValue.id,
+            FeatureValue.feature,
+            FeatureValue.inference,
+            FeatureValue.created_at,
+            fn.COALESCE(FeatureValue.value_real, FeatureValue.value_int),
+            FeatureValue.value,
+            FeatureValue.sample_rate,
+        )
+        .join(Feature)
+        .where(Feature.mate == mate)
+    )
+
+    if filters.feature_name is not None:
+        query = query.where(Feature.name == filters.feature_name)
+    if filters.start is not None:
+        query = query.where(FeatureValue.created_at >= filters.start)
+    if filters.end is not None:
+        query = query.where(FeatureValue.created_at < filters.end)
+    if filters.min_inference_id is not None:
+        query = query.where(FeatureValue.inference >= filters.min_inference_id)
+    if filters.max_inference_id is not None:
+        query = query.where(FeatureValue.inference < filters.max_inference_id)
+
+    return query
+
+
+def _hot_rows(mate: Mate, first_id: int, last_id: int) -> Dict[int, Any]:
+    return dict(
+        FeatureValue.select(FeatureValue.id, FeatureValue.created_at)
+        .join(Feature)
+        .where((Feature.mate == mate) & FeatureValue.id.between(first_id, last_id))
+        .tuples()
+    )
+
+
+def _archived_chunks(
+    mate: Mate, filters: FeatureValueFilter, chunk_size: int
+) -> Iterator[FeatureValueChunk]:
+    feature_ids = {feature.name: feature.id for feature in get_features(mate)}
+
+    for frame in _iter_archived_values(mate):
+        if frame.empty:
+            continue
+
+        created_at = pd.to_datetime(frame["created_at"])
+        keep = _not_in_database(
+            frame, _hot_rows(mate, int(frame["id"].min()), int(frame["id"].max()))
+        )
+
+        if filters.feature_name is not None:
+            keep &= frame["feature_name"].to_numpy() == filters.feature_name
+        if filters.start is not None:
+            keep &= (created_at >= filters.start).to_numpy()
+        if filters.end is not None:
+            keep &= (created_at < filters.end).to_numpy()
+        if filters.min_inference_id is not None:
+            keep &= frame["inference_id"].to_numpy() >= filters.min_inference_id
+        if filters.max_inference_id is not None:
+            keep &= frame["inference_id"].to_numpy() < filters.max_inference_id
+
+        frame = frame[keep]
+        rows = list(
+            zip(
+                frame["id"],
+                frame["feature_name"].map(feature_ids),
+                frame["inference_id"],
+                created_at[keep],
+                frame["value_real"].fillna(frame["value_int"]),
+                frame["value"],
+                # not in archives written before it was recorded
+                frame.get("sample_rate", pd.Series(np.nan, index=frame.index)),
+            )
+        )
+        for batch in chunked(rows, chunk_size):
+            yield FeatureValueChunk.from_rows(batch)
+
+
+def iter_feature_values(
+    mate: Mate,
+    filters: Optional[FeatureValueFilter] = None,
+    chunk_size: int = 10_000,
+    include_archive: bool = True,
+) -> Iterator[FeatureValueChunk]:
+    """
+    Streams the recorded values of `mate` in id order as NumPy chunks of up
+    to `chunk_size` rows, archived ones (see mate.archive) first.
+
+    Rows are read with a single cursor (`.tuples().iterator()`), so memory is
+    bounded by the chunk size, but the read transaction stays open until the
+    iterator is exhausted. For long jobs that process each chunk slowly, use
+    `iter_feature_values_keyset`.
+    """
+    filters = filters or FeatureValueFilter()
+
+    if include_archive:
+        yield from _archived_chunks(mate, filters, chunk_size)
+
+    cursor = (
+        _feature_value_query(mate, filters)
+        .order_by(FeatureValue.id)
+        .tuples()
+        .iterator()
+    )
+    for rows in chunked(cursor, chunk_size):
+        yield FeatureValueChunk.from_rows(rows)
+
+
+def iter_feature_values_keyset(
+    mate: Mate,
+    filters: Optional[FeatureValueFilter] = None,
+    chunk_size: int = 10_000,
+    include_archive: bool = True,
+) -> Iterator[FeatureValueChunk]:
+    """
+    Like `iter_feature_values`, but each chunk is its own short query
+    (`WHERE id > <last id> ORDER BY id LIMIT <chunk_size>`), so no read
+    transaction is held between chunks and rows written meanwhile are seen.
+    """
+    filters = filters or FeatureValueFilter()
+
+    if include_archive:
+        yield from _archived_chunks(mate, filters, chunk_size)
+
+    query = _feature_value_query(mate, filters)
+    last_id = 0
+
+    while True:
+        rows = list(
+            query.where(FeatureValue.id > last_id)
+            .order_by(FeatureValue.id)
+            .limit(chunk_size)
+            .tuples()
+        )
+        if not rows:
+            break
+
+        yield FeatureValueChunk.from_rows(rows)
+        last_id = rows[-1][0]
+
+
+def get_feature_value_array(mate: Mate, feature_name: str) -> np.ndarray:
+    """
+    The recorded values of one feature of `mate`, oldest first, as a NumPy
+    array: floats (NaN for nulls) for numerical features, objects otherwise.
+    Archived values (see mate.archive) are included.
+    """
+    feature = Feature.get_or_none(
+        (Feature.mate == mate) & (Feature.name == feature_name)
+    )
+    if feature is None:
+        return np.empty(0)
+
+    query = FeatureValue.select(
+        FeatureValue.id,
+        fn.COALESCE(FeatureValue.value_real, FeatureValue.value_int),
+        FeatureValue.value,
+        FeatureValue.created_at,
+    ).where(FeatureValue.feature == feature)
+    rows = pd.DataFrame(
+        list(query.order_by(FeatureValue.id).tuples()),
+        columns=["id", "number", "value", "created_at"],
+    )
+
+    archived = _read_archived_values(mate)
+    if not archived.empty:
+        archived = archived[
+            (archived["feature_name"] == feature_name).to_numpy()
+            & _not_in_database(archived, dict(zip(rows["id"], rows["created_at"])))
+        ]
+        rows = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "id": archived["id"],
+                        "number": archived["value_real"].fillna(archived["value_int"]),
+                        "value": archived["value"],
+                    }
+                ),
+                rows,
+            ],
+            ignore_index=True,
+        )
+
+    if rows.empty:
+        return np.empty(0)
+
+    if feature.inferred_type not in (
+        FeatureType.INTEGER.value,
+        FeatureType.FRACTION.value,
+    ):
+        return rows["value"].to_numpy(dtype=object)
+
+    values = pd.to_numeric(rows["number"]).to_numpy(dtype=float)
+    texts = rows["value"].to_numpy(dtype=object)
+    # rows written as text before typed storage, or with a non-numerical value
+    legacy = np.isnan(values) & pd.notna(texts)
+    if legacy.any():
+        values[legacy] = pd.to_numeric(
+            pd.Series(texts[legacy]), errors="coerce"
+        ).to_numpy(dtype=float)
+
+    return values
+
+
+def get_mate(name: str, version: int) -> Union[Mate, None]:
+    return Mate.get_or_none((Mate.name == name) & (Mate.version == version))
 
 
 def get_statistics(Stats: Model, feature: Feature) -> Model:
     return Stats.get(feature=feature)
 
 
-def init_db() -> SqliteDatabase:
-    test_mode = int(os.getenv("TESTING", "0"))
+def init_db(backend: Optional[Union[StorageBackend, str]] = None) -> DatabaseProxy:
+    """
+    Binds `db` to a backend: a StorageBackend, a database URL (see
+    `backend_from_url`), or `get_default_backend()` when not given.
+    """
+    global _backend, _backend_database
 
-    if test_mode:
-        database = SqliteDatabase(":memory:")
-        logger.info("Using in-memory SQLite")
-    else:
-        BASE = pathlib.Path.cwd()
-        database = SqliteDatabase(BASE / "mate.db")
-        logger.info("Using disk-based SQLite")
+    if backend is None:
+        backend = get_default_backend()
+    elif isinstance(backend, str):
+        backend = backend_from_url(backend)
+
+    database = backend.create_database()
+    logger.info(f"Using {type(backend).__name__}")
 
     db.initialize(database)
+    _backend, _backend_database = backend, database
+    baseline_cache.clear()
 
     return db
 
 
+def migrate_db():
+    """
+    Brings the schema of a new or existing database up to date.
+
+    Creates missing tables and indexes (CREATE ... IF NOT EXISTS) and adds
+    missing nullable columns to existing tables, so it is safe to run on every
+    connect.
+    """
+
+    db.create_tables(MODELS, safe=True)
+
+    migrator = SchemaMigrator.from_database(db.obj)
+    for model in MODELS:
+        table = model._meta.table_name
+        columns = {column.name for column in db.get_columns(table)}
+        migrate(
+            *[
+                migrator.add_column(table, field.column_name, field)
+                for field in model._meta.sorted_fields
+                if field.column_name not in columns
+            ]
+        )
+
+
 def version_or_create_mate(name: str) -> Mate:
     current_mate = get_current_mate(name)
 
@@ -183,5 +854,38 @@ def version_or_create_mate(name: str) -> Mate:
 
     mate = Mate(name=name, version=version)
     mate.save()
+    baseline_cache.invalidate(name)
 
     return mate
+
+
+def set_feature_thresholds(
+    name: str, version: int, thresholds: Mapping[str, Optional[CheckThresholds]]
+):
+    """
+    Persists check thresholds for features of a mate version. They replace
+    the thresholds RunningMate is given for those features; None resets a
+    feature to them.
+
+    Raises ValueError when the mate version or a feature doesn't exist.
+    """
+    mate = get_mate(name, version)
+    if mate is None:
+        raise ValueError(f"Version {version} of the '{name}' mate not found.")
+
+    features = {feature.name: feature for feature in get_features(mate)}
+    unknown = sorted(set(thresholds) - set(features))
+    if unknown:
+        raise ValueError(
+            f"Version {version} of the '{name}' mate has no features {unknown}."
+        )
+
+    with write_transaction():
+        for feature_name, feature_thresholds in thresholds.items():
+            feature = features[feature_name]
+            feature.thresholds = (
+                feature_thresholds.to_json() if feature_thresholds else None
+            )
+            feature.save(only=[Feature.thresholds])
+
+    baseline_cache.invalidate(name, version)
@@ -0,0 +1,174 @@
+import datetime
+import json
+import logging
+import pathlib
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, List, Optional, Sequence, Set, Union
+
+from mate.alerts import Alert, AlertTarget
+from mate.metrics import QUEUE_DEPTH, get_metrics_sink
+
+logger = logging.getLogger("mate")
+
+
+@dataclass
+class DeadLetter:
+    target: AlertTarget
+    alert: Alert
+    error: str
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.now)
+
+
+class DeadLetterStore(object):
+    """
+    Alerts that could not be delivered after all retries
+
+        Parameters:
+            max_size (int): Dead letters kept in memory, oldest dropped first (defaults to 1000)
+            path (str or Path): Optional JSON Lines file each dead letter is appended to
+    """
+
+    def __init__(
+        self, max_size: int = 1000, path: Optional[Union[str, pathlib.Path]] = None
+    ):
+        self.path = pathlib.Path(path) if path else None
+        self._letters: Deque[DeadLetter] = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    def add(self, target: AlertTarget, alert: Alert, error: str):
+        letter = DeadLetter(target=target, alert=alert, error=error)
+
+        with self._lock:
+            self._letters.append(letter)
+
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(self._serialize(letter), default=str) + "\n")
+
+        logger.error(f"Dead-lettered alert for {type(target).__name__}: {error}")
+
+    def pop_all(self) -> List[DeadLetter]:
+        with self._lock:
+            letters = list(self._letters)
+            self._letters.clear()
+
+        return letters
+
+    def __len__(self) -> int:
+        return len(self._letters)
+
+    def _serialize(self, letter: DeadLetter) -> dict:
+        try:
+            payload: Any = letter.target._format_alert(letter.alert)
+        except Exception:
+            payload = None
+
+        return {
+            "target": type(letter.target).__name__,
+            "mate_name": letter.alert.mate_name,
+            "payload": payload,
+            "exception": (
+                asdict(letter.alert.exception) if letter.alert.exception else None
+            ),
+            "error": letter.error,
+            "created_at": letter.created_at.isoformat(),
+        }
+
+
+class AlertDispatcher(object):
+    """
+    Delivers alerts on a thread pool, off the inference critical path
+
+    Each (alert, target) pair is delivered by a pool thread with the target's
+    own timeout. Webhook deliveries that fail with a connection error, 429 or
+    5xx response are retried with exponential backoff; deliveries that still
+    fail or raise are added to the dead-letter store.
+
+        Parameters:
+            max_workers (int): Delivery threads (defaults to 4)
+            dead_letters (DeadLetterStore): Where failed alerts go (defaults to an in-memory store)
+            max_retries (int): Retries per delivery (defaults to 3)
+            backoff_factor (float): Retry N sleeps backoff_factor * 2 ** (N - 1) seconds (defaults to 0.5)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        dead_letters: Optional[DeadLetterStore] = None,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.dead_letters = (
+            dead_letters if dead_letters is not None else DeadLetterStore()
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mate-alerts"
+        )
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def dispatch(self, alert: Alert, targets: Sequence[AlertTarget]) -> List[Future]:
+        futures = []
+
+        for target in targets:
+            future = self._executor.submit(self._deliver, target, alert)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._done)
+            futures.append(future)
+
+        metrics = get_metrics_sink()
+        if metrics is not None:
+            metrics.gauge(QUEUE_DEPTH, self.queue_depth, {"queue": "dispatcher"})
+
+        return futures
+
+    def retry_dead_letters(self) -> List[Future]:
+        """
+        Queues every dead letter for another delivery attempt.
+        """
+        futures = []
+
+        for letter in self.dead_letters.pop_all():
+            futures.extend(self.dispatch(letter.alert, [letter.target]))
+
+        return futures
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        Waits for alerts dispatched so far to be delivered or dead-lettered.
+        """
+        with self._lock:
+            pending = list(self._pending)
+
+        for future in pending:
+            future.exception(timeout)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _deliver(self, target: AlertTarget, alert: Alert) -> bool:
+        try:
+            delivered = target.deliver(alert, self.max_retries, self.backoff_factor)
+        except Exception as e:
+            self.dead_letters.add(target, alert, repr(e))
+            return False
+
+        if delivered is False:
+            self.dead_letters.add(target, alert, "delivery failed")
+            return False
+
+        return True
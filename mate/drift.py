@@ -0,0 +1,232 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from mate.baseline import CompiledBaseline
+from mate.sketches import Histogram, QuantileSketch
+
+logger = logging.getLogger("mate")
+
+# added to every bin proportion, so empty bins don't make PSI infinite
+SMOOTHING = 1e-3
+
+DEFAULT_THRESHOLDS = {"psi": 0.2, "ks": 0.1, "js": 0.1}
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> float:
+    """
+    PSI between two histograms (counts or proportions over the same bins).
+    """
+    p = (expected / expected.sum() + SMOOTHING) / (1 + SMOOTHING * len(expected))
+    q = (actual / actual.sum() + SMOOTHING) / (1 + SMOOTHING * len(actual))
+
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def jensen_shannon_divergence(expected: np.ndarray, actual: np.ndarray) -> float:
+    """
+    Jensen-Shannon divergence (base 2, so 0 to 1) between two histograms.
+    """
+    p = expected / expected.sum()
+    q = actual / actual.sum()
+    m = (p + q) / 2
+
+    def kl(a: np.ndarray) -> float:
+        nonzero = a > 0
+        return float(np.sum(a[nonzero] * np.log2(a[nonzero] / m[nonzero])))
+
+    return (kl(p) + kl(q)) / 2
+
+
+def ks_statistic(sketch: QuantileSketch, values: np.ndarray) -> float:
+    """
+    Kolmogorov-Smirnov statistic between `values` and the distribution
+    summarized by `sketch`.
+    """
+    values = np.sort(values)
+    if len(values) == 0 or sketch.count == 0:
+        return 0.0
+
+    # both CDFs are right-continuous step functions, so comparing them at the
+    # window's values and a grid of baseline quantiles also handles ties
+    points = np.unique(
+        np.concatenate([values, sketch.quantile(np.linspace(0, 1, 201))])
+    )
+    window_cdf = np.searchsorted(values, points, side="right") / len(values)
+
+    return float(np.abs(window_cdf - sketch.cdf(points)).max())
+
+
+@dataclass
+class DriftResult:
+    feature_name: str
+    window_size: int
+    psi: float
+    ks: float
+    js: float
+    drifted: bool
+
+
+class _FeatureWindow(object):
+    """
+    The last `size` values of one feature in a ring buffer, with the counts of
+    the baseline histogram bins they fall in kept up to date on every add.
+    """
+
+    def __init__(self, size: int, histogram: Histogram, sketch: QuantileSketch):
+        self.histogram = histogram
+        self.sketch = sketch
+        # bins are (edges[i], edges[i + 1]], like Histogram.from_sketch, and
+        # the outer bins are open-ended so out-of-range values still count
+        self.inner_edges = histogram.edges[1:-1]
+        self.values = np.empty(size)
+        self.bins = np.zeros(size, dtype=np.int64)
+        self.counts = np.zeros(len(histogram.counts), dtype=np.int64)
+        self.position = 0
+        self.filled = 0
+
+    def __len__(self) -> int:
+        return self.filled
+
+    def add(self, values: np.ndarray):
+        size = len(self.values)
+        values = values[-size:]
+        bins = np.searchsorted(self.inner_edges, values, side="left")
+
+        slots = (self.position + np.arange(len(values))) % size
+        evicted = slots[slots < self.filled] if self.filled < size else slots
+        self.counts -= np.bincount(self.bins[evicted], minlength=len(self.counts))
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+        self.values[slots] = values
+        self.bins[slots] = bins
+        self.position = (self.position + len(values)) % size
+        self.filled = min(self.filled + len(values), size)
+
+    def window(self) -> np.ndarray:
+        return self.values[: self.filled]
+
+
+class DriftMonitor(object):
+    """
+    Windowed drift detection against the baseline distributions
+
+    Keeps the last `window_size` values of each numerical feature in a ring
+    buffer. Every `check_every` updates (RunningMate calls `update` once per
+    inference), the window is compared with the baseline histogram and
+    quantile sketch stored by `generate_baseline_stats`: PSI and
+    Jensen-Shannon over the histogram bins (kept incrementally, so O(bins))
+    and Kolmogorov-Smirnov against the sketch's CDF (O(window_size log
+    window_size)). The cost of a check is bounded by the window size, not by
+    the stored history. A feature drifts when any metric is above its
+    threshold; RunningMate then raises a drift alert for it.
+
+        Parameters:
+            window_size (int): Recent values compared with the baseline (defaults to 1000)
+            check_every (int): Updates between checks (defaults to 100)
+            min_samples (int): Values needed in a window before it is checked (defaults to 100)
+            thresholds (dict): Maximum "psi", "ks" and "js" values (defaults to DEFAULT_THRESHOLDS)
+    """
+
+    def __init__(
+        self,
+        window_size: int = 1000,
+        check_every: int = 100,
+        min_samples: int = 100,
+        thresholds: Optional[Dict[str, float]] = None,
+    ):
+        self.window_size = window_size
+        self.check_every = check_every
+        self.min_samples = min_samples
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+
+        # keyed by mate id, then feature index
+        self._windows: Dict[int, Dict[int, _FeatureWindow]] = {}
+        self._updates: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def update(self, baseline: CompiledBaseline, df: pd.DataFrame) -> List[DriftResult]:
+        """
+        Adds the rows of `df` to the windows and, when a check is due, returns
+        the results for the features that drifted.
+        """
+        with self._lock:
+            windows = self._windows_for(baseline)
+
+            for i, window in windows.items():
+                if baseline.names[i] in df:
+                    values = pd.to_numeric(
+                        df[baseline.names[i]], errors="coerce"
+                    ).to_numpy(dtype=float)
+                    window.add(values[~np.isnan(values)])
+
+            updates = self._updates.get(baseline.mate.id, 0) + 1
+            self._updates[baseline.mate.id] = updates % self.check_every
+
+            if updates < self.check_every:
+                return []
+
+            results = self._check(baseline, windows)
+
+        for result in results:
+            logger.info(
+                f"Drift check for '{result.feature_name}': psi={result.psi:.4f}, "
+                + f"ks={result.ks:.4f}, js={result.js:.4f}"
+            )
+
+        return [result for result in results if result.drifted]
+
+    def check(self, baseline: CompiledBaseline) -> List[DriftResult]:
+        """
+        Scores every window now, e.g. from a scheduled job.
+        """
+        with self._lock:
+            return self._check(baseline, self._windows_for(baseline))
+
+    def _windows_for(self, baseline: CompiledBaseline) -> Dict[int, _FeatureWindow]:
+        if baseline.mate.id not in self._windows:
+            self._windows[baseline.mate.id] = {
+                i: _FeatureWindow(self.window_size, histogram, sketch)
+                for i, (histogram, sketch) in enumerate(
+                    zip(baseline.histograms, baseline.quantiles)
+                )
+                if histogram is not None and sketch is not None
+            }
+
+        return self._windows[baseline.mate.id]
+
+    def _check(
+        self, baseline: CompiledBaseline, windows: Dict[int, _FeatureWindow]
+    ) -> List[DriftResult]:
+        results = []
+
+        for i, window in windows.items():
+            if len(window) < self.min_samples:
+                continue
+
+            expected = window.histogram.counts
+            actual = window.counts.astype(float)
+            psi = population_stability_index(expected, actual)
+            ks = ks_statistic(window.sketch, window.window())
+            js = jensen_shannon_divergence(expected, actual)
+
+            results.append(
+                DriftResult(
+                    feature_name=baseline.names[i],
+                    window_size=len(window),
+                    psi=psi,
+                    ks=ks,
+                    js=js,
+                    drifted=(
+                        psi > self.thresholds["psi"]
+                        or ks > self.thresholds["ks"]
+                        or js > self.thresholds["js"]
+                    ),
+                )
+            )
+
+        return results
@@ -1,7 +1,19 @@
+import json
+import math
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
 import pandas as pd  # type: ignore
 
+from mate.cache import baseline_cache
 from mate.db import Feature, NumericalStats, StringStats, get_current_mate
+from mate.sketches import Histogram, HyperLogLog, QuantileSketch, TopK
 from mate.stats import (
+    TAIL_PERCENTILES,
     CommonStatistics,
     FeatureStatistics,
     FeatureType,
@@ -10,10 +22,84 @@ from mate.stats import (
     StringStatistics,
 )
 
+# rows hashed/counted at a time when building string sketches
+SKETCH_CHUNK_SIZE = 100_000
+
+# k of the baseline quantile sketches: percentile_bounds reads tails as far
+# out as 0.5%, which needs a rank error well under that (about 0.03% at
+# k=2000, for ~40 KB per numerical feature)
+BASELINE_SKETCH_K = 2000
+
+
+def generate_baseline_stats(
+    df: pd.DataFrame,
+    name: str,
+    workers: Optional[int] = None,
+    executor: str = "process",
+    string_sketches: bool = False,
+):
+    """
+    Generates and saves baseline stats for the current version of the mate.
+
+    Set `workers` to compute the columns in parallel on a pool of that many
+    processes (or threads, with `executor="thread"`); -1 uses every core. The
+    stats are identical to the serial path.
+
+    String features always get a HyperLogLog and a top-k sketch. With
+    `string_sketches`, their distinct_count is the HyperLogLog estimate and
+    no exact set of unique values is built, which bounds memory for
+    high-cardinality (ID-like) columns.
+    """
+    statistics = _gen_statistics(df, workers, executor, string_sketches)
+
+    _save_statistics(statistics, name)
+
+
+def generate_baseline_stats_streaming(
+    source: Union[Iterable[pd.DataFrame], str, pathlib.Path],
+    name: str,
+    chunksize: int = 100_000,
+    columns: Optional[List[str]] = None,
+    string_sketches: bool = False,
+):
+    """
+    Generates baseline stats in bounded memory from DataFrame chunks.
 
-def generate_baseline_stats(df: pd.DataFrame, name: str):
-    statistics = _gen_statistics(df)
+    `source` is an iterable of DataFrames or the path of a CSV or Parquet file
+    that is read `chunksize` rows at a time. Per-chunk statistics are merged
+    with Chan's parallel algorithm, so only one chunk is held in memory.
+    Set `string_sketches` to also keep the distinct string values out of memory
+    (see `generate_baseline_stats`).
+    """
+    if isinstance(source, (str, pathlib.Path)):
+        source = read_chunks(source, chunksize, columns)
 
+    statistics = _gen_statistics_from_chunks(source, string_sketches)
+
+    _save_statistics(statistics, name)
+
+
+def read_chunks(
+    path: Union[str, pathlib.Path],
+    chunksize: int = 100_000,
+    columns: Optional[List[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV or Parquet (requires pyarrow) file `chunksize` rows at a time.
+    """
+    path = pathlib.Path(path)
+
+    if path.suffix in {".parquet", ".pq"}:
+        import pyarrow.parquet as pq  # type: ignore
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def _save_statistics(statistics: Statistics, name: str):
     mate = get_current_mate(name)
     if mate:
         mate.item_count = statistics.item_count
@@ -34,6 +120,25 @@ def generate_baseline_stats(df: pd.DataFrame, name: str):
                 std_dev=feature.numerical_statistics.std_dev,
                 min=feature.numerical_statistics.min,
                 max=feature.numerical_statistics.max,
+                quantile_sketch=(
+                    feature.numerical_statistics.quantiles.to_bytes()
+                    if feature.numerical_statistics.quantiles
+                    else None
+                ),
+                histogram=(
+                    feature.numerical_statistics.histogram.to_bytes()
+                    if feature.numerical_statistics.histogram
+                    else None
+                ),
+                median=feature.numerical_statistics.median,
+                mad=feature.numerical_statistics.mad,
+                q1=feature.numerical_statistics.q1,
+                q3=feature.numerical_statistics.q3,
+                tail_quantiles=(
+                    json.dumps(feature.numerical_statistics.tail_quantiles)
+                    if feature.numerical_statistics.tail_quantiles
+                    else None
+                ),
                 feature=feature_stats,
             )
 
@@ -42,11 +147,39 @@ def generate_baseline_stats(df: pd.DataFrame, name: str):
                 num_present=feature.string_statistics.common.num_present,
                 num_missing=feature.string_statistics.common.num_missing,
                 distinct_count=feature.string_statistics.distinct_count,
+                distinct_sketch=(
+                    feature.string_statistics.hyperloglog.to_bytes()
+                    if feature.string_statistics.hyperloglog
+                    else None
+                ),
+                top_k=(
+                    feature.string_statistics.top_k.to_bytes()
+                    if feature.string_statistics.top_k
+                    else None
+                ),
                 feature=feature_stats,
             )
 
+    if mate:
+        baseline_cache.invalidate(name, mate.version)
 
-def _create_statistics_feature(feature_series: pd.Series) -> FeatureStatistics:
+
+def _string_sketches(feature_series: pd.Series) -> Tuple[HyperLogLog, TopK]:
+    hyperloglog = HyperLogLog()
+    top_k = TopK()
+
+    # slices bound the memory used by value_counts on high-cardinality columns
+    for start in range(0, len(feature_series), SKETCH_CHUNK_SIZE):
+        stop = start + SKETCH_CHUNK_SIZE
+        hyperloglog.update(feature_series.iloc[start:stop])
+        top_k.update(feature_series.iloc[start:stop])
+
+    return hyperloglog, top_k
+
+
+def _create_statistics_feature(
+    feature_series: pd.Series, string_sketches: bool = False
+) -> FeatureStatistics:
     feature_name = feature_series.name
     feature_type = _infer_feature_type(feature_series)
 
@@ -58,6 +191,11 @@ def _create_statistics_feature(feature_series: pd.Series) -> FeatureStatistics:
     common = CommonStatistics(n_present, n_missing)
 
     if feature_type in [FeatureType.INTEGER, FeatureType.FRACTION]:
+        values = feature_series.to_numpy(dtype=float, na_value=np.nan)
+        quantiles = QuantileSketch(k=BASELINE_SKETCH_K)
+        quantiles.update(values)
+        present = values[~np.isnan(values)]
+        q1, median, q3, mad = _robust_statistics(present)
         feature.numerical_statistics = NumericalStatistics(
             common=common,
             mean=feature_series.mean(),
@@ -65,27 +203,264 @@ def _create_statistics_feature(feature_series: pd.Series) -> FeatureStatistics:
             std_dev=feature_series.std(),
             min=feature_series.min(),
             max=feature_series.max(),
+            quantiles=quantiles,
+            histogram=Histogram.from_sketch(quantiles),
+            median=median,
+            mad=mad,
+            q1=q1,
+            q3=q3,
+            tail_quantiles=_tail_quantiles(present),
         )
 
     elif feature_type == FeatureType.STRING:
+        hyperloglog, top_k = _string_sketches(feature_series)
         feature.string_statistics = StringStatistics(
-            common=common, distinct_count=len(feature_series.dropna().unique())
+            common=common,
+            distinct_count=(
+                hyperloglog.count()
+                if string_sketches
+                else len(feature_series.dropna().unique())
+            ),
+            hyperloglog=hyperloglog,
+            top_k=top_k,
         )
 
     return feature
 
 
-def _gen_statistics(df: pd.DataFrame) -> Statistics:
-    statistics = Statistics(
-        item_count=len(df),
-        features=[
-            _create_statistics_feature(feature_series)
-            for name, feature_series in df.iteritems()
-        ],
-    )
+def _robust_statistics(values: np.ndarray) -> Tuple[float, float, float, float]:
+    """
+    Exact (q1, median, q3, MAD) of the non-null `values`.
+    """
+    if len(values) == 0:
+        return math.nan, math.nan, math.nan, math.nan
+
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    mad = np.median(np.abs(values - median))
+
+    return float(q1), float(median), float(q3), float(mad)
+
+
+def _tail_quantiles(values: np.ndarray) -> Optional[Dict[float, float]]:
+    """
+    Exact values of the non-null `values` at TAIL_PERCENTILES.
+    """
+    if len(values) == 0:
+        return None
+
+    tails = np.quantile(values, np.array(TAIL_PERCENTILES) / 100)
+
+    return dict(zip(TAIL_PERCENTILES, map(float, tails)))
+
+
+def _create_statistics_features(
+    df: pd.DataFrame, string_sketches: bool = False
+) -> List[FeatureStatistics]:
+    return [
+        _create_statistics_feature(feature_series, string_sketches)
+        for name, feature_series in df.iteritems()
+    ]
+
+
+def _gen_statistics(
+    df: pd.DataFrame,
+    workers: Optional[int] = None,
+    executor: str = "process",
+    string_sketches: bool = False,
+) -> Statistics:
+    if workers == -1:
+        workers = os.cpu_count() or 1
+
+    if not workers or workers == 1 or len(df.columns) < 2:
+        features = _create_statistics_features(df, string_sketches)
+    else:
+        # contiguous column partitions keep the features in column order
+        partitions = [
+            df.iloc[:, columns]
+            for columns in np.array_split(np.arange(len(df.columns)), workers)
+            if len(columns)
+        ]
+        Executor = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+
+        with Executor(max_workers=workers) as pool:
+            features = [
+                feature
+                for partition in pool.map(
+                    _create_statistics_features,
+                    partitions,
+                    [string_sketches] * len(partitions),
+                )
+                for feature in partition
+            ]
+
+    statistics = Statistics(item_count=len(df), features=features)
     return statistics
 
 
+@dataclass
+class _PartialFeatureStatistics:
+    """
+    Mergeable statistics for one feature over part of the data
+    """
+
+    name: str
+    feature_type: Optional[FeatureType] = None  # None until a non-null value is seen
+    num_present: int = 0
+    num_missing: int = 0
+    mean: float = 0.0
+    m2: float = 0.0  # sum of squared differences from the mean
+    sum: Union[int, float] = 0
+    min: Optional[Union[int, float]] = None
+    max: Optional[Union[int, float]] = None
+    string_sketches: bool = False  # when set, `distinct` stays empty
+    distinct: Set = field(default_factory=set)
+    hyperloglog: Optional[HyperLogLog] = None
+    top_k: Optional[TopK] = None
+    quantiles: Optional[QuantileSketch] = None
+
+    @classmethod
+    def from_series(
+        cls, feature_series: pd.Series, string_sketches: bool = False
+    ) -> "_PartialFeatureStatistics":
+        partial = cls(name=feature_series.name, string_sketches=string_sketches)
+
+        present = feature_series.dropna()
+        partial.num_present = len(present)
+        partial.num_missing = len(feature_series) - len(present)
+
+        if partial.num_present == 0:
+            return partial
+
+        partial.feature_type = _infer_feature_type(feature_series)
+
+        if partial.feature_type in [FeatureType.INTEGER, FeatureType.FRACTION]:
+            values = present.to_numpy()
+            partial.mean = float(values.mean())
+            partial.m2 = float(((values - partial.mean) ** 2).sum())
+            partial.sum = values.sum().item()
+            partial.min = values.min().item()
+            partial.max = values.max().item()
+            partial.quantiles = QuantileSketch(k=BASELINE_SKETCH_K)
+            partial.quantiles.update(values)
+
+        elif partial.feature_type == FeatureType.STRING:
+            partial.hyperloglog, partial.top_k = _string_sketches(present)
+            if not string_sketches:
+                partial.distinct = set(present.unique())
+
+        return partial
+
+    def merge(self, other: "_PartialFeatureStatistics"):
+        self.feature_type = _merge_feature_types(self.feature_type, other.feature_type)
+
+        if other.min is not None and other.max is not None:
+            n = self.num_present + other.num_present
+            delta = other.mean - self.mean
+            self.mean += delta * other.num_present / n
+            self.m2 += other.m2 + delta**2 * self.num_present * other.num_present / n
+            self.sum += other.sum
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+        if self.quantiles is None:
+            self.quantiles = other.quantiles
+        elif other.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+
+        self.distinct |= other.distinct
+        if self.hyperloglog is None or self.top_k is None:
+            self.hyperloglog, self.top_k = other.hyperloglog, other.top_k
+        elif other.hyperloglog is not None and other.top_k is not None:
+            self.hyperloglog.merge(other.hyperloglog)
+            self.top_k.merge(other.top_k)
+        self.num_present += other.num_present
+        self.num_missing += other.num_missing
+
+    def to_feature_statistics(self) -> FeatureStatistics:
+        feature_type = self.feature_type or FeatureType.FRACTION
+        feature = FeatureStatistics(name=self.name, inferred_type=feature_type.value)
+        common = CommonStatistics(self.num_present, self.num_missing)
+
+        if feature_type in [FeatureType.INTEGER, FeatureType.FRACTION]:
+            feature.numerical_statistics = NumericalStatistics(
+                common=common,
+                mean=self.mean if self.num_present else math.nan,
+                sum=self.sum,
+                std_dev=(
+                    math.sqrt(self.m2 / (self.num_present - 1))
+                    if self.num_present > 1
+                    else math.nan
+                ),
+                min=self.min if self.min is not None else math.nan,
+                max=self.max if self.max is not None else math.nan,
+                quantiles=self.quantiles,
+                histogram=(
+                    Histogram.from_sketch(self.quantiles) if self.quantiles else None
+                ),
+            )
+            if self.quantiles:
+                # approximate, from the merged sketch
+                q1, median, q3 = self.quantiles.quantile([0.25, 0.5, 0.75])
+                feature.numerical_statistics.median = float(median)
+                feature.numerical_statistics.mad = (
+                    self.quantiles.median_absolute_deviation()
+                )
+                feature.numerical_statistics.q1 = float(q1)
+                feature.numerical_statistics.q3 = float(q3)
+
+        elif feature_type == FeatureType.STRING:
+            feature.string_statistics = StringStatistics(
+                common=common,
+                distinct_count=(
+                    self.hyperloglog.count()
+                    if self.string_sketches and self.hyperloglog
+                    else len(self.distinct)
+                ),
+                hyperloglog=self.hyperloglog,
+                top_k=self.top_k,
+            )
+
+        return feature
+
+
+def _merge_feature_types(
+    a: Optional[FeatureType], b: Optional[FeatureType]
+) -> Optional[FeatureType]:
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {FeatureType.INTEGER, FeatureType.FRACTION}:
+        # e.g. an integer column with missing values in some chunks
+        return FeatureType.FRACTION
+
+    return FeatureType.UNKNOWN
+
+
+def _gen_statistics_from_chunks(
+    chunks: Iterable[pd.DataFrame], string_sketches: bool = False
+) -> Statistics:
+    partials: Dict[str, _PartialFeatureStatistics] = {}
+    item_count = 0
+
+    for chunk in chunks:
+        item_count += len(chunk)
+
+        for name, feature_series in chunk.items():
+            partial = _PartialFeatureStatistics.from_series(
+                feature_series, string_sketches
+            )
+            if name in partials:
+                partials[name].merge(partial)
+            else:
+                partials[name] = partial
+
+    return Statistics(
+        item_count=item_count,
+        features=[partial.to_feature_statistics() for partial in partials.values()],
+    )
+
+
 def _infer_feature_type(feature_series: pd.Series) -> FeatureType:
     dtype_name = str(feature_series.dtype)
 
@@ -0,0 +1,276 @@
+import bisect
+import logging
+import socket
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mate")
+
+# upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+# metric names
+PHASE_SECONDS = "mate_phase_seconds"  # histogram, tags: mate, phase
+INFERENCE_SECONDS = "mate_inference_seconds"  # histogram, tags: mate
+FEATURE_ALERTS = "mate_feature_alerts_total"  # counter, tags: mate, kind
+DB_WRITES = "mate_db_rows_written_total"  # counter, tags: table
+QUEUE_DEPTH = "mate_queue_depth"  # gauge, tags: queue
+
+Tags = Dict[str, str]
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class MetricsSink(ABC):
+    """
+    Receives mate's metrics. Set one with `set_metrics_sink`; with none set,
+    instrumented code skips the timing altogether.
+    """
+
+    @abstractmethod
+    def observe(self, name: str, value: float, tags: Optional[Tags] = None):
+        """
+        Adds a value (a duration in seconds) to a histogram.
+        """
+        pass
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, tags: Optional[Tags] = None):
+        pass
+
+    @abstractmethod
+    def gauge(self, name: str, value: float, tags: Optional[Tags] = None):
+        pass
+
+
+@dataclass
+class HistogramValue:
+    buckets: Tuple[float, ...]
+    # counts[i] counts values <= buckets[i]; the last is for +Inf
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    sum: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry(MetricsSink):
+    """
+    In-process metrics, read with `histogram`, `counter` and `get_gauge`
+
+        Parameters:
+            buckets (tuple): Histogram bucket upper bounds in seconds (defaults to DEFAULT_BUCKETS)
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[_Key, HistogramValue] = {}
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, tags: Optional[Tags]) -> _Key:
+        return (name, tuple(sorted(tags.items())) if tags else ())
+
+    def observe(self, name: str, value: float, tags: Optional[Tags] = None):
+        key = self._key(name, tags)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = HistogramValue(self.buckets)
+            histogram.add(value)
+
+    def increment(self, name: str, value: float = 1, tags: Optional[Tags] = None):
+        key = self._key(name, tags)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, tags: Optional[Tags] = None):
+        with self._lock:
+            self._gauges[self._key(name, tags)] = value
+
+    def histogram(
+        self, name: str, tags: Optional[Tags] = None
+    ) -> Optional[HistogramValue]:
+        return self._histograms.get(self._key(name, tags))
+
+    def counter(self, name: str, tags: Optional[Tags] = None) -> float:
+        return self._counters.get(self._key(name, tags), 0)
+
+    def get_gauge(self, name: str, tags: Optional[Tags] = None) -> Optional[float]:
+        return self._gauges.get(self._key(name, tags))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class PrometheusMetrics(MetricsRegistry):
+    """
+    In-process metrics in the Prometheus text exposition format, from
+    `exposition()` or over HTTP at /metrics once `serve()` is called
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(buckets)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def exposition(self) -> str:
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        lines: List[str] = []
+        typed = set()
+
+        def type_line(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            type_line(name, "histogram")
+            cumulative = 0
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                bucket_labels = _format_labels(labels + (("le", bound),))
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in values:
+                type_line(name, kind)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> int:
+        """
+        Serves /metrics on a daemon thread and returns the bound port (pass
+        port 0 for a free one).
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.exposition().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=self._server.serve_forever, name="mate-metrics", daemon=True
+        ).start()
+
+        return self._server.server_address[1]
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class StatsdMetrics(MetricsSink):
+    """
+    Sends metrics to a StatsD agent over UDP, with DogStatsD-style tags
+
+        Parameters:
+            host (str): Agent host (defaults to "127.0.0.1")
+            port (int): Agent port (defaults to 8125)
+            prefix (str): Prepended to metric names, e.g. "myservice."
+
+    Histogram values are sent as timers in milliseconds. Sends never block
+    and errors are ignored, so a missing agent costs nothing but the packets.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8125, prefix: str = ""):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def _send(self, name: str, value: str, kind: str, tags: Optional[Tags]):
+        packet = f"{self.prefix}{name}:{value}|{kind}"
+        if tags:
+            packet += "|#" + ",".join(f"{key}:{tag}" for key, tag in tags.items())
+
+        try:
+            self._socket.sendto(packet.encode(), self.address)
+        except OSError:
+            pass
+
+    def observe(self, name: str, value: float, tags: Optional[Tags] = None):
+        self._send(name, f"{value * 1000:.4f}", "ms", tags)
+
+    def increment(self, name: str, value: float = 1, tags: Optional[Tags] = None):
+        self._send(name, f"{value:g}", "c", tags)
+
+    def gauge(self, name: str, value: float, tags: Optional[Tags] = None):
+        self._send(name, f"{value:g}", "g", tags)
+
+
+_sink: Optional[MetricsSink] = None
+
+
+def set_metrics_sink(sink: Optional[MetricsSink]):
+    """
+    Sends mate's metrics to `sink`, or disables them with None (the default).
+    """
+    global _sink
+    _sink = sink
+
+
+def get_metrics_sink() -> Optional[MetricsSink]:
+    return _sink
@@ -0,0 +1,176 @@
+import functools
+import logging
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd  # type: ignore
+
+from mate.aggregates import RollingAggregates
+from mate.alerts import AlertTarget
+from mate.baseline import CompiledBaseline, get_compiled_baseline
+from mate.checks import CheckThresholds
+from mate.db import get_current_mate
+from mate.dispatch import AlertDispatcher
+from mate.drift import DriftMonitor
+from mate.recorder import BackgroundRecorder
+from mate.run import RunningMate
+from mate.sampling import SamplingPolicy
+from mate.stats import CustomStats
+
+logger = logging.getLogger("mate")
+
+
+class MateMonitor(object):
+    """
+    Long-lived RunningMate factory for a serving process
+
+    Resolves and compiles the mate version once, at construction, so each
+    `observe` call only runs the checks (and records them) on its frame.
+
+        Parameters:
+            mate_name (str): Name of the mate
+            mate_version (int): Version to monitor (defaults to the current version)
+            targets (list): Alert targets
+            custom_stats (list): Custom stats checked on every call
+            should_save_all_feature_values (bool): Record every feature value (defaults to False)
+            inference_per_row (bool): Record one Inference per row (defaults to False)
+            recorder (BackgroundRecorder): Write records on a background thread
+            dispatcher (AlertDispatcher): Deliver alerts on a thread pool
+            percentile_bounds (tuple): (lower, upper) percentiles for percentile alerts
+            aggregates (RollingAggregates): Rolling production statistics
+            drift (DriftMonitor): Sliding-window drift detection
+            sampling (SamplingPolicy): Which feature values to record
+            thresholds (CheckThresholds): Outlier checks and their thresholds
+
+    Raises ValueError when the mate version doesn't exist or has no features.
+    """
+
+    def __init__(
+        self,
+        mate_name: str,
+        mate_version: Optional[int] = None,
+        targets: Sequence[AlertTarget] = (),
+        custom_stats: Optional[List[CustomStats]] = None,
+        should_save_all_feature_values: bool = False,
+        inference_per_row: bool = False,
+        recorder: Optional[BackgroundRecorder] = None,
+        dispatcher: Optional[AlertDispatcher] = None,
+        percentile_bounds: Optional[Tuple[float, float]] = None,
+        aggregates: Optional[RollingAggregates] = None,
+        drift: Optional[DriftMonitor] = None,
+        sampling: Optional[SamplingPolicy] = None,
+        thresholds: Optional[CheckThresholds] = None,
+    ):
+        self.mate_name = mate_name
+        self.targets = list(targets)
+        self.custom_stats = custom_stats
+        self.should_save_all_feature_values = should_save_all_feature_values
+        self.inference_per_row = inference_per_row
+        self.recorder = recorder
+        self.dispatcher = dispatcher
+        self.percentile_bounds = percentile_bounds
+        self.aggregates = aggregates
+        self.drift = drift
+        self.sampling = sampling
+        self.thresholds = thresholds
+
+        self._pinned_version = mate_version
+        self.baseline = self._load(mate_version)
+
+    @property
+    def mate_version(self) -> int:
+        return int(self.baseline.mate.version)
+
+    def _load(self, mate_version: Optional[int]) -> CompiledBaseline:
+        if mate_version is None:
+            current_mate = get_current_mate(self.mate_name)
+            if current_mate is None:
+                raise ValueError(f"Mate '{self.mate_name}' not found.")
+            mate_version = int(current_mate.version)
+
+        baseline = get_compiled_baseline(self.mate_name, mate_version)
+        if baseline is None:
+            raise ValueError(
+                f"Version {mate_version} of the '{self.mate_name}' mate not found."
+            )
+        if not baseline.names:
+            raise ValueError(
+                f"Version {mate_version} of the '{self.mate_name}' mate has no "
+                + "baseline stats. Run generate_baseline_stats first."
+            )
+
+        # compiled and cached on the baseline now, not on the first request
+        baseline.check_plan(self.percentile_bounds, self.thresholds)
+
+        logger.info(
+            f"Monitoring version {mate_version} of the '{self.mate_name}' mate."
+        )
+
+        return baseline
+
+    def refresh(self):
+        """
+        Reloads the baseline, picking up a newer current version unless the
+        monitor was created for a specific version.
+        """
+        self.baseline = self._load(self._pinned_version)
+
+    def observe(
+        self,
+        df: pd.DataFrame,
+        request_key: Optional[Union[str, Sequence[str]]] = None,
+    ) -> RunningMate:
+        """
+        Checks `df` and returns the RunningMate, to be used as the context of
+        the prediction:
+
+            with monitor.observe(df):
+                model.predict(df)
+        """
+        return RunningMate(
+            self.mate_name,
+            self.mate_version,
+            df,
+            self.targets,
+            custom_stats=self.custom_stats,
+            should_save_all_feature_values=self.should_save_all_feature_values,
+            inference_per_row=self.inference_per_row,
+            recorder=self.recorder,
+            dispatcher=self.dispatcher,
+            percentile_bounds=self.percentile_bounds,
+            aggregates=self.aggregates,
+            drift=self.drift,
+            sampling=self.sampling,
+            request_key=request_key,
+            baseline=self.baseline,
+            thresholds=self.thresholds,
+        )
+
+    def __call__(self, function: Callable) -> Callable:
+        """
+        Decorates a prediction function (or method), observing the first
+        DataFrame argument of every call:
+
+            @monitor
+            def predict(df):
+                return model.predict(enc.transform(df))
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            df = next(
+                (
+                    arg
+                    for arg in (*args, *kwargs.values())
+                    if isinstance(arg, pd.DataFrame)
+                ),
+                None,
+            )
+            if df is None:
+                raise TypeError(
+                    f"{function.__name__} was called without a DataFrame to monitor."
+                )
+
+            with self.observe(df):
+                return function(*args, **kwargs)
+
+        return wrapper
@@ -0,0 +1,284 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, FrozenSet, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd  # type: ignore
+from pandas.api.types import is_numeric_dtype  # type: ignore
+
+from mate.alerts import FeatureAlertKind
+from mate.checks import (
+    CheckThresholds,
+    iqr_fences,
+    is_out_of_bounds,
+    is_outlier,
+    is_robust_outlier,
+)
+from mate.stats import FeatureType
+
+if TYPE_CHECKING:
+    from mate.baseline import CompiledBaseline
+
+# order of the alerts raised for one feature
+KIND_ORDER = (
+    FeatureAlertKind.OUTLIER.value,
+    FeatureAlertKind.ROBUST_OUTLIER.value,
+    FeatureAlertKind.IQR.value,
+    FeatureAlertKind.BOUND.value,
+    FeatureAlertKind.PERCENTILE.value,
+    FeatureAlertKind.UNSEEN.value,
+    FeatureAlertKind.NULL.value,
+)
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    # index of the feature in the baseline
+    feature_index: int
+    kind: str
+    # rows of the frame that failed the check
+    mask: np.ndarray
+
+
+@dataclass(frozen=True)
+class CheckPlan:
+    """
+    The statistical checks of a mate version, flattened into arrays.
+
+    The numerical checks run on one (rows x numerical features) matrix, with
+    the baseline stats and check thresholds as vectors aligned with its
+    columns (a NaN threshold disables a check for a column), and its null
+    mask gives the null check. Only the string features are checked one
+    column at a time, for unseen categories and nulls.
+    """
+
+    numeric_index: np.ndarray
+    numeric_names: Tuple[str, ...]
+    mean: np.ndarray
+    std_dev: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    median: np.ndarray
+    mad: np.ndarray
+    # per-column thresholds, NaN where the check is disabled
+    z_score_cutoff: np.ndarray
+    robust_z_score_cutoff: np.ndarray
+    iqr_lower: np.ndarray
+    iqr_upper: np.ndarray
+    # aligned with numeric_index; None without percentile bounds
+    percentile_lower: Optional[np.ndarray]
+    percentile_upper: Optional[np.ndarray]
+    # columns without missing values in the baseline, checked for nulls
+    numeric_not_null: np.ndarray
+    string_index: np.ndarray
+    string_names: Tuple[str, ...]
+    # None for the string features without known categories
+    categories: Tuple[Optional[FrozenSet[str]], ...]
+    string_not_null: np.ndarray
+
+    @property
+    def null_index(self) -> np.ndarray:
+        return np.sort(
+            np.concatenate(
+                [
+                    self.numeric_index[self.numeric_not_null],
+                    self.string_index[self.string_not_null],
+                ]
+            )
+        )
+
+    def run(self, df: pd.DataFrame) -> List[CheckResult]:
+        """
+        Runs every check over `df` and returns the failed ones, ordered by
+        feature and then by KIND_ORDER.
+        """
+        results: List[CheckResult] = []
+
+        if self.numeric_names:
+            values, nulls = _numeric_matrix(df, self.numeric_names)
+            with np.errstate(invalid="ignore"):
+                masks = []
+                if not np.isnan(self.z_score_cutoff).all():
+                    masks.append(
+                        (
+                            FeatureAlertKind.OUTLIER.value,
+                            is_outlier(
+                                values, self.mean, self.std_dev, self.z_score_cutoff
+                            ),
+                        )
+                    )
+                if not np.isnan(self.robust_z_score_cutoff).all():
+                    masks.append(
+                        (
+                            FeatureAlertKind.ROBUST_OUTLIER.value,
+                            is_robust_outlier(
+                                values,
+                                self.median,
+                                self.mad,
+                                self.robust_z_score_cutoff,
+                            ),
+                        )
+                    )
+                if not np.isnan(self.iqr_lower).all():
+                    masks.append(
+                        (
+                            FeatureAlertKind.IQR.value,
+                            is_out_of_bounds(values, self.iqr_lower, self.iqr_upper),
+                        )
+                    )
+                masks.append(
+                    (
+                        FeatureAlertKind.BOUND.value,
+                        is_out_of_bounds(values, self.min, self.max),
+                    )
+                )
+                if (
+                    self.percentile_lower is not None
+                    and self.percentile_upper is not None
+                ):
+                    masks.append(
+                        (
+                            FeatureAlertKind.PERCENTILE.value,
+                            is_out_of_bounds(
+                                values, self.percentile_lower, self.percentile_upper
+                            ),
+                        )
+                    )
+            masks.append((FeatureAlertKind.NULL.value, nulls & self.numeric_not_null))
+            for kind, mask in masks:
+                results.extend(_failed(kind, mask, self.numeric_index))
+
+        # one column at a time: selecting a sub-frame of object columns costs
+        # more than the checks themselves
+        for i, name, categories, not_null in zip(
+            self.string_index, self.string_names, self.categories, self.string_not_null
+        ):
+            strings = df[name].to_numpy(dtype=object)
+            if categories is not None:
+                unseen = _unseen(strings, categories)
+                if unseen is not None:
+                    results.append(
+                        CheckResult(int(i), FeatureAlertKind.UNSEEN.value, unseen)
+                    )
+            if not_null:
+                missing = pd.isna(strings)
+                if missing.any():
+                    results.append(
+                        CheckResult(int(i), FeatureAlertKind.NULL.value, missing)
+                    )
+
+        return sorted(
+            results,
+            key=lambda result: (result.feature_index, KIND_ORDER.index(result.kind)),
+        )
+
+
+def _numeric_matrix(
+    df: pd.DataFrame, names: Tuple[str, ...]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The (rows x features) matrix of `names` as floats, and its null mask.
+    """
+    frame = df[list(names)]
+
+    if all(is_numeric_dtype(dtype) for dtype in frame.dtypes):
+        values = frame.to_numpy(dtype=float, na_value=np.nan)
+        return values, np.isnan(values)
+
+    # values that aren't numbers are NaN, so they only fail the null check
+    # when they're actually missing
+    values = np.column_stack(
+        [
+            pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=float)
+            for name in names
+        ]
+    ).reshape(len(frame), len(names))
+    return values, frame.isna().to_numpy()
+
+
+def _unseen(values: np.ndarray, categories: FrozenSet[str]) -> Optional[np.ndarray]:
+    """
+    Mask of the non-null values not in `categories`, or None when there are
+    none. The common case, every value seen, costs one set difference.
+    """
+    if all(pd.isna(value) for value in set(values) - categories):
+        return None
+
+    return ~pd.isna(values) & ~np.fromiter(
+        (value in categories for value in values), dtype=bool, count=len(values)
+    )
+
+
+def _failed(
+    kind: str, mask: Union[bool, np.ndarray], index: np.ndarray
+) -> List[CheckResult]:
+    mask = np.asarray(mask)
+    return [
+        CheckResult(int(index[column]), kind, mask[:, column])
+        for column in np.flatnonzero(mask.any(axis=0))
+    ]
+
+
+def compile_check_plan(
+    baseline: "CompiledBaseline",
+    percentile_bounds: Optional[Tuple[float, float]] = None,
+    thresholds: CheckThresholds = CheckThresholds(),
+) -> CheckPlan:
+    """
+    Compiles the checks of `baseline`. Features without baseline stats are
+    not checked; percentile bounds are checked when `percentile_bounds` is a
+    (lower, upper) pair of percentiles. Features use the thresholds persisted
+    with the baseline, if any, and `thresholds` otherwise.
+    """
+    has_stats = baseline.num_missing >= 0
+    types = np.array(baseline.inferred_types, dtype=object)
+    numerical = has_stats & np.isin(
+        types, [FeatureType.INTEGER.value, FeatureType.FRACTION.value]
+    )
+    string = has_stats & (types == FeatureType.STRING.value)
+
+    numeric_index = np.flatnonzero(numerical)
+    string_index = np.flatnonzero(string)
+    not_null = baseline.num_missing == 0
+
+    lower = upper = None
+    if percentile_bounds is not None:
+        lower, upper = baseline.percentile_bounds(*percentile_bounds)
+        lower, upper = lower[numeric_index], upper[numeric_index]
+
+    feature_thresholds = [
+        (baseline.thresholds[i] if baseline.thresholds else None) or thresholds
+        for i in numeric_index
+    ]
+
+    def threshold(name: str) -> np.ndarray:
+        values = [getattr(t, name) for t in feature_thresholds]
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+    iqr_lower, iqr_upper = iqr_fences(
+        baseline.q1[numeric_index], baseline.q3[numeric_index], threshold("iqr")
+    )
+
+    def names(index: np.ndarray) -> Tuple[str, ...]:
+        return tuple(baseline.names[i] for i in index)
+
+    return CheckPlan(
+        numeric_index=numeric_index,
+        numeric_names=names(numeric_index),
+        mean=baseline.mean[numeric_index],
+        std_dev=baseline.std_dev[numeric_index],
+        min=baseline.min[numeric_index],
+        max=baseline.max[numeric_index],
+        median=baseline.median[numeric_index],
+        mad=baseline.mad[numeric_index],
+        z_score_cutoff=threshold("z_score"),
+        robust_z_score_cutoff=threshold("robust_z_score"),
+        iqr_lower=np.asarray(iqr_lower, dtype=float),
+        iqr_upper=np.asarray(iqr_upper, dtype=float),
+        percentile_lower=lower,
+        percentile_upper=upper,
+        numeric_not_null=not_null[numeric_index],
+        string_index=string_index,
+        string_names=names(string_index),
+        categories=tuple(baseline.categories[i] for i in string_index),
+        string_not_null=not_null[string_index],
+    )
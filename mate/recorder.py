@@ -0,0 +1,228 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import weakref
+from enum import Enum
+from time import monotonic
+from typing import List, Optional, Union
+
+from mate.db import InferenceRecord, save_inference_records
+from mate.metrics import QUEUE_DEPTH, get_metrics_sink
+
+logger = logging.getLogger("mate")
+
+
+class BackpressurePolicy(Enum):
+    BLOCK = "block"  # wait for room in the queue
+    DROP = "drop"  # discard the record
+    SAMPLE = "sample"  # keep a sample_rate fraction of records (waiting for room), drop the rest
+
+
+_STOP = object()
+
+# recorders of this process, restarted in forked children
+_recorders: "weakref.WeakSet[BackgroundRecorder]" = weakref.WeakSet()
+
+
+class _FlushRequest(object):
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BackgroundRecorder(object):
+    """
+    Write-behind recorder for inference telemetry
+
+    Records submitted by RunningMate are put on a bounded queue and written by
+    a dedicated writer thread, which batches them into one transaction every
+    `flush_interval` seconds (or every `max_batch_size` records). The request
+    thread never waits on SQLite unless the queue is full and the backpressure
+    policy is "block" (or "sample").
+
+    Being the only thread that writes, the recorder also serializes writes
+    from many serving threads. It is fork-safe: in a forked child (e.g. a
+    preforking server worker) it starts a new writer thread with an empty
+    queue; records still queued in the parent stay with the parent.
+
+        Parameters:
+            flush_interval (float): Seconds between writes (defaults to 1.0)
+            max_queue_size (int): Records held before backpressure applies (defaults to 10000)
+            max_batch_size (int): Records written per transaction (defaults to 1000)
+            backpressure (str or BackpressurePolicy): "block", "drop" or "sample" (defaults to "block")
+            sample_rate (float): Fraction of records kept when sampling under backpressure (defaults to 0.1)
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 10000,
+        max_batch_size: int = 1000,
+        backpressure: Union[str, BackpressurePolicy] = BackpressurePolicy.BLOCK,
+        sample_rate: float = 0.1,
+    ):
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.backpressure = BackpressurePolicy(backpressure)
+        self.sample_rate = sample_rate
+
+        self.dropped_count = 0
+        self.written_count = 0
+        self.failed_count = 0
+
+        self._max_queue_size = max_queue_size
+        self._closed = False
+        self._start()
+
+        atexit.register(self.shutdown)
+        _recorders.add(self)
+
+    def _start(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=self._max_queue_size)
+        # guards `_closed`, enqueueing records and the counters; submitters
+        # wait on `_room` for the writer to take records off a full queue
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+        self._thread = threading.Thread(
+            target=self._run, name="mate-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def _after_fork(self):
+        # threads don't survive fork, and the queue's locks may be held
+        if not self._closed:
+            self.written_count = self.dropped_count = self.failed_count = 0
+            self._start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, record: InferenceRecord) -> bool:
+        """
+        Queues a record for writing. Returns False if it was dropped.
+        """
+        metrics = get_metrics_sink()
+        if metrics is not None:
+            metrics.gauge(QUEUE_DEPTH, self._queue.qsize(), {"queue": "recorder"})
+
+        # records are only enqueued under the lock while the recorder is
+        # open, so none can land behind the _STOP put by shutdown
+        with self._lock:
+            sampled = False
+
+            while True:
+                if self._closed:
+                    logger.error("Recorder is shut down. Dropping inference record.")
+                    self.dropped_count += 1
+                    return False
+
+                try:
+                    self._queue.put_nowait(record)
+                    return True
+                except queue.Full:
+                    pass
+
+                if not sampled and (
+                    self.backpressure == BackpressurePolicy.DROP
+                    or (
+                        self.backpressure == BackpressurePolicy.SAMPLE
+                        and random.random() >= self.sample_rate
+                    )
+                ):
+                    self.dropped_count += 1
+                    return False
+
+                sampled = True
+                self._room.wait()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every record submitted before the call has been written.
+        Returns False if `timeout` expired first.
+        """
+        if not self._thread.is_alive():
+            return self._queue.empty()
+
+        request = _FlushRequest()
+        self._queue.put(request)
+
+        return request.done.wait(timeout)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """
+        Writes the queued records and stops the writer thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            # submitters waiting for room drop their records
+            self._room.notify_all()
+
+        self.flush(timeout)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+        atexit.unregister(self.shutdown)
+
+    def _run(self):
+        pending: List[InferenceRecord] = []
+        flush_requests: List[_FlushRequest] = []
+        deadline = monotonic() + self.flush_interval
+        stopping = False
+
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(deadline - monotonic(), 0))
+            except queue.Empty:
+                item = None
+            else:
+                with self._room:
+                    self._room.notify()
+
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, _FlushRequest):
+                flush_requests.append(item)
+            elif isinstance(item, InferenceRecord):
+                pending.append(item)
+
+            if (
+                stopping
+                or flush_requests
+                or len(pending) >= self.max_batch_size
+                or monotonic() >= deadline
+            ):
+                self._write(pending)
+                pending = []
+                deadline = monotonic() + self.flush_interval
+
+                for request in flush_requests:
+                    request.done.set()
+                flush_requests = []
+
+    def _write(self, records: List[InferenceRecord]):
+        if not records:
+            return
+
+        try:
+            save_inference_records(records)
+            with self._lock:
+                self.written_count += len(records)
+        except Exception:
+            with self._lock:
+                self.failed_count += len(records)
+            logger.exception(f"Failed to write {len(records)} inference records.")
+
+
+def _restart_recorders_after_fork():
+    for recorder in list(_recorders):
+        recorder._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_recorders_after_fork)
@@ -0,0 +1,230 @@
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from peewee import SqliteDatabase, chunked, fn  # type: ignore
+
+from mate.db import (
+    FeatureAlert,
+    FeatureValue,
+    Inference,
+    Mate,
+    db,
+    write_transaction,
+)
+
+logger = logging.getLogger("mate")
+
+# rows per DELETE transaction; small batches keep the write lock short
+RETENTION_BATCH_SIZE = 1000
+
+# pages released per PRAGMA incremental_vacuum call
+VACUUM_BATCH_PAGES = 1000
+
+# Knuth's multiplicative hash constant, for stable pseudo-random priorities
+_HASH_MULTIPLIER = np.uint64(2654435761)
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    What to keep of a mate's recorded inferences
+
+    Feature alerts, the feature values they point at and their inferences
+    are always kept, as are the rolling aggregates.
+
+        Parameters:
+            ttl (timedelta): Delete inferences and feature values older than this
+            keep_every (int): Keep the feature values of every Nth inference only
+            reservoir_size (int): Keep the feature values of at most this many inferences, sampled uniformly
+    """
+
+    ttl: Optional[datetime.timedelta] = None
+    keep_every: Optional[int] = None
+    reservoir_size: Optional[int] = None
+
+
+@dataclass
+class RetentionResult:
+    deleted_values: int = 0
+    deleted_inferences: int = 0
+
+
+def apply_retention(
+    mate_name: str,
+    policy: RetentionPolicy,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause: float = 0.0,
+    vacuum: bool = True,
+) -> RetentionResult:
+    """
+    Applies `policy` to every version of the mate.
+
+    Rows are deleted in transactions of `batch_size` rows, sleeping `pause`
+    seconds between them so a serving writer can get the lock, and the freed
+    pages are then returned to the file system with incremental vacuum.
+    """
+    result = RetentionResult()
+    mates = Mate.select().where(Mate.name == mate_name)
+    # alerted rows are never deleted
+    alerted_values = FeatureAlert.select(FeatureAlert.feature_value)
+    alerted_inferences = FeatureAlert.select(FeatureAlert.inference)
+
+    if policy.ttl is not None:
+        expired = Inference.select(Inference.id).where(
+            Inference.mate.in_(mates)
+            & (Inference.created_at < datetime.datetime.now() - policy.ttl)
+        )
+        result.deleted_values += _delete_values(
+            _ids(expired), alerted_values, batch_size, pause
+        )
+        result.deleted_inferences += _delete_batches(
+            Inference,
+            _ids(expired.where(Inference.id.not_in(alerted_inferences))),
+            batch_size,
+            pause,
+        )
+
+    # downsampling works on inferences that still have feature values
+    sampled = _ids(
+        Inference.select(Inference.id)
+        .where(
+            Inference.mate.in_(mates)
+            & fn.EXISTS(
+                FeatureValue.select().where(FeatureValue.inference == Inference.id)
+            )
+        )
+        .order_by(Inference.id)
+    )
+
+    if policy.keep_every is not None and policy.keep_every > 1:
+        # by id, so a second run doesn't thin the same rows again
+        dropped = [i for i in sampled if i % policy.keep_every]
+        result.deleted_values += _delete_values(
+            dropped, alerted_values, batch_size, pause
+        )
+        sampled = [i for i in sampled if not i % policy.keep_every]
+
+    if policy.reservoir_size is not None and len(sampled) > policy.reservoir_size:
+        result.deleted_values += _delete_values(
+            _outside_reservoir(sampled, policy.reservoir_size),
+            alerted_values,
+            batch_size,
+            pause,
+        )
+
+    if vacuum:
+        incremental_vacuum()
+
+    logger.info(
+        f"Retention for the '{mate_name}' mate deleted {result.deleted_values} "
+        + f"feature values and {result.deleted_inferences} inferences."
+    )
+
+    return result
+
+
+def apply_retention_policies(
+    policies: Dict[str, RetentionPolicy], **kwargs
+) -> Dict[str, RetentionResult]:
+    """
+    Applies a policy per mate name; see `apply_retention` for the options.
+    """
+    results = {
+        name: apply_retention(name, policy, vacuum=False, **kwargs)
+        for name, policy in policies.items()
+    }
+    incremental_vacuum()
+
+    return results
+
+
+def _ids(query) -> List[int]:
+    return [row_id for (row_id,) in query.tuples()]
+
+
+def _outside_reservoir(ids: List[int], size: int) -> List[int]:
+    """
+    The ids not in a uniform sample of `size` ids. Each id gets a fixed
+    pseudo-random priority and the lowest `size` are kept (bottom-k
+    sampling), so later runs keep a uniform sample as new ids arrive.
+    """
+    array = np.array(ids, dtype=np.uint64)
+    priorities = (array * _HASH_MULTIPLIER) & np.uint64(0xFFFFFFFF)
+    dropped = np.argpartition(priorities, size)[size:]
+
+    return sorted(array[dropped].astype(np.int64).tolist())
+
+
+def _delete_values(
+    inference_ids: List[int], alerted_values, batch_size: int, pause: float
+) -> int:
+    deleted = 0
+
+    for batch in chunked(inference_ids, batch_size):
+        value_ids = _ids(
+            FeatureValue.select(FeatureValue.id).where(
+                FeatureValue.inference.in_(batch)
+                & FeatureValue.id.not_in(alerted_values)
+            )
+        )
+        deleted += _delete_batches(FeatureValue, value_ids, batch_size, pause)
+
+    return deleted
+
+
+def _delete_batches(model, ids: List[int], batch_size: int, pause: float) -> int:
+    deleted = 0
+
+    for batch in chunked(ids, batch_size):
+        with write_transaction():
+            deleted += model.delete().where(model.id.in_(batch)).execute()
+
+        if pause:
+            time.sleep(pause)
+
+    return deleted
+
+
+def enable_incremental_vacuum():
+    """
+    Switches an existing database to incremental auto-vacuum. New databases
+    already use it (see SQLITE_PRAGMAS); older ones need this one-off full
+    VACUUM, which rewrites the file and locks it while it runs. SQLite only.
+    """
+    if not isinstance(db.obj, SqliteDatabase):
+        return
+
+    if db.execute_sql("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        db.execute_sql("PRAGMA auto_vacuum = incremental")
+        db.execute_sql("VACUUM")
+
+
+def incremental_vacuum(batch_pages: int = VACUUM_BATCH_PAGES) -> int:
+    """
+    Returns free pages to the file system, `batch_pages` per transaction.
+    Does nothing unless incremental auto-vacuum is enabled; PostgreSQL's
+    autovacuum does this on its own.
+    """
+    if not isinstance(db.obj, SqliteDatabase):
+        return 0
+
+    if db.execute_sql("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+
+    def free_pages() -> int:
+        return db.execute_sql("PRAGMA freelist_count").fetchone()[0]
+
+    before = remaining = free_pages()
+    while remaining:
+        db.execute_sql(f"PRAGMA incremental_vacuum({batch_pages})").fetchall()
+
+        previous, remaining = remaining, free_pages()
+        if remaining >= previous:
+            # pages still in use by a reader's snapshot; try again next run
+            break
+
+    return before - remaining
@@ -1,24 +1,39 @@
 import logging
 import traceback
 from time import perf_counter
-from typing import List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
+import numpy as np
 import pandas as pd  # type: ignore
+from peewee import chunked  # type: ignore
 
+from mate.aggregates import RollingAggregates
 from mate.alerts import Alert, AlertTarget, FeatureAlertKind, InferenceException
-from mate.checks import is_out_of_bounds, is_outlier
+from mate.baseline import NUMERICAL_TYPES, CompiledBaseline, get_compiled_baseline
+from mate.checks import CheckThresholds
 from mate.db import (
+    INSERT_BATCH_SIZE,
     Feature,
     FeatureAlert,
     FeatureValue,
     Inference,
-    NumericalStats,
-    StringStats,
-    get_current_mate,
-    get_features,
-    get_statistics,
+    InferenceRecord,
+    acquire_connection,
+    release_connection,
+    save_inference_records,
+    write_transaction,
 )
-from mate.stats import CustomStats, FeatureType, Statistics
+from mate.dispatch import AlertDispatcher
+from mate.drift import DriftMonitor, DriftResult
+from mate.metrics import (
+    FEATURE_ALERTS,
+    INFERENCE_SECONDS,
+    PHASE_SECONDS,
+    get_metrics_sink,
+)
+from mate.recorder import BackgroundRecorder
+from mate.sampling import SamplingPolicy
+from mate.stats import CustomStats, Statistics
 
 MATE_STATISTICS_PATH_VAR = "MATE_STATISTICS_PATH"
 MATE_CONSTRAINTS_PATH_VAR = "MATE_CONSTRAINTS_PATH"
@@ -32,6 +47,9 @@ class RunningMate(object):
     statistics: Optional[Statistics]
     feature_alerts: List[FeatureAlert]
     targets: Sequence[AlertTarget]
+    baseline: CompiledBaseline
+    record: InferenceRecord
+    inference: Optional[Inference]
 
     def __init__(
         self,
@@ -39,138 +57,345 @@ class RunningMate(object):
         mate_version: int,
         df: pd.DataFrame,
         targets: Sequence[AlertTarget],
-        custom_stats: List[CustomStats] = None,
+        custom_stats: Optional[List[CustomStats]] = None,
         should_save_all_feature_values: bool = False,
+        inference_per_row: bool = False,
+        recorder: Optional[BackgroundRecorder] = None,
+        dispatcher: Optional[AlertDispatcher] = None,
+        percentile_bounds: Optional[Tuple[float, float]] = None,
+        aggregates: Optional[RollingAggregates] = None,
+        drift: Optional[DriftMonitor] = None,
+        sampling: Optional[SamplingPolicy] = None,
+        request_key: Optional[Union[str, Sequence[str]]] = None,
+        baseline: Optional[CompiledBaseline] = None,
+        thresholds: Optional[CheckThresholds] = None,
     ):
+        """
+        Checks every row of `df` against the mate's baseline statistics.
+
+        `df` may hold a single row or a whole batch. The checks run as NumPy
+        masks over each feature column, so a batch costs a handful of
+        vectorized passes. By default the batch is recorded as one Inference;
+        set `inference_per_row` to record one Inference per row instead.
+
+        Features and stats come from the process-level compiled baseline for
+        (`mate_name`, `mate_version`), so only the first construction for a
+        version reads them from the database.
+
+        The inferences, feature values and alerts are collected into an
+        InferenceRecord and written in a single transaction. With a `recorder`,
+        nothing is written on the request thread: the record (runtime included)
+        is handed to the recorder when the context exits. With a `dispatcher`,
+        alerts are delivered on its thread pool instead of serially on exit.
+        With a pooled database (see SqliteBackend and PostgresBackend), the
+        thread's connection is checked out here and returned on exit.
+
+        Set `percentile_bounds` to a (lower, upper) pair of percentiles, e.g.
+        (0.5, 99.5), to raise percentile alerts for numerical values outside
+        those percentiles of the baseline's quantile sketch.
+
+        `thresholds` selects the outlier checks (z-score, robust median/MAD
+        z-score, IQR fences) and their thresholds, for the features without
+        thresholds persisted with the mate version (see
+        set_feature_thresholds). It defaults to the z-score check with a
+        cutoff of 4.0.
+
+        With `aggregates`, the rows of `df` are also added to its rolling,
+        time-bucketed production statistics.
+
+        With `drift`, the rows of `df` are added to the monitor's sliding
+        windows. When a periodic check finds a feature has drifted, a drift
+        alert is raised for it (on its first row), like a custom stat.
+
+        With `sampling` (and `should_save_all_feature_values` off), feature
+        values are recorded for a sample of the rows, per the policy's rates.
+        Pass `request_key` (one per row, or one for all rows) for
+        deterministic, hash-based sampling.
+
+        `baseline` skips the cache lookup with an already compiled baseline
+        (see MateMonitor).
+        """
         self.mate_name = mate_name
         self.mate_version = mate_version
         self.targets = targets
         self.custom_stats = custom_stats
         self.should_save_all_feature_values = should_save_all_feature_values
+        self.inference_per_row = inference_per_row
+        self.recorder = recorder
+        self.dispatcher = dispatcher
+        self.percentile_bounds = percentile_bounds
+        self.thresholds = thresholds
+        self.aggregates = aggregates
+        self.drift = drift
+        self.drift_results: List[DriftResult] = []
+        self.sampling = sampling
+        self.request_key = request_key
+        self.inference = None
+        # None unless metrics are enabled; see _end_phase
+        self._metrics = get_metrics_sink()
+        self._phase_start = perf_counter() if self._metrics is not None else 0.0
+
+        # with a pooled database, the connection is held until the context exits
+        self._acquired_connection = acquire_connection()
+
+        try:
+            if baseline is None:
+                baseline = get_compiled_baseline(self.mate_name, self.mate_version)
+            self.mate = baseline.mate if baseline else None
+            self._end_phase("baseline")
+
+            if baseline:
+                self.baseline = baseline
+                self.features = baseline.features
+                self.record = InferenceRecord(
+                    mate=baseline.mate,
+                    inference_count=len(df) if self.inference_per_row else 1,
+                )
+                # value position of the first row of each fully saved feature
+                self._saved_feature_offsets: Dict[str, int] = {}
+                # value position of each (feature name, row) saved for an alert
+                # or by sampling
+                self._alert_value_positions: Dict[Tuple[str, int], int] = {}
+                self._alert_values: Dict[int, FeatureValue] = {}
+                self._alerted_rows: Set[int] = set()
+
+                logger.info("\n")
+                logger.info(f"Using mate version {self.mate_version}.")
+
+                if self.should_save_all_feature_values:
+                    self._collect_feature_values(df)
+                elif self.sampling is not None:
+                    self._collect_sampled_feature_values(df, self.sampling)
+                self._end_phase("values")
+
+                self.feature_alerts: List[FeatureAlert] = []
+                self.feature_alerts.extend(self._check_statistics(df))
+                self._end_phase("checks")
+
+                if self.drift is not None:
+                    self.drift_results = self.drift.update(baseline, df)
+                    self.feature_alerts.extend(self._drift_alerts(df))
+                    self._end_phase("drift")
+
+                if (
+                    self.sampling is not None
+                    and self.sampling.always_on_alert
+                    and not self.should_save_all_feature_values
+                ):
+                    self._collect_alerted_rows(df)
+                    self._end_phase("alert_values")
+
+                if self.aggregates is not None:
+                    self.aggregates.update(baseline, df, self.record.created_at)
+                    self._end_phase("aggregates")
+
+                if self.recorder is None:
+                    save_inference_records([self.record])
+                    self.inference = Inference(
+                        id=(
+                            self.record.inference_ids[0]
+                            if self.record.inference_ids
+                            else None
+                        ),
+                        mate=self.mate,
+                        created_at=self.record.created_at,
+                    )
+                    self._end_phase("save")
 
-        self.mate = get_current_mate(self.mate_name)
+                if self._metrics is not None:
+                    for feature_alert in self.feature_alerts:
+                        self._metrics.increment(
+                            FEATURE_ALERTS,
+                            tags={"mate": self.mate_name, "kind": feature_alert.kind},
+                        )
+            else:
+                logger.info("\n")
+                logger.info(f"Mate version {self.mate_version} not found.")
+        except BaseException:
+            # __exit__ won't run, so the connection must be returned here
+            release_connection(self._acquired_connection)
+            raise
+
+    def _end_phase(self, phase: str):
+        """
+        Records the time since the previous phase ended, when metrics are on.
+        """
+        if self._metrics is None:
+            return
+
+        now = perf_counter()
+        self._metrics.observe(
+            PHASE_SECONDS,
+            now - self._phase_start,
+            {"mate": self.mate_name, "phase": phase},
+        )
+        self._phase_start = now
+
+    def _inference_position(self, row: int) -> int:
+        return row if self.inference_per_row else 0
+
+    def _collect_feature_values(self, df: pd.DataFrame):
+        positions = range(len(df)) if self.inference_per_row else [0] * len(df)
 
-        if self.mate:
-            self.features = get_features(self.mate)
-            self.inference = Inference.create(mate=self.mate)
+        for feature in self.features:
+            self._saved_feature_offsets[feature.name] = len(self.record.feature_values)
+            self.record.feature_values.extend(
+                zip(
+                    self._storable_values(feature, df[feature.name]),
+                    [feature.id] * len(df),
+                    positions,
+                    [1.0] * len(df),
+                )
+            )
 
-            logger.info("\n")
-            logger.info(f"Using mate version {self.mate_version}.")
+    def _collect_rows(
+        self,
+        feature: Feature,
+        col: pd.Series,
+        rows: np.ndarray,
+        sample_rate: Optional[float] = None,
+    ):
+        """
+        Records the values of `rows` not recorded yet. `sample_rate` is the
+        rate they were sampled at, or None when they are recorded only
+        because of an alert.
+        """
+        values = self._storable_values(feature, col.iloc[rows])
+
+        for row, value in zip(rows.tolist(), values):
+            key = (feature.name, row)
+            if key not in self._alert_value_positions:
+                self._alert_value_positions[key] = len(self.record.feature_values)
+                self.record.feature_values.append(
+                    (value, feature.id, self._inference_position(row), sample_rate)
+                )
 
-            if self.should_save_all_feature_values:
-                for feature in self.features:
-                    col = df[feature.name]
-                    FeatureValue.create(
-                        value=col.item(),
-                        feature=feature,
-                        inference=self.inference,
-                    )
+    def _collect_sampled_feature_values(
+        self, df: pd.DataFrame, sampling: SamplingPolicy
+    ):
+        draws = sampling.draw(len(df), self.request_key)
 
-            self.feature_alerts: List[FeatureAlert] = []
-            self.feature_alerts.extend(self._check_statistics(df))
-        else:
-            logger.info("\n")
-            logger.info(f"Mate version {self.mate_version} not found.")
+        for feature in self.features:
+            rows = np.flatnonzero(sampling.sample(feature.name, draws))
+            self._collect_rows(
+                feature, df[feature.name], rows, sampling.rate_for(feature.name)
+            )
+
+    def _collect_alerted_rows(self, df: pd.DataFrame):
+        rows = np.array(sorted(self._alerted_rows), dtype=np.int64)
 
-    def _check_statistics(self, df: pd.DataFrame) -> List[FeatureAlert]:
-        result = []
         for feature in self.features:
-            col = df[feature.name]
-            result.extend(self._check_feature_statistics(feature, col))
+            self._collect_rows(feature, df[feature.name], rows)
 
-            if self.custom_stats:
-                for stat in self.custom_stats:
-                    if feature.name == stat.feature:
-                        feature_value, created = FeatureValue.get_or_create(
-                            feature=feature, value=col.item(), inference=self.inference
-                        )
-                        result.append(
-                            FeatureAlert.create(
-                                name=col.name,
-                                kind=stat.name,
-                                feature_value=feature_value,
-                                feature=feature,
-                                inference=self.inference,
-                            )
-                        )
+    def _storable_values(self, feature: Feature, col: pd.Series) -> list:
+        """
+        Values of `col` as stored by FeatureValue: numbers stay numbers for
+        numerical features, and values of other features are stored as text.
+        """
+        if feature.inferred_type in NUMERICAL_TYPES:
+            return col.tolist()
 
-        logger.info(f"Found {len(result)} statistical alerts.")
+        return [
+            value if value is None or isinstance(value, str) else str(value)
+            for value in col.where(col.notna(), None).tolist()
+        ]
 
-        return result
+    def _value_position(self, feature: Feature, col: pd.Series, row: int) -> int:
+        if feature.name in self._saved_feature_offsets:
+            return self._saved_feature_offsets[feature.name] + row
+
+        self._collect_rows(feature, col, np.array([row]))
+
+        return self._alert_value_positions[(feature.name, row)]
 
-    def _check_feature_statistics(
-        self, feature: Feature, col: pd.Series
+    def _create_feature_alerts(
+        self,
+        feature: Feature,
+        col: pd.Series,
+        mask: Union[bool, np.ndarray],
+        kind: str,
     ) -> List[FeatureAlert]:
+        """
+        Creates a FeatureAlert of `kind` for every row flagged in `mask`.
+
+        Alerts on the same value share one FeatureValue, reusing the row saved
+        by `should_save_all_feature_values` or sampling when there is one.
+        """
         result: List[FeatureAlert] = []
-        num_missing = None
-
-        if feature.inferred_type in [
-            FeatureType.INTEGER.value,
-            FeatureType.FRACTION.value,
-        ]:
-            numerical_statistic = get_statistics(NumericalStats, feature)
-
-            # outlier check
-            if is_outlier(
-                float(col.item()), numerical_statistic.mean, numerical_statistic.std_dev
-            ):
-                feature_value, created = FeatureValue.get_or_create(
-                    feature=feature, value=col.item(), inference=self.inference
-                )
+        mask = np.asarray(mask)
 
-                result.append(
-                    FeatureAlert.create(
-                        name=col.name,
-                        kind=FeatureAlertKind.OUTLIER.value,
-                        feature_value=feature_value,
-                        feature=feature,
-                        inference=self.inference,
-                    )
-                )
+        if not mask.any():
+            return result
 
-            # bound check
-            if is_out_of_bounds(
-                float(col.item()),
-                float(numerical_statistic.min),
-                float(numerical_statistic.max),
-            ):
-                feature_value, created = FeatureValue.get_or_create(
-                    feature=feature, value=col.item(), inference=self.inference
-                )
+        values = col.tolist()
+        for row in np.flatnonzero(mask):
+            self._alerted_rows.add(int(row))
+            value_position = self._value_position(feature, col, row)
 
-                result.append(
-                    FeatureAlert.create(
-                        name=col.name,
-                        kind=FeatureAlertKind.BOUND.value,
-                        feature_value=feature_value,
-                        feature=feature,
-                        inference=self.inference,
-                    )
+            if value_position not in self._alert_values:
+                self._alert_values[value_position] = FeatureValue(
+                    value=values[row], feature=feature
                 )
 
-            num_missing = numerical_statistic.num_missing
+            feature_alert = FeatureAlert(
+                name=col.name,
+                kind=kind,
+                feature_value=self._alert_values[value_position],
+                feature=feature,
+            )
+            self.record.feature_alerts.append(
+                (feature_alert, value_position, self._inference_position(row))
+            )
+            result.append(feature_alert)
+
+        return result
+
+    def _check_statistics(self, df: pd.DataFrame) -> List[FeatureAlert]:
+        """
+        Runs the baseline's compiled check plan over `df`, then the custom
+        stats, and creates alerts feature by feature.
+        """
+        plan = self.baseline.check_plan(self.percentile_bounds, self.thresholds)
+        failed: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+
+        for check in plan.run(df):
+            failed.setdefault(check.feature_index, []).append((check.kind, check.mask))
+
+        # a failed custom stat is about the whole batch, so like drift it
+        # alerts on the first row, unless each row is its own inference
+        if self.inference_per_row:
+            stat_rows = np.ones(len(df), dtype=bool)
+        else:
+            stat_rows = np.arange(len(df)) == 0
 
-        if feature.inferred_type == FeatureType.STRING.value:
-            string_statistic = get_statistics(StringStats, feature)
+        for stat in self.custom_stats or []:
+            i = self.baseline.index.get(stat.feature)
+            if i is not None:
+                failed.setdefault(i, []).append((stat.name, stat_rows))
 
-            num_missing = string_statistic.num_missing
+        result = []
+        for i in sorted(failed):
+            feature = self.features[i]
+            col = df[feature.name]
+            for kind, mask in failed[i]:
+                result.extend(self._create_feature_alerts(feature, col, mask, kind))
 
-        # null check
-        if num_missing is not None and num_missing == 0:
-            if col.isnull().any():
-                feature_value, created = FeatureValue.get_or_create(
-                    feature=feature, value=col.item(), inference=self.inference
-                )
+        logger.info(f"Found {len(result)} statistical alerts.")
 
-                result.append(
-                    FeatureAlert.create(
-                        name=col.name,
-                        kind=FeatureAlertKind.NULL.value,
-                        feature_value=feature_value,
-                        feature=feature,
-                        inference=self.inference,
-                    )
+        return result
+
+    def _drift_alerts(self, df: pd.DataFrame) -> List[FeatureAlert]:
+        result = []
+
+        for drift_result in self.drift_results:
+            i = self.baseline.index[drift_result.feature_name]
+            col = df[drift_result.feature_name]
+            first_row = np.arange(len(col)) == 0
+            result.extend(
+                self._create_feature_alerts(
+                    self.features[i], col, first_row, FeatureAlertKind.DRIFT.value
                 )
+            )
 
         return result
 
@@ -181,8 +406,23 @@ class RunningMate(object):
         time_end = perf_counter()
         runtime = time_end - self.time_start
 
-        self.inference.runtime = runtime
-        self.inference.save()
+        self.record.runtime = runtime
+        if self._metrics is not None:
+            self._metrics.observe(INFERENCE_SECONDS, runtime, {"mate": self.mate_name})
+            self._phase_start = time_end
+
+        try:
+            if self.recorder is not None:
+                self.recorder.submit(self.record)
+            else:
+                with write_transaction():
+                    for batch in chunked(self.record.inference_ids, INSERT_BATCH_SIZE):
+                        Inference.update(runtime=runtime).where(
+                            Inference.id.in_(batch)
+                        ).execute()
+        finally:
+            release_connection(self._acquired_connection)
+        self._end_phase("runtime")
 
         logger.info(f"Elapsed inference time in seconds: {runtime}")
 
@@ -197,6 +437,10 @@ class RunningMate(object):
 
         alert = Alert(self.mate_name, self.feature_alerts, inference_exception)
 
-        if len(alert.features) > 0 or alert.exception is not None:
-            for target in self.targets:
-                target.send_alert(alert)
+        if not alert.is_empty():
+            if self.dispatcher is not None:
+                self.dispatcher.dispatch(alert, self.targets)
+            else:
+                for target in self.targets:
+                    target.send_alert(alert)
+            self._end_phase("alerts")
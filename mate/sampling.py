@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from mate.sketches import hash_values
+
+
+@dataclass
+class SamplingPolicy:
+    """
+    Which feature values RunningMate records
+
+    Each row gets a uniform draw u in [0, 1), and a feature's value in that
+    row is recorded when u < the feature's rate. Because one draw is shared
+    by all features of a row, the rows kept for a low-rate feature are a
+    subset of those kept for a higher-rate one. With request keys the draw is
+    a hash of the key, so the same request is always sampled the same way
+    (across features, processes and restarts). Recorded values keep the
+    rate they were sampled at (FeatureValue.sample_rate); values recorded
+    only because of an alert keep none, so they can be left out of the
+    sample.
+
+        Parameters:
+            rate (float): Fraction of rows recorded (defaults to 1.0)
+            feature_rates (dict): Rates for specific features, overriding `rate`
+            always_on_alert (bool): Record every feature of a row that raised an alert, without a sample rate (defaults to True)
+            seed (int): Seed for the draws when no request key is given
+    """
+
+    rate: float = 1.0
+    feature_rates: Dict[str, float] = field(default_factory=dict)
+    always_on_alert: bool = True
+    seed: Optional[int] = None
+    _rng: np.random.Generator = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._rng = np.random.default_rng(self.seed)
+
+    def rate_for(self, feature_name: str) -> float:
+        return self.feature_rates.get(feature_name, self.rate)
+
+    def draw(
+        self, rows: int, keys: Optional[Union[str, Sequence[str]]] = None
+    ) -> np.ndarray:
+        """
+        One uniform value per row, from the request `keys` (one per row, or
+        one for all rows) when given.
+        """
+        if keys is None:
+            return self._rng.random(rows)
+
+        if isinstance(keys, str):
+            keys = [keys] * rows
+
+        hashes = hash_values(pd.Series(list(keys), dtype=object).astype(str))
+        # top 53 bits, so every value is exactly representable as a float
+        return (hashes >> np.uint64(11)).astype(float) / float(1 << 53)
+
+    def sample(
+        self,
+        feature_name: str,
+        draws: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Mask of the rows whose value of `feature_name` is recorded.
+        """
+        return draws < self.rate_for(feature_name)
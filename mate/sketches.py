@@ -0,0 +1,408 @@
+import json
+import struct
+import zlib
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """
+    Stable 64-bit hashes of the non-null values in `series`.
+    """
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy(
+        dtype=np.uint64
+    )
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    values = values.copy()
+    lengths = np.zeros(values.shape, dtype=np.int64)
+
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        lengths[mask] += shift
+        values[mask] >>= np.uint64(shift)
+
+    return lengths + (values > 0)
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog cardinality sketch
+
+    Uses 2 ** precision one-byte registers (4 KiB at the default precision of
+    12, for a standard error of about 1.6%). Updates are vectorized over
+    NumPy arrays of 64-bit hashes, and sketches merge by taking the register max.
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, series: pd.Series):
+        self.update_hashes(hash_values(series))
+
+    def update_hashes(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        rank = (64 - self.precision) - _bit_length(rest) + 1
+
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return struct.pack("B", self.precision) + zlib.compress(
+            self.registers.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        sketch = cls(precision=data[0])
+        sketch.registers = np.frombuffer(
+            zlib.decompress(data[1:]), dtype=np.uint8
+        ).copy()
+        return sketch
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, HyperLogLog)
+            and self.precision == other.precision
+            and np.array_equal(self.registers, other.registers)
+        )
+
+
+class TopK(object):
+    """
+    Mergeable Space-Saving summary of the most frequent values
+
+    Keeps at most `capacity` counters. While no counter has been evicted the
+    summary is `complete`: it holds every distinct value with its exact count.
+    After that, a value without a counter starts from the smallest kept count
+    (the most it can have been seen), so every kept count is an upper bound
+    that overcounts by at most its entry in `errors`.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.max_error = 0  # largest evicted count; 0 while complete
+
+    @property
+    def complete(self) -> bool:
+        return self.max_error == 0
+
+    @property
+    def min_count(self) -> int:
+        """
+        The most times a value without a counter can have been seen.
+        """
+        return min(self.counts.values()) if not self.complete else 0
+
+    def update(self, series: pd.Series):
+        self._merge_counts(series.dropna().value_counts(), pd.Series(dtype="int64"), 0)
+
+    def merge(self, other: "TopK"):
+        self._merge_counts(
+            pd.Series(other.counts, dtype="int64"),
+            pd.Series(other.errors, dtype="int64"),
+            other.min_count,
+        )
+        self.max_error = max(self.max_error, other.max_error)
+
+    def _merge_counts(self, counts: pd.Series, errors: pd.Series, min_count: int):
+        own_counts = pd.Series(self.counts, dtype="int64")
+        own_errors = pd.Series(self.errors, dtype="int64")
+        keys = own_counts.index.union(counts.index)
+
+        # a value missing from one side gets that side's min_count, as both
+        # its count and its error
+        combined = own_counts.reindex(keys, fill_value=self.min_count) + counts.astype(
+            "int64"
+        ).reindex(keys, fill_value=min_count)
+        combined_errors = own_errors.reindex(
+            keys, fill_value=self.min_count
+        ) + errors.reindex(keys, fill_value=min_count)
+
+        if len(combined) > self.capacity:
+            combined = combined.sort_values(ascending=False, kind="mergesort")
+            self.max_error = max(self.max_error, int(combined.iloc[self.capacity]))
+            combined = combined.iloc[: self.capacity]
+
+        self.counts = {str(value): int(count) for value, count in combined.items()}
+        self.errors = {
+            str(value): int(combined_errors[value]) for value in combined.index
+        }
+
+    def most_common(self, n: Optional[int] = None):
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+
+    def categories(self) -> Optional[FrozenSet[str]]:
+        """
+        The exact set of values seen, or None if the summary is not complete.
+        """
+        return frozenset(self.counts) if self.complete else None
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(
+            json.dumps(
+                {
+                    "capacity": self.capacity,
+                    "max_error": self.max_error,
+                    "counts": self.counts,
+                    "errors": self.errors,
+                }
+            ).encode()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TopK":
+        state = json.loads(zlib.decompress(data))
+        sketch = cls(capacity=state["capacity"])
+        sketch.counts = state["counts"]
+        # not stored by older versions
+        sketch.errors = state.get("errors") or dict.fromkeys(sketch.counts, 0)
+        sketch.max_error = state["max_error"]
+        return sketch
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, TopK)
+            and self.capacity == other.capacity
+            and self.max_error == other.max_error
+            and self.counts == other.counts
+            and self.errors == other.errors
+        )
+
+
+class QuantileSketch(object):
+    """
+    Mergeable KLL-style quantile sketch
+
+    Values are added to level 0. When the sketch is over capacity, the lowest
+    full level is sorted and every other value is promoted to the next level
+    with twice the weight. The capacity shrinks by 2/3 per level below the
+    top, so the sketch keeps at most about 3 * k values whatever the input
+    size. The compaction offset alternates per level, so the same input
+    always gives the same sketch.
+    """
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._offsets: List[int] = [0]
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "QuantileSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+            self._offsets.append(0)
+
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+
+        self.count += other.count
+        self._compress()
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        # lazy compaction: only compact while the sketch is over its total
+        # capacity, and then only the lowest level that is full
+        while sum(map(len, self.levels)) > sum(
+            self._capacity(level) for level in range(len(self.levels))
+        ):
+            level = next(
+                level
+                for level in range(len(self.levels))
+                if len(self.levels[level]) >= self._capacity(level)
+            )
+            self._compact(level)
+
+    def _compact(self, level: int):
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+            self._offsets.append(0)
+
+        values = np.sort(self.levels[level])
+        if len(values) % 2:
+            # an odd value out stays at this level
+            self.levels[level], values = values[-1:], values[:-1]
+        else:
+            self.levels[level] = np.empty(0)
+
+        offset = self._offsets[level]
+        self._offsets[level] = 1 - offset
+        self.levels[level + 1] = np.concatenate(
+            [self.levels[level + 1], values[offset::2]]
+        )
+
+    def _weighted_values(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(values), 2**level) for level, values in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="mergesort")
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Value at quantile(s) `q` (0 to 1). Scalars and arrays are accepted.
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        values, cumulative = self._weighted_values()
+        ranks = np.asarray(q) * cumulative[-1]
+        index = np.searchsorted(cumulative, ranks, side="left")
+        result = values[np.minimum(index, len(values) - 1)]
+
+        return result if np.ndim(q) else float(result)
+
+    def median_absolute_deviation(self) -> float:
+        """
+        Median of the absolute deviations from the (approximate) median.
+        """
+        if self.count == 0:
+            return np.nan
+
+        values, cumulative = self._weighted_values()
+        weights = np.diff(cumulative, prepend=0)
+        deviations = np.abs(values - self.quantile(0.5))
+
+        order = np.argsort(deviations, kind="mergesort")
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, 0.5 * cumulative[-1], side="left")
+
+        return float(deviations[order][index])
+
+    def cdf(self, x) -> np.ndarray:
+        """
+        Fraction of values less than or equal to each value of `x`.
+        """
+        if self.count == 0:
+            return np.zeros(np.shape(x))
+
+        values, cumulative = self._weighted_values()
+        index = np.searchsorted(values, np.asarray(x, dtype=float), side="right")
+        below = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0)
+
+        return below / cumulative[-1]
+
+    def to_bytes(self) -> bytes:
+        header = struct.pack("<IQI", self.k, self.count, len(self.levels))
+        sizes = struct.pack(f"<{len(self.levels)}I", *map(len, self.levels))
+        offsets = struct.pack(f"<{len(self.levels)}B", *self._offsets)
+        values = np.concatenate(self.levels).astype("<f8").tobytes()
+
+        return zlib.compress(header + sizes + offsets + values)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        data = zlib.decompress(data)
+        k, count, num_levels = struct.unpack_from("<IQI", data)
+        position = struct.calcsize("<IQI")
+
+        sizes = struct.unpack_from(f"<{num_levels}I", data, position)
+        position += 4 * num_levels
+        offsets = struct.unpack_from(f"<{num_levels}B", data, position)
+        position += num_levels
+
+        values = np.frombuffer(data, dtype="<f8", offset=position).astype(float)
+
+        sketch = cls(k=k)
+        sketch.count = count
+        sketch.levels = np.split(values, np.cumsum(sizes)[:-1])
+        sketch._offsets = list(offsets)
+        return sketch
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, QuantileSketch)
+            and self.k == other.k
+            and self.count == other.count
+            and len(self.levels) == len(other.levels)
+            and all(np.array_equal(a, b) for a, b in zip(self.levels, other.levels))
+        )
+
+
+class Histogram(object):
+    """
+    Fixed-bin histogram: `counts[i]` values fall in (edges[i], edges[i + 1]]
+
+    The first bin also holds values equal to edges[0].
+    """
+
+    def __init__(self, edges: np.ndarray, counts: np.ndarray):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.asarray(counts, dtype=float)
+
+    @classmethod
+    def from_sketch(cls, sketch: QuantileSketch, bins: int = 20) -> "Histogram":
+        """
+        Builds equal-width bins over the sketch's range from its CDF, so no
+        second pass over the data is needed.
+        """
+        low, high = sketch.quantile(0.0), sketch.quantile(1.0)
+        if low == high:
+            high = low + 1.0
+
+        edges = np.linspace(low, high, bins + 1)
+        cumulative = sketch.cdf(edges) * sketch.count
+        cumulative[0] = 0.0
+        cumulative[-1] = sketch.count
+
+        return cls(edges, np.diff(cumulative))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(
+            struct.pack("<I", len(self.counts))
+            + self.edges.astype("<f8").tobytes()
+            + self.counts.astype("<f8").tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Histogram":
+        data = zlib.decompress(data)
+        (bins,) = struct.unpack_from("<I", data)
+        edges, counts = np.split(np.frombuffer(data, dtype="<f8", offset=4), [bins + 1])
+        return cls(edges, counts)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, Histogram)
+            and np.array_equal(self.edges, other.edges)
+            and np.array_equal(self.counts, other.counts)
+        )
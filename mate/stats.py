@@ -1,6 +1,12 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from mate.sketches import Histogram, HyperLogLog, QuantileSketch, TopK
+
+# percentiles (0 to 100) whose exact values in-memory baselines store, so
+# `percentile_bounds` on them don't carry the quantile sketch's rank error
+TAIL_PERCENTILES = (0.1, 0.5, 1.0, 2.5, 5.0, 95.0, 97.5, 99.0, 99.5, 99.9)
 
 
 class FeatureType(Enum):
@@ -24,12 +30,21 @@ class NumericalStatistics:
     std_dev: float
     min: float
     max: float
+    quantiles: Optional[QuantileSketch] = None
+    histogram: Optional[Histogram] = None
+    median: Optional[float] = None
+    mad: Optional[float] = None  # median absolute deviation from the median
+    q1: Optional[float] = None  # 25th percentile
+    q3: Optional[float] = None  # 75th percentile
+    tail_quantiles: Optional[Dict[float, float]] = None  # exact, at TAIL_PERCENTILES
 
 
 @dataclass
 class StringStatistics:
     common: CommonStatistics
     distinct_count: int
+    hyperloglog: Optional[HyperLogLog] = None
+    top_k: Optional[TopK] = None
 
 
 @dataclass
@@ -20,6 +20,10 @@ setuptools.setup(
         "peewee==3.14.8",
         "requests==2.26.0",
     ],
+    extras_require={
+        "parquet": ["pyarrow>=6.0.0"],
+        "postgres": ["psycopg2-binary>=2.9.0"],
+    },
     long_description=long_description,
     long_description_content_type="text/markdown"
 )
@@ -0,0 +1,204 @@
+import datetime
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from mate.aggregates import (
+    HOUR,
+    MINUTE,
+    RollingAggregates,
+    _load_buckets,
+    bucket_start,
+    combine_aggregates,
+    get_feature_aggregates,
+)
+from mate.backends import SqliteBackend
+from mate.baseline import get_compiled_baseline
+from mate.db import (
+    MODELS,
+    FeatureAggregate,
+    connect_db,
+    db,
+    get_mate,
+    version_or_create_mate,
+)
+from mate.generators import generate_baseline_stats
+from mate.run import RunningMate
+
+
+def test_rolling_aggregates(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    X = df.drop(["charges"], axis=1)
+    baseline = get_compiled_baseline("insurance", 1)
+    aggregates = RollingAggregates(bucket_seconds=[MINUTE, HOUR])
+    # bucket starts are naive UTC
+    start = datetime.datetime(2022, 1, 1, 12, 0)
+    at = start.replace(tzinfo=datetime.timezone.utc)
+
+    aggregates.update(baseline, X.iloc[:500], at)
+    aggregates.update(baseline, X.iloc[500:1000], at + datetime.timedelta(seconds=30))
+    aggregates.flush()
+    # merged into the stored bucket on the next flush
+    aggregates.update(baseline, X.iloc[1000:], at + datetime.timedelta(seconds=90))
+    aggregates.flush()
+
+    assert FeatureAggregate.select().count() == 6 * 3
+
+    mate = get_mate("insurance", 1)
+    minutes = get_feature_aggregates(mate, "age", MINUTE)
+    assert [aggregate.bucket_start for aggregate in minutes] == [
+        start,
+        start + datetime.timedelta(minutes=1),
+    ]
+    assert [aggregate.count for aggregate in minutes] == [1000, len(X) - 1000]
+
+    hours = get_feature_aggregates(mate, "age", HOUR)
+    assert len(hours) == 1
+
+    for aggregates_ in (minutes, hours):
+        statistics = combine_aggregates(aggregates_)
+        assert statistics.count == len(X)
+        assert statistics.mean == pytest.approx(X["age"].mean())
+        assert statistics.std_dev == pytest.approx(X["age"].std())
+        assert statistics.min == X["age"].min()
+        assert statistics.sketch.quantile(0.5) == pytest.approx(
+            X["age"].median(), abs=1
+        )
+
+    sex = combine_aggregates(get_feature_aggregates(mate, "sex", HOUR))
+    assert sex.count == len(X)
+    assert sex.mean is None and sex.sketch is None
+
+    assert get_feature_aggregates(mate, "age", MINUTE, end=start) == []
+
+
+def test_bucket_start_is_utc():
+    at = datetime.datetime(2022, 3, 27, 1, 59, 30, tzinfo=datetime.timezone.utc)
+    elsewhere = at.astimezone(
+        datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    )
+
+    assert bucket_start(at, MINUTE) == datetime.datetime(2022, 3, 27, 1, 59)
+    assert bucket_start(elsewhere, MINUTE) == bucket_start(at, MINUTE)
+    assert bucket_start(elsewhere, HOUR) == datetime.datetime(2022, 3, 27, 1, 0)
+
+
+def test_running_mate_updates_aggregates(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    X = df.drop(["charges"], axis=1).head(10).copy()
+    X.loc[3, "bmi"] = np.nan
+    aggregates = RollingAggregates(flush_interval=0.01)
+
+    with RunningMate("insurance", 1, X, [], aggregates=aggregates):
+        pass
+    # written by the flush thread, not by the request
+    aggregates.shutdown()
+
+    bmi = get_feature_aggregates(get_mate("insurance", 1), "bmi")
+    assert len(bmi) == 1
+    assert (bmi[0].count, bmi[0].null_count) == (10, 1)
+
+
+def test_failed_flush_keeps_buckets(baseline_stats, df, monkeypatch):
+    os.environ["TESTING"] = "1"
+
+    X = df.drop(["charges"], axis=1)
+    baseline = get_compiled_baseline("insurance", 1)
+    aggregates = RollingAggregates(flush_interval=3600)
+    start = datetime.datetime(2022, 1, 1, 12, 0)
+
+    def fail(keys):
+        raise RuntimeError("database is locked")
+
+    aggregates.update(baseline, X.iloc[:500], start)
+    with monkeypatch.context() as patch:
+        patch.setattr("mate.aggregates._load_buckets", fail)
+        aggregates.flush()
+    assert FeatureAggregate.select().count() == 0
+
+    aggregates.update(baseline, X.iloc[500:], start)
+    aggregates.flush()
+
+    ages = get_feature_aggregates(get_mate("insurance", 1), "age")
+    assert [aggregate.count for aggregate in ages] == [len(X)]
+    assert ages[0].mean == pytest.approx(X["age"].mean())
+
+    with pytest.raises(ValueError):
+        RollingAggregates(flush_interval=0)
+
+
+@pytest.fixture(
+    scope="function",
+    params=[
+        "sqlite",
+        pytest.param(
+            "postgres",
+            marks=pytest.mark.skipif(
+                "MATE_TEST_POSTGRES_URL" not in os.environ,
+                reason="set MATE_TEST_POSTGRES_URL to a scratch PostgreSQL database",
+            ),
+        ),
+    ],
+)
+def shared_baseline_stats(request, df, tmp_path):
+    os.environ["TESTING"] = "1"
+
+    if request.param == "postgres":
+        connect_db(os.environ["MATE_TEST_POSTGRES_URL"])
+        db.drop_tables(MODELS)
+        db.create_tables(MODELS)
+    else:
+        connect_db(SqliteBackend(tmp_path / "mate.db"))
+
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+
+    yield
+
+    db.close()
+
+
+def test_concurrent_flushes(shared_baseline_stats, df, monkeypatch):
+    X = df.drop(["charges"], axis=1)
+    baseline = get_compiled_baseline("insurance", 1)
+    start = datetime.datetime(2022, 1, 1, 12, 0)
+
+    # two replicas flushing into the same buckets
+    replicas = [RollingAggregates(flush_interval=3600) for _ in range(2)]
+    replicas[0].update(baseline, X.iloc[:500], start)
+    replicas[1].update(baseline, X.iloc[500:], start)
+
+    # each flush waits for the other after reading its buckets, which a
+    # flush that holds the rows' locks doesn't get to do
+    barrier = threading.Barrier(2)
+
+    def load_buckets(keys):
+        buckets = _load_buckets(keys)
+        try:
+            barrier.wait(timeout=0.5)
+        except threading.BrokenBarrierError:
+            pass
+        return buckets
+
+    monkeypatch.setattr("mate.aggregates._load_buckets", load_buckets)
+
+    def flush(aggregates):
+        with db.connection_context():
+            aggregates.flush()
+
+    threads = [threading.Thread(target=flush, args=(r,)) for r in replicas]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for aggregates in replicas:
+        aggregates.shutdown()
+
+    ages = get_feature_aggregates(get_mate("insurance", 1), "age")
+    assert [aggregate.count for aggregate in ages] == [len(X)]
+    assert ages[0].mean == pytest.approx(X["age"].mean())
+    assert ages[0].max == X["age"].max()
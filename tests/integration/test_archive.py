@@ -0,0 +1,106 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd  # type: ignore
+import pytest
+
+from mate.archive import (
+    _write_partition,
+    archive_inferences,
+    has_pyarrow,
+    read_archive,
+)
+from mate.db import (
+    FeatureAlert,
+    FeatureValue,
+    Inference,
+    db,
+    get_feature_value_array,
+    get_feature_values,
+    get_mate,
+)
+from mate.run import RunningMate
+
+
+@pytest.mark.parametrize(
+    "format",
+    [
+        "npz",
+        pytest.param(
+            "parquet",
+            marks=pytest.mark.skipif(not has_pyarrow(), reason="requires pyarrow"),
+        ),
+    ],
+)
+def test_archive_inferences(baseline_stats, df, tmp_path, format, monkeypatch):
+    os.environ["TESTING"] = "1"
+
+    def write_outside_transaction(*args):
+        # files are written without holding the database's write lock
+        assert not db.in_transaction()
+        _write_partition(*args)
+
+    monkeypatch.setattr("mate.archive._write_partition", write_outside_transaction)
+
+    X = df.drop(["charges"], axis=1).head(10).copy()
+    X.loc[2, "age"] = -1  # bound alert
+    X.loc[3, "bmi"] = np.nan  # null alert
+    RunningMate(
+        "insurance",
+        1,
+        X.iloc[:5],
+        [],
+        should_save_all_feature_values=True,
+        inference_per_row=True,
+    )
+    cutoff = datetime.datetime.now()
+    RunningMate(
+        "insurance",
+        1,
+        X.iloc[5:],
+        [],
+        should_save_all_feature_values=True,
+        inference_per_row=True,
+    )
+    Inference.update(created_at=cutoff + datetime.timedelta(seconds=1)).where(
+        Inference.id > 5
+    ).execute()
+
+    expected_ages = get_feature_value_array(get_mate("insurance", 1), "age")
+
+    assert archive_inferences(cutoff, path=tmp_path, format=format) == 5
+    assert Inference.select().count() == 5
+    assert FeatureValue.select().count() == 5 * 6
+    assert FeatureAlert.select().count() == 0
+    assert list(tmp_path.glob(f"mate=insurance/version=1/date=*/*.{format}"))
+
+    mate = get_mate("insurance", 1)
+    assert (read_archive(mate, path=tmp_path)["sample_rate"] == 1.0).all()
+    alerts = read_archive(mate, "feature_alert", path=tmp_path)
+    assert alerts[["feature_name", "kind"]].values.tolist() == [
+        ["age", "bound"],
+        ["bmi", "null"],
+    ]
+
+    os.environ["MATE_ARCHIVE_PATH"] = str(tmp_path)
+    try:
+        # readers union the archive with the rows still in SQLite
+        assert get_feature_value_array(mate, "age").tolist() == expected_ages.tolist()
+        assert np.isnan(get_feature_value_array(mate, "bmi")[3])
+        sex = X["sex"].where(X["sex"].notna(), None)
+        assert get_feature_value_array(mate, "sex").tolist() == sex.tolist()
+
+        # only the rows still in SQLite, unless asked for
+        assert get_feature_values(mate).count() == 5 * 6
+
+        feature_values = get_feature_values(mate, include_archive=True)
+        assert len(feature_values) == 10 * 6
+        assert [
+            value.typed_value for value in feature_values if value.feature.name == "age"
+        ] == X["age"].tolist()
+    finally:
+        del os.environ["MATE_ARCHIVE_PATH"]
+
+    assert archive_inferences(cutoff, path=tmp_path, format=format) == 0
+    assert pd.Index(read_archive(mate, path=tmp_path)["id"]).is_unique
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from peewee import SqliteDatabase  # type: ignore
+
+from mate.backends import MemoryBackend, StorageBackend
+from mate.db import (
+    MODELS,
+    FeatureAlert,
+    FeatureValue,
+    Mate,
+    connect_db,
+    db,
+    get_backend,
+    get_mate,
+    version_or_create_mate,
+)
+from mate.generators import generate_baseline_stats
+from mate.run import RunningMate
+
+
+class ReturningSqliteDatabase(SqliteDatabase):
+    # SQLite 3.35+ supports RETURNING, like PostgreSQL
+    returning_clause = True
+
+
+class ReturningBackend(StorageBackend):
+    """
+    Stand-in for PostgresBackend: the generic INSERT ... RETURNING write path
+    on an in-memory database.
+    """
+
+    insert_batch_size = 3
+
+    def create_database(self):
+        return ReturningSqliteDatabase(":memory:")
+
+
+def test_connect_db_from_url(df):
+    connect_db("memory://")
+
+    assert db.obj.database.startswith("file:")
+    assert get_backend().insert_batch_size == 100
+
+
+@pytest.mark.parametrize("max_connections", [None, 2], ids=["per-thread", "pooled"])
+def test_memory_backend_is_shared_by_threads(max_connections):
+    connect_db(MemoryBackend(max_connections=max_connections))
+    version_or_create_mate("insurance")
+
+    def count_mates():
+        with db.connection_context():
+            return Mate.select().count()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(lambda _: count_mates(), range(4))) == [1] * 4
+
+    # a new database is empty
+    connect_db(MemoryBackend())
+    assert Mate.select().count() == 0
+
+
+def test_returning_bulk_insert(df):
+    connect_db(ReturningBackend())
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+
+    alert_df = df.iloc[[0, 1]].copy()
+    alert_df["age"] = 1000
+    RunningMate("insurance", 1, alert_df, [], should_save_all_feature_values=True)
+
+    assert FeatureValue.select().count() == 12
+    assert FeatureAlert.select().count() >= 2
+    for feature_alert in FeatureAlert.select():
+        assert feature_alert.feature_value.feature_id == feature_alert.feature_id
+        assert feature_alert.feature_value.value_int == 1000
+
+
+@pytest.mark.skipif(
+    "MATE_TEST_POSTGRES_URL" not in os.environ,
+    reason="set MATE_TEST_POSTGRES_URL to a scratch PostgreSQL database",
+)
+def test_postgres_backend(df):
+    connect_db(os.environ["MATE_TEST_POSTGRES_URL"])
+    db.drop_tables(MODELS)
+    db.create_tables(MODELS)
+
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+    RunningMate("insurance", 1, df.iloc[[1]], [], should_save_all_feature_values=True)
+
+    assert FeatureValue.select().count() == 6
+    assert get_mate("insurance", 1) is not None
+    db.close()
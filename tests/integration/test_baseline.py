@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pytest
+
+from mate.baseline import get_compiled_baseline
+from mate.cache import baseline_cache
+from mate.checks import CheckThresholds
+from mate.db import set_feature_thresholds, version_or_create_mate
+from mate.generators import generate_baseline_stats
+
+
+def test_get_compiled_baseline(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    baseline = get_compiled_baseline("insurance", 1)
+
+    assert baseline.names == ("age", "sex", "bmi", "children", "smoker", "region")
+    assert baseline.is_numerical(baseline.index["age"])
+    assert np.isnan(baseline.mean[baseline.index["sex"]])
+    assert not baseline.mean.flags.writeable
+    assert get_compiled_baseline("insurance", 1) is baseline
+    assert get_compiled_baseline("insurance", 2) is None
+
+    lower, upper = baseline.percentile_bounds(0.0, 100.0)
+    assert lower[baseline.index["age"]] == baseline.min[baseline.index["age"]]
+    assert upper[baseline.index["age"]] == baseline.max[baseline.index["age"]]
+    assert np.isnan(lower[baseline.index["sex"]])
+    assert baseline.percentile_bounds(0.0, 100.0)[0] is lower
+
+
+def test_percentile_bounds_are_exact_in_memory(baseline_stats, df):
+    baseline = get_compiled_baseline("insurance", 1)
+    bmi = baseline.index["bmi"]
+
+    lower, upper = baseline.percentile_bounds(0.5, 99.5)
+    assert [lower[bmi], upper[bmi]] == np.quantile(df["bmi"], [0.005, 0.995]).tolist()
+
+    # not stored exactly, so read from the sketch
+    lower, upper = baseline.percentile_bounds(2.0, 98.0)
+    assert lower[bmi] == pytest.approx(np.quantile(df["bmi"], 0.02), rel=0.05)
+
+
+def test_compiled_baseline_invalidation(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    get_compiled_baseline("insurance", 1)
+    assert len(baseline_cache) == 1
+
+    version_or_create_mate("insurance")
+    assert len(baseline_cache) == 0
+
+    assert get_compiled_baseline("insurance", 2).features == ()
+
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+    assert len(get_compiled_baseline("insurance", 2).features) == 6
+
+
+def test_check_plan(baseline_stats, df):
+    baseline = get_compiled_baseline("insurance", 1)
+    plan = baseline.check_plan()
+
+    assert plan.numeric_names == ("age", "bmi", "children")
+    assert plan.numeric_index.tolist() == [0, 2, 3]
+    assert plan.mean.tolist() == baseline.mean[[0, 2, 3]].tolist()
+    # sex has a missing value in the training data
+    assert plan.null_index.tolist() == [0, 2, 3, 4, 5]
+    assert plan.string_names == ("sex", "smoker", "region")
+    assert baseline.check_plan() is plan
+    assert baseline.check_plan((0.0, 100.0)) is not plan
+
+    frame = df.drop(["charges"], axis=1).iloc[[1, 2, 3]].reset_index(drop=True)
+    frame.loc[0, "age"] = 1000
+    frame.loc[1, "bmi"] = np.nan
+    frame.loc[2, "region"] = "mars"
+
+    failed = [
+        (baseline.names[check.feature_index], check.kind, check.mask.tolist())
+        for check in plan.run(frame)
+    ]
+    assert failed == [
+        ("age", "outlier", [True, False, False]),
+        ("age", "bound", [True, False, False]),
+        ("bmi", "null", [False, True, False]),
+        ("region", "unseen", [False, False, True]),
+    ]
+    assert plan.run(frame.iloc[[]]) == []
+
+
+def test_robust_check_plan(baseline_stats, df):
+    baseline = get_compiled_baseline("insurance", 1)
+    bmi = baseline.index["bmi"]
+
+    assert baseline.median[bmi] == df["bmi"].median()
+    assert baseline.mad[bmi] == pytest.approx(4.18)
+    assert (baseline.q1[bmi], baseline.q3[bmi]) == tuple(
+        df["bmi"].quantile([0.25, 0.75])
+    )
+    assert np.isnan(baseline.median[baseline.index["sex"]])
+    assert baseline.thresholds == (None,) * 6
+
+    frame = df.drop(["charges"], axis=1).iloc[[1, 2]].reset_index(drop=True)
+    frame.loc[0, "bmi"] = 50.0
+
+    def failed(plan):
+        return [
+            (baseline.names[check.feature_index], check.kind)
+            for check in plan.run(frame)
+        ]
+
+    assert failed(baseline.check_plan()) == []
+    assert failed(baseline.check_plan(thresholds=CheckThresholds(iqr=1.5))) == [
+        ("bmi", "iqr")
+    ]
+
+    set_feature_thresholds(
+        "insurance", 1, {"bmi": CheckThresholds(z_score=None, robust_z_score=3.0)}
+    )
+    baseline = get_compiled_baseline("insurance", 1)
+    assert baseline.thresholds[bmi] == CheckThresholds(None, 3.0, None)
+    assert failed(baseline.check_plan(thresholds=CheckThresholds(iqr=1.5))) == [
+        ("bmi", "robust_outlier")
+    ]
+
+    with pytest.raises(ValueError):
+        set_feature_thresholds("insurance", 1, {"weight": CheckThresholds()})
+    with pytest.raises(ValueError):
+        set_feature_thresholds("insurance", 2, {"bmi": CheckThresholds()})
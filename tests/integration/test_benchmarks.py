@@ -0,0 +1,17 @@
+import json
+
+from benchmarks.hotpath import main
+
+
+def test_hotpath_benchmarks(tmp_path):
+    output = tmp_path / "results.json"
+    assert main(["--quick", "--output", str(output)]) == 0
+
+    results = json.loads(output.read_text())["benchmarks"]
+    assert (
+        "running_mate_init[backend=disk,features=6,rows=100,save_all=True]" in results
+    )
+    assert "generate_baseline_stats[features=6,rows=1000]" in results
+
+    # an unchanged run is not a regression at any sensible threshold
+    assert main(["--quick", "--baseline", str(output), "--threshold", "100"]) == 0
@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mate.backends import SqliteBackend
+from mate.db import Inference, connect_db, db, version_or_create_mate
+from mate.generators import generate_baseline_stats
+from mate.recorder import BackgroundRecorder
+from mate.run import RunningMate
+
+
+@pytest.fixture(scope="function", params=[None, 4], ids=["per-thread", "pooled"])
+def disk_baseline_stats(request, df, tmp_path):
+    connect_db(SqliteBackend(tmp_path / "mate.db", max_connections=request.param))
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+
+    yield
+
+    db.close()
+
+
+def test_concurrent_running_mates(disk_baseline_stats, df):
+    def infer(row: int):
+        with RunningMate(
+            "insurance", 1, df.iloc[[row]], [], should_save_all_feature_values=True
+        ):
+            pass
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(infer, range(80)))
+
+    assert Inference.select().count() == 80
+    assert Inference.select().where(Inference.runtime.is_null()).count() == 0
+
+    if hasattr(db.obj, "_in_use"):
+        # only the main thread's connection is still checked out
+        assert len(db.obj._in_use) == 1
+
+
+def test_failed_running_mate_releases_connection(df, tmp_path):
+    connect_db(SqliteBackend(tmp_path / "mate.db", max_connections=2, pool_timeout=1))
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+
+    def infer(frame):
+        try:
+            with RunningMate("insurance", 1, frame, []):
+                pass
+        except KeyError:
+            return "failed"
+        return "ok"
+
+    # each call runs on a new thread, which checks out its own connection;
+    # the main thread holds the pool's other one
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(infer, df.drop(["age"], axis=1)).result() == "failed"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(infer, df.drop(["age"], axis=1)).result() == "failed"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(infer, df.iloc[[0]]).result() == "ok"
+
+    assert len(db.obj._in_use) == 1
+    db.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_fork_safety(disk_baseline_stats, df):
+    recorder = BackgroundRecorder(flush_interval=60)
+    # the parent has an open connection and a running writer thread
+    assert Inference.select().count() == 0
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            with RunningMate("insurance", 1, df.iloc[[1]], []):
+                pass
+            with RunningMate("insurance", 1, df.iloc[[2]], [], recorder=recorder):
+                pass
+            if recorder.flush(timeout=5) and recorder.written_count == 1:
+                status = 0
+        finally:
+            os._exit(status)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    assert Inference.select().count() == 2
+    recorder.shutdown()
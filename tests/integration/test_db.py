@@ -0,0 +1,186 @@
+import datetime
+
+import numpy as np
+import pandas as pd  # type: ignore
+import pytest
+
+from mate.alerts import Alert, TerminalAlertTarget
+from mate.archive import archive_inferences
+from mate.db import (
+    Feature,
+    FeatureAlert,
+    FeatureValue,
+    FeatureValueFilter,
+    Mate,
+    connect_db,
+    db,
+    get_feature_value_array,
+    get_feature_values,
+    get_mate,
+    iter_feature_values,
+    iter_feature_values_keyset,
+)
+from mate.run import RunningMate
+
+
+def test_connect_db_creates_indexes(monkeypatch):
+    monkeypatch.setenv("TESTING", "1")
+    connect_db()
+
+    index_columns = {
+        (index.table, tuple(index.columns))
+        for table in db.get_tables()
+        for index in db.get_indexes(table)
+    }
+
+    assert ("mate", ("name", "version")) in index_columns
+    assert ("feature", ("mate_id", "name")) in index_columns
+    assert ("feature_value", ("feature_id", "created_at")) in index_columns
+    assert ("feature_alert", ("inference_id",)) in index_columns
+
+
+def test_connect_db_migrates_existing_database(monkeypatch, tmp_path):
+    monkeypatch.setenv("TESTING", "0")
+    monkeypatch.chdir(tmp_path)
+
+    connect_db()
+    db.execute_sql('DROP INDEX "mate_name_version"')
+    db.execute_sql('ALTER TABLE "string_stats" DROP COLUMN "top_k"')
+    Mate.create(name="insurance", version=1)
+    db.close()
+
+    connect_db()
+
+    assert "mate_name_version" in [index.name for index in db.get_indexes("mate")]
+    assert "top_k" in [column.name for column in db.get_columns("string_stats")]
+    assert Mate.select().count() == 1
+    assert db.execute_sql("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute_sql("PRAGMA synchronous").fetchone()[0] == 1
+    db.close()
+
+
+def test_typed_feature_values(baseline_stats):
+    df = pd.DataFrame(
+        {
+            "age": [19, 30],
+            "sex": ["female", None],
+            "bmi": [27.9, np.nan],
+            "children": [0, 1],
+            "smoker": ["yes", "no"],
+            "region": ["southwest", "northwest"],
+        }
+    )
+    RunningMate("insurance", 1, df, [], should_save_all_feature_values=True)
+
+    mate = get_mate("insurance", 1)
+    age = FeatureValue.select().join(Feature).where(Feature.name == "age").first()
+    assert (age.value, age.value_int, age.value_real) == (None, 19, None)
+    assert age.typed_value == 19
+
+    # a row written as text by an older version
+    FeatureValue.create(value="42.5", feature=age.feature, inference=age.inference)
+
+    assert get_feature_value_array(mate, "age").tolist() == [19.0, 30.0, 42.5]
+    bmi = get_feature_value_array(mate, "bmi")
+    assert bmi[0] == 27.9 and np.isnan(bmi[1])
+    assert get_feature_value_array(mate, "sex").tolist() == ["female", None]
+
+
+def test_stored_alert_shows_typed_value(baseline_stats, df):
+    alert_df = df.iloc[[0]].copy()
+    alert_df["age"] = 1000
+    RunningMate("insurance", 1, alert_df, [])
+
+    feature_alert = FeatureAlert.select().where(FeatureAlert.name == "age").get()
+    assert feature_alert.feature_value.value is None
+
+    message = TerminalAlertTarget()._format_alert(
+        Alert("insurance", [feature_alert], None)
+    )
+    assert "Feature Value: 1000\n" in message
+
+
+def test_iter_feature_values(baseline_stats, df):
+    for row in range(4):
+        RunningMate(
+            "insurance", 1, df.iloc[[row]], [], should_save_all_feature_values=True
+        )
+    mate = get_mate("insurance", 1)
+
+    chunks = list(iter_feature_values(mate, chunk_size=5))
+    assert [len(chunk) for chunk in chunks] == [5, 5, 5, 5, 4]
+    ids = np.concatenate([chunk.ids for chunk in chunks])
+    assert (np.diff(ids) > 0).all()
+
+    ages = list(
+        iter_feature_values(
+            mate,
+            FeatureValueFilter(
+                feature_name="age", min_inference_id=2, max_inference_id=4
+            ),
+        )
+    )
+    assert len(ages) == 1
+    assert ages[0].inference_ids.tolist() == [2, 3]
+    assert ages[0].numbers.tolist() == df["age"].iloc[1:3].astype(float).tolist()
+
+    smokers = next(iter_feature_values(mate, FeatureValueFilter(feature_name="smoker")))
+    assert smokers.texts.tolist() == df["smoker"].iloc[:4].tolist()
+    assert np.isnan(smokers.numbers).all()
+
+    future = datetime.datetime.now() + datetime.timedelta(days=1)
+    assert list(iter_feature_values(mate, FeatureValueFilter(start=future))) == []
+
+    keyset = list(iter_feature_values_keyset(mate, chunk_size=5))
+    assert [len(chunk) for chunk in keyset] == [5, 5, 5, 5, 4]
+    assert np.concatenate([chunk.ids for chunk in keyset]).tolist() == ids.tolist()
+
+
+def test_iter_feature_values_includes_archive(
+    baseline_stats, df, monkeypatch, tmp_path
+):
+    monkeypatch.setenv("MATE_ARCHIVE_PATH", str(tmp_path))
+    for row in range(2):
+        RunningMate(
+            "insurance", 1, df.iloc[[row + 1]], [], should_save_all_feature_values=True
+        )
+    archive_inferences(datetime.datetime.now(), format="npz")
+    RunningMate("insurance", 1, df.iloc[[3]], [], should_save_all_feature_values=True)
+    mate = get_mate("insurance", 1)
+
+    filters = FeatureValueFilter(feature_name="age")
+    for reader in (iter_feature_values, iter_feature_values_keyset):
+        ages = np.concatenate(
+            [chunk.numbers for chunk in reader(mate, filters, chunk_size=2)]
+        )
+        assert ages.tolist() == df["age"].iloc[1:4].astype(float).tolist()
+
+    hot = list(iter_feature_values(mate, filters, include_archive=False))
+    assert len(hot) == 1 and len(hot[0]) == 1
+
+
+def test_iter_feature_values_skips_rows_still_in_database(
+    baseline_stats, df, monkeypatch, tmp_path
+):
+    monkeypatch.setenv("MATE_ARCHIVE_PATH", str(tmp_path))
+    for row in range(3):
+        RunningMate(
+            "insurance", 1, df.iloc[[row]], [], should_save_all_feature_values=True
+        )
+
+    def fail_deletes():
+        raise RuntimeError("database is locked")
+
+    # the files are written, but the rows are not deleted
+    monkeypatch.setattr("mate.archive.write_transaction", fail_deletes)
+    with pytest.raises(RuntimeError):
+        archive_inferences(datetime.datetime.now(), format="npz")
+    mate = get_mate("insurance", 1)
+
+    filters = FeatureValueFilter(feature_name="age")
+    for reader in (iter_feature_values, iter_feature_values_keyset):
+        ids = np.concatenate([chunk.ids for chunk in reader(mate, filters)])
+        assert len(ids) == len(set(ids)) == 3
+
+    assert len(get_feature_values(mate, include_archive=True)) == 3 * 6
+    assert len(get_feature_value_array(mate, "age")) == 3
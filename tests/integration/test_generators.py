@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 from mate.db import (
     Feature,
     Mate,
@@ -8,7 +10,9 @@ from mate.db import (
     connect_db,
     version_or_create_mate,
 )
-from mate.generators import generate_baseline_stats
+from mate.generators import generate_baseline_stats, generate_baseline_stats_streaming
+
+from .conftest import BASE
 
 
 def test_generate_baseline_stats(df):
@@ -39,3 +43,32 @@ def test_generate_baseline_stats(df):
     assert Feature.select().count() == 12
     assert NumericalStats.select().count() == 6
     assert StringStats.select().count() == 6
+
+
+def test_generate_baseline_stats_streaming(df):
+    os.environ["TESTING"] = "1"
+    connect_db()
+
+    version_or_create_mate("insurance")
+    generate_baseline_stats_streaming(
+        BASE.joinpath("data/insurance.csv"),
+        "insurance",
+        chunksize=250,
+        columns=["age", "sex", "bmi", "children", "smoker", "region"],
+    )
+
+    assert Mate.get().item_count == 1338
+    assert Feature.select().count() == 6
+    assert NumericalStats.select().count() == 3
+    assert StringStats.select().count() == 3
+    assert NumericalStats.select().join(Feature).where(
+        Feature.name == "age"
+    ).get().mean == pytest.approx(df["age"].mean())
+
+    # robust statistics come from the quantile sketch
+    bmi = NumericalStats.select().join(Feature).where(Feature.name == "bmi").get()
+    assert bmi.median == pytest.approx(df["bmi"].median(), abs=0.1)
+    assert bmi.mad == pytest.approx(
+        (df["bmi"] - df["bmi"].median()).abs().median(), abs=0.1
+    )
+    assert bmi.q1 == pytest.approx(df["bmi"].quantile(0.25), abs=0.1)
@@ -0,0 +1,72 @@
+import pathlib
+
+import pandas as pd  # type: ignore
+import pytest
+
+from mate.db import FeatureAlert, Inference, version_or_create_mate
+from mate.generators import generate_baseline_stats
+from mate.monitor import MateMonitor
+
+BASE = pathlib.Path(__file__).parent.parent.absolute()
+
+
+@pytest.fixture(scope="module")
+def infer_df():
+    return pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+
+
+def test_mate_monitor_observe(baseline_stats, infer_df, monkeypatch):
+    monitor = MateMonitor("insurance", percentile_bounds=(0.5, 99.5))
+    assert monitor.mate_version == 1
+
+    # nothing is looked up per call
+    monkeypatch.setattr("mate.run.get_compiled_baseline", None)
+
+    with monitor.observe(infer_df):
+        pass
+    df = infer_df.copy()
+    df["age"] = -1
+    with monitor.observe(df):
+        pass
+
+    assert Inference.select().count() == 2
+    assert FeatureAlert.select().where(FeatureAlert.kind == "bound").count() == len(df)
+
+
+def test_mate_monitor_decorator(baseline_stats, infer_df):
+    monitor = MateMonitor("insurance", 1)
+
+    class Model:
+        @monitor
+        def predict(self, df, scale=1):
+            return [scale] * len(df)
+
+    assert Model().predict(infer_df, scale=2) == [2] * len(infer_df)
+    assert Inference.select().count() == 1
+
+    with pytest.raises(TypeError):
+        Model().predict([1, 2])
+
+
+def test_mate_monitor_validation(baseline_stats, df):
+    with pytest.raises(ValueError, match="not found"):
+        MateMonitor("missing")
+    with pytest.raises(ValueError, match="not found"):
+        MateMonitor("insurance", 2)
+
+    version_or_create_mate("insurance")
+    with pytest.raises(ValueError, match="no baseline stats"):
+        MateMonitor("insurance")
+
+
+def test_mate_monitor_refresh(baseline_stats, df):
+    monitor = MateMonitor("insurance")
+    pinned = MateMonitor("insurance", 1)
+
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+    monitor.refresh()
+    pinned.refresh()
+
+    assert monitor.mate_version == 2
+    assert pinned.mate_version == 1
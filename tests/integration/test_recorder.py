@@ -0,0 +1,101 @@
+import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd  # type: ignore
+
+from mate.db import FeatureAlert, FeatureValue, Inference
+from mate.recorder import BackgroundRecorder
+from mate.run import RunningMate
+
+BASE = pathlib.Path(__file__).parent.parent.absolute()
+
+
+def test_background_recorder(baseline_stats):
+    recorder = BackgroundRecorder(flush_interval=60)
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    df["age"] = -1
+
+    for _ in range(5):
+        with RunningMate(
+            "insurance",
+            1,
+            df,
+            [],
+            should_save_all_feature_values=True,
+            recorder=recorder,
+        ):
+            pass
+
+    assert Inference.select().count() == 0
+
+    assert recorder.flush(timeout=5)
+    assert recorder.written_count == 5
+    assert Inference.select().count() == 5
+    assert Inference.select().where(Inference.runtime.is_null()).count() == 0
+    assert FeatureValue.select().count() == 5 * 6
+    assert FeatureAlert.select().count() == 5
+
+    recorder.shutdown(timeout=5)
+    assert not recorder.submit(RunningMate("insurance", 1, df, []).record)
+
+
+def test_background_recorder_drop(baseline_stats):
+    recorder = BackgroundRecorder(
+        max_queue_size=1, max_batch_size=1, backpressure="drop"
+    )
+
+    # stall the writer thread on its first write so the queue stays full
+    release = threading.Event()
+    write = recorder._write
+    recorder._write = lambda records: (release.wait(5), write(records))
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    record = RunningMate("insurance", 1, df, [], recorder=recorder).record
+
+    assert recorder.submit(record)
+    while recorder.queue_depth:
+        time.sleep(0.01)
+
+    assert recorder.submit(record)
+    assert not recorder.submit(record)
+    assert not recorder.submit(record)
+    assert recorder.dropped_count == 2
+
+    release.set()
+    recorder.shutdown(timeout=5)
+    assert recorder.written_count == 2
+
+
+def test_background_recorder_shutdown_while_blocked(baseline_stats):
+    recorder = BackgroundRecorder(max_queue_size=1, max_batch_size=1)
+
+    release = threading.Event()
+    write = recorder._write
+    recorder._write = lambda records: (release.wait(5), write(records))
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    record = RunningMate("insurance", 1, df, [], recorder=recorder).record
+
+    assert recorder.submit(record)
+    while recorder.queue_depth:
+        time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # one record fills the queue, the others wait for room
+        submitted = [executor.submit(recorder.submit, record) for _ in range(4)]
+        time.sleep(0.1)
+
+        shutdown = threading.Thread(target=recorder.shutdown, args=(5,))
+        shutdown.start()
+        # the waiting submitters give up instead of queueing behind _STOP
+        accepted = sum(future.result(timeout=5) for future in submitted)
+
+        release.set()
+        shutdown.join(5)
+
+    assert accepted == 1
+    assert recorder.dropped_count == 3
+    assert recorder.written_count == 2
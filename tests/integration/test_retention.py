@@ -0,0 +1,96 @@
+import datetime
+import os
+
+from peewee import SqliteDatabase  # type: ignore
+
+from mate.cache import baseline_cache
+from mate.db import (
+    MODELS,
+    SQLITE_PRAGMAS,
+    FeatureAlert,
+    FeatureValue,
+    Inference,
+    db,
+    version_or_create_mate,
+)
+from mate.generators import generate_baseline_stats
+from mate.retention import RetentionPolicy, apply_retention, apply_retention_policies
+from mate.run import RunningMate
+
+
+def record(df, rows=20):
+    X = df.drop(["charges"], axis=1).head(rows).copy()
+    X.loc[2, "age"] = -1  # one bound alert, on inference 3
+
+    return RunningMate(
+        "insurance",
+        1,
+        X,
+        [],
+        should_save_all_feature_values=True,
+        inference_per_row=True,
+    )
+
+
+def test_retention_ttl(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    record(df)
+    Inference.update(
+        created_at=datetime.datetime.now() - datetime.timedelta(days=10)
+    ).where(Inference.id <= 10).execute()
+
+    result = apply_retention(
+        "insurance", RetentionPolicy(ttl=datetime.timedelta(days=7)), batch_size=7
+    )
+
+    # the alerted inference and its alerted value are kept
+    assert (result.deleted_inferences, result.deleted_values) == (9, 10 * 6 - 1)
+    assert Inference.select().count() == 11
+    assert FeatureValue.select().count() == 10 * 6 + 1
+    assert FeatureAlert.select().count() == 1
+    assert FeatureAlert.get().feature_value.value_int == -1
+
+
+def test_retention_downsampling(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    record(df)
+
+    apply_retention_policies({"insurance": RetentionPolicy(keep_every=2)})
+    assert FeatureValue.select(FeatureValue.inference).distinct().count() == 11
+    assert Inference.select().count() == 20
+
+    # a second run doesn't thin the same rows again
+    assert (
+        apply_retention("insurance", RetentionPolicy(keep_every=2)).deleted_values == 0
+    )
+
+    apply_retention("insurance", RetentionPolicy(reservoir_size=5))
+    kept = {value.inference_id for value in FeatureValue.select()}
+    assert 3 in kept  # alerted value
+    assert len(kept - {3}) in (4, 5)
+    assert FeatureAlert.select().count() == 1
+
+
+def test_retention_incremental_vacuum(monkeypatch, tmp_path, df):
+    monkeypatch.setenv("TESTING", "1")
+    db.initialize(SqliteDatabase(tmp_path / "mate.db", pragmas=SQLITE_PRAGMAS))
+    baseline_cache.clear()
+    db.create_tables(MODELS)
+
+    version_or_create_mate("insurance")
+    generate_baseline_stats(df.drop(["charges"], axis=1), "insurance")
+    record(df, rows=1000)
+
+    def page_count():
+        return db.execute_sql("PRAGMA page_count").fetchone()[0]
+
+    assert db.execute_sql("PRAGMA auto_vacuum").fetchone()[0] == 2
+    pages = page_count()
+
+    apply_retention("insurance", RetentionPolicy(reservoir_size=10))
+
+    assert page_count() < pages
+    assert db.execute_sql("PRAGMA freelist_count").fetchone()[0] == 0
+    db.close()
@@ -1,10 +1,24 @@
 import os
 import pathlib
 
+import numpy as np
 import pandas as pd  # type: ignore
+import pytest
 
-from mate.db import FeatureAlert, Inference, Mate
+from mate.checks import CheckThresholds
+from mate.db import (
+    FeatureAlert,
+    FeatureValue,
+    FeatureValueFilter,
+    Inference,
+    Mate,
+    iter_feature_values,
+    set_feature_thresholds,
+)
+from mate.drift import DriftMonitor
+from mate.metrics import MetricsRegistry, set_metrics_sink
 from mate.run import RunningMate
+from mate.sampling import SamplingPolicy
 from mate.stats import CustomStats
 
 BASE = pathlib.Path(__file__).parent.parent.absolute()
@@ -64,3 +78,187 @@ def test_running_mate_with_custom_stat(baseline_stats):
     assert test_mate.mate_name == "insurance"
     assert FeatureAlert.select().count() == 2
     assert FeatureAlert.select().where(FeatureAlert.kind == "drift").count() == 1
+
+
+def test_custom_stat_alerts_once_per_inference(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance.csv"), sep=",").head(5)
+    df = df.drop(["charges"], axis=1)
+    custom_stats = [CustomStats("shift", "age")]
+
+    alerts = RunningMate("insurance", 1, df, [], custom_stats=custom_stats)
+    assert len(alerts.feature_alerts) == 1
+    assert FeatureAlert.select().where(FeatureAlert.kind == "shift").count() == 1
+
+    per_row = RunningMate(
+        "insurance", 1, df, [], custom_stats=custom_stats, inference_per_row=True
+    )
+    assert len(per_row.feature_alerts) == 5
+    assert FeatureAlert.select().where(FeatureAlert.kind == "shift").count() == 6
+
+
+def test_running_mate_batch(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance.csv"), sep=",").head(50)
+    df = df.drop(["charges"], axis=1)
+    df.loc[[3, 7], "age"] = -1
+    df.loc[5, "bmi"] = 500.0
+
+    test_mate = RunningMate("insurance", 1, df, [], should_save_all_feature_values=True)
+
+    assert Inference.select().count() == 1
+    assert FeatureValue.select().count() == 50 * 6
+    # two bound alerts for age, one outlier and one bound alert for bmi
+    assert len(test_mate.feature_alerts) == 4
+    assert {alert.kind for alert in test_mate.feature_alerts} == {"bound", "outlier"}
+
+    # alerts reuse the saved feature values instead of inserting new ones
+    for feature_alert in test_mate.feature_alerts:
+        saved = FeatureValue.get_by_id(feature_alert.feature_value.id)
+        assert saved.typed_value == feature_alert.feature_value.value
+        assert FeatureAlert.get_by_id(feature_alert.id).feature_value_id == saved.id
+
+
+def test_running_mate_inference_per_row(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance.csv"), sep=",").head(20)
+    df = df.drop(["charges"], axis=1)
+    df.loc[4, "age"] = -1
+
+    test_mate = RunningMate("insurance", 1, df, [], inference_per_row=True)
+
+    with test_mate:
+        pass
+
+    assert Inference.select().count() == 20
+    assert Inference.select().where(Inference.runtime.is_null()).count() == 0
+    assert len(test_mate.feature_alerts) == 1
+    assert test_mate.feature_alerts[0].inference.id == test_mate.record.inference_ids[4]
+
+
+def test_running_mate_unseen_category(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    df["region"] = "antarctica"
+
+    test_mate = RunningMate("insurance", 1, df, [])
+
+    assert [alert.kind for alert in test_mate.feature_alerts] == ["unseen"]
+    assert FeatureAlert.select().where(FeatureAlert.kind == "unseen").count() == 1
+
+
+def test_running_mate_percentile_bounds(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    df["bmi"] = 50.0  # inside the bounds, above the 99.5th percentile
+
+    test_mate = RunningMate("insurance", 1, df, [], percentile_bounds=(0.5, 99.5))
+
+    assert [alert.kind for alert in test_mate.feature_alerts] == ["percentile"]
+    assert test_mate.feature_alerts[0].name == "bmi"
+
+
+def test_running_mate_thresholds(baseline_stats):
+    os.environ["TESTING"] = "1"
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    df["bmi"] = 50.0  # inside the bounds and 4 standard deviations
+    thresholds = CheckThresholds(iqr=1.5)
+
+    test_mate = RunningMate("insurance", 1, df, [], thresholds=thresholds)
+    assert [alert.kind for alert in test_mate.feature_alerts] == ["iqr"]
+
+    set_feature_thresholds("insurance", 1, {"bmi": CheckThresholds(robust_z_score=3.0)})
+
+    test_mate = RunningMate("insurance", 1, df, [], thresholds=thresholds)
+    assert [alert.kind for alert in test_mate.feature_alerts] == ["robust_outlier"]
+
+
+def test_running_mate_drift(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    X = df.drop(["charges"], axis=1).sample(100, random_state=0)
+    X["age"] = 90  # above the max, so every row is also a bound alert
+    drift = DriftMonitor(window_size=100, check_every=5, min_samples=20)
+
+    for batch in np.array_split(X.iloc[:80], 4):
+        with RunningMate("insurance", 1, batch, [], drift=drift):
+            pass
+
+    test_mate = RunningMate("insurance", 1, X.iloc[80:], [], drift=drift)
+
+    assert [result.feature_name for result in test_mate.drift_results] == ["age"]
+    assert test_mate.drift_results[0].ks == pytest.approx(1.0)
+    assert test_mate.drift_results[0].window_size == 100
+    assert [alert.kind for alert in test_mate.feature_alerts].count("drift") == 1
+    assert FeatureAlert.select().where(FeatureAlert.kind == "drift").count() == 1
+
+
+def test_running_mate_sampling(baseline_stats, df):
+    os.environ["TESTING"] = "1"
+
+    X = df.drop(["charges"], axis=1).head(200).copy()
+    X.loc[140, "age"] = -1  # not drawn for any feature
+    keys = [f"request-{i}" for i in range(len(X))]
+    sampling = SamplingPolicy(rate=0.1, feature_rates={"age": 0.5})
+
+    test_mate = RunningMate("insurance", 1, X, [], sampling=sampling, request_key=keys)
+
+    draws = sampling.draw(len(X), keys)
+    rows = set(np.flatnonzero(draws < 0.1)) | {140}
+    age_rows = set(np.flatnonzero(draws < 0.5)) | {140}
+    assert len(test_mate.record.feature_values) == 5 * len(rows) + len(age_rows)
+
+    # every feature of the alerted row is recorded, and the alert reuses it
+    alert = test_mate.feature_alerts[0]
+    assert FeatureValue.get_by_id(alert.feature_value.id).value_int == -1
+    assert FeatureValue.select().count() == len(test_mate.record.feature_values)
+
+    # values recorded only because of the alert have no sample rate, so
+    # readers can leave them out of the sample
+    assert FeatureValue.select().where(
+        FeatureValue.sample_rate.is_null()
+    ).count() == len(X.columns)
+    chunk = next(iter_feature_values(Mate.get(), FeatureValueFilter("age")))
+    assert sorted(set(chunk.sample_rates[~np.isnan(chunk.sample_rates)])) == [0.5]
+    assert np.isnan(chunk.sample_rates).sum() == 1
+
+
+def test_running_mate_metrics(baseline_stats):
+    metrics = MetricsRegistry()
+    set_metrics_sink(metrics)
+
+    df = pd.read_csv(BASE.joinpath("data/insurance_infer.csv"), sep=",")
+    df["age"] = -1
+    try:
+        with RunningMate("insurance", 1, df, [], should_save_all_feature_values=True):
+            pass
+    finally:
+        set_metrics_sink(None)
+
+    for phase in ("baseline", "values", "checks", "save", "runtime"):
+        histogram = metrics.histogram(
+            "mate_phase_seconds", {"mate": "insurance", "phase": phase}
+        )
+        assert histogram.count == 1
+    # no drift monitor, no aggregates and no alert targets
+    assert (
+        metrics.histogram("mate_phase_seconds", {"mate": "insurance", "phase": "drift"})
+        is None
+    )
+    assert metrics.histogram("mate_inference_seconds", {"mate": "insurance"}).count == 1
+
+    bound_alerts = metrics.counter(
+        "mate_feature_alerts_total", {"mate": "insurance", "kind": "bound"}
+    )
+    assert bound_alerts == len(df)
+    assert metrics.counter("mate_db_rows_written_total", {"table": "inference"}) == 1
+    assert (
+        metrics.counter("mate_db_rows_written_total", {"table": "feature_value"})
+        == FeatureValue.select().count()
+    )
@@ -0,0 +1,42 @@
+from benchmarks.hotpath import BenchmarkResult, compare, make_frame
+
+
+def test_benchmark_result():
+    result = BenchmarkResult(
+        "init", {"rows": 10, "save_all": True}, [2.0, 1.0, 4.0], 10
+    )
+
+    assert result.key == "init[rows=10,save_all=True]"
+    assert result.to_dict()["median"] == 2.0
+    assert result.to_dict()["rows_per_second"] == 5.0
+
+
+def test_compare():
+    baseline = {"benchmarks": {"a": {"median": 1.0}, "b": {"median": 1.0}}}
+    current = {
+        "benchmarks": {
+            "a": {"median": 1.1},
+            "b": {"median": 1.5},
+            "new": {"median": 9.0},
+        }
+    }
+
+    regressions = compare(current, baseline, threshold=0.2)
+
+    assert [regression.key for regression in regressions] == ["b"]
+    assert regressions[0].ratio == 1.5
+
+
+def test_make_frame():
+    df = make_frame(rows=5, features=8)
+
+    assert df.shape == (5, 8)
+    assert list(df.columns[:7]) == [
+        "age",
+        "sex",
+        "bmi",
+        "children",
+        "smoker",
+        "region",
+        "age_6",
+    ]
@@ -1,6 +1,17 @@
+import numpy as np
 import pytest
 
-from mate.checks import is_out_of_bounds, is_outlier
+from mate.checks import (
+    CheckThresholds,
+    iqr_fences,
+    is_out_of_bounds,
+    is_outlier,
+    is_outside_iqr_fences,
+    is_outside_percentiles,
+    is_robust_outlier,
+    robust_z_score,
+)
+from mate.sketches import QuantileSketch
 
 
 @pytest.mark.parametrize(
@@ -26,3 +37,80 @@ def test_is_outlier(feature_value, mean, std_dev, expected):
 )
 def test_is_out_of_bounds(feature_value, lower_bound, upper_bound, expected):
     assert is_out_of_bounds(feature_value, lower_bound, upper_bound) == expected
+
+
+def test_checks_accept_arrays():
+    values = np.array([31.0, 96.0, -1.0, np.nan])
+
+    assert is_outlier(values, 39.20702541106129, 14.049960379216154).tolist() == [
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert is_out_of_bounds(values, 18.0, 64.0).tolist() == [False, True, True, False]
+
+
+def test_is_outside_percentiles():
+    sketch = QuantileSketch()
+    sketch.update(np.arange(1000, dtype=float))
+
+    assert is_outside_percentiles(
+        np.array([0.0, 500.0, 999.0]), sketch, 1.0, 99.0
+    ).tolist() == [True, False, True]
+
+
+def test_checks_broadcast_per_column():
+    values = np.array([[20.0, 1.0], [70.0, 9.0]])
+
+    assert is_out_of_bounds(
+        values, np.array([18.0, 0.0]), np.array([64.0, 5.0])
+    ).tolist() == [
+        [False, False],
+        [True, True],
+    ]
+    assert is_outlier(
+        values, np.array([20.0, 1.0]), np.array([1.0, 10.0])
+    ).tolist() == [
+        [False, False],
+        [True, False],
+    ]
+
+
+def test_robust_z_score():
+    values = np.array([30.4, 34.58, 50.0, 10.0])
+
+    assert robust_z_score(values, 30.4, 4.18) == pytest.approx(
+        [0.0, 0.6745, 3.1627, -3.2918], abs=1e-4
+    )
+    assert is_robust_outlier(values, 30.4, 4.18, 3.0).tolist() == [
+        False,
+        False,
+        True,
+        True,
+    ]
+    assert not is_robust_outlier(50.0, 30.4, 4.18)
+    # more than half of the baseline is a single value
+    assert not is_robust_outlier(values, 30.4, 0.0).any()
+
+
+def test_iqr_fences():
+    assert iqr_fences(26.0, 34.0) == (14.0, 46.0)
+    assert iqr_fences(26.0, 34.0, 3.0) == (2.0, 58.0)
+    assert np.isnan(iqr_fences(1.0, 1.0)).all()
+
+    values = np.array([[10.0, 1.0], [30.0, 2.0], [50.0, 5.0]])
+    assert is_outside_iqr_fences(
+        values, np.array([26.0, 0.0]), np.array([34.0, 0.0])
+    ).tolist() == [
+        [True, False],
+        [False, False],
+        [True, False],
+    ]
+
+
+def test_check_thresholds_json():
+    thresholds = CheckThresholds(z_score=None, robust_z_score=3.5, iqr=3.0)
+
+    assert CheckThresholds.from_json(thresholds.to_json()) == thresholds
+    assert CheckThresholds() == CheckThresholds(4.0, None, None)
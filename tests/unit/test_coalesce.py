@@ -0,0 +1,82 @@
+from mate.alerts import Alert, AlertWebhookTarget, TerminalAlertTarget
+from mate.coalesce import AlertCoalescer, RateLimitedAlertTarget, TokenBucket
+from mate.db import Feature, FeatureAlert, FeatureValue, Mate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingTarget(TerminalAlertTarget):
+    def __init__(self):
+        self.alerts = []
+
+    def send_alert(self, alert):
+        self.alerts.append(alert)
+        return True
+
+
+def make_alert(name, kind, value):
+    feature = Feature(name=name, mate=Mate(name="insurance", version=1))
+    feature_alert = FeatureAlert(
+        name=name, kind=kind, feature_value=FeatureValue(value=value), feature=feature
+    )
+    return Alert("insurance", [feature_alert], None)
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+    clock.now = 1.0
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_alert_coalescer():
+    clock = FakeClock()
+    target = RecordingTarget()
+    coalescer = AlertCoalescer([target], window_seconds=60, max_samples=2, clock=clock)
+
+    for value in range(1000):
+        coalescer.send_alert(make_alert("age", "bound", -value))
+    coalescer.send_alert(make_alert("bmi", "outlier", 500.0))
+
+    assert target.alerts == []
+
+    clock.now = 61.0
+    coalescer.send_alert(make_alert("age", "bound", -1))
+
+    assert len(target.alerts) == 1
+    summaries = {s.feature_name: s for s in target.alerts[0].summaries}
+    assert summaries["age"].count == 1000
+    assert summaries["age"].sample_values == ["0", "-1"]
+    assert summaries["bmi"].count == 1
+
+    formatted = AlertWebhookTarget("http://localhost/hook")._format_alert(
+        target.alerts[0]
+    )
+    assert formatted["mate_version"] == 1
+    assert formatted["features"][0]["count"] == 1000
+
+    coalescer.flush()
+    assert len(target.alerts) == 2
+    assert target.alerts[1].summaries[0].count == 1
+
+
+def test_rate_limited_alert_target():
+    clock = FakeClock()
+    target = RecordingTarget()
+    limited = RateLimitedAlertTarget(target, rate_per_minute=60, burst=1, clock=clock)
+
+    for _ in range(5):
+        limited.send_alert(make_alert("age", "bound", -1))
+
+    assert len(target.alerts) == 1
+    assert limited.suppressed_count == 4
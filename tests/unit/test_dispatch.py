@@ -0,0 +1,110 @@
+import json
+
+import pytest
+import requests  # type: ignore
+
+from mate.alerts import Alert, AlertTarget, AlertWebhookTarget
+from mate.db import Feature, FeatureAlert, FeatureValue, Mate
+from mate.dispatch import AlertDispatcher, DeadLetterStore
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ""
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, json, timeout):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FailingTarget(AlertTarget):
+    def _alert_webhook_url(self) -> str:
+        return ""
+
+    def _format_alert(self, alert):
+        return {"mate_name": alert.mate_name}
+
+    def send_alert(self, alert):
+        raise RuntimeError("unreachable")
+
+
+@pytest.fixture
+def alert():
+    feature = Feature(name="age", mate=Mate(name="insurance", version=1))
+    feature_alert = FeatureAlert(
+        name="age",
+        kind="bound",
+        feature_value=FeatureValue(value="-1"),
+        feature=feature,
+    )
+    return Alert("insurance", [feature_alert], None)
+
+
+def test_webhook_target_retries(alert):
+    target = AlertWebhookTarget(
+        "http://localhost/hook", max_retries=3, backoff_factor=0
+    )
+    target.session = FakeSession(
+        [requests.ConnectionError("refused"), FakeResponse(503), FakeResponse(200)]
+    )
+
+    assert target.send_alert(alert)
+    assert target.session.calls == 3
+
+
+def test_webhook_target_sends_inline_alerts_once(alert):
+    target = AlertWebhookTarget("http://localhost/hook")
+    target.session = FakeSession([FakeResponse(503), FakeResponse(200)])
+
+    assert not target.send_alert(alert)
+    assert target.session.calls == 1
+
+
+def test_webhook_target_does_not_retry_client_errors(alert):
+    target = AlertWebhookTarget(
+        "http://localhost/hook", max_retries=3, backoff_factor=0
+    )
+    target.session = FakeSession([FakeResponse(400), FakeResponse(200)])
+
+    assert not target.send_alert(alert)
+    assert target.session.calls == 1
+
+
+def test_alert_dispatcher_dead_letters(alert, tmp_path):
+    webhook = AlertWebhookTarget("http://localhost/hook")
+    # retried by the dispatcher, not by the target
+    webhook.session = FakeSession([FakeResponse(500), FakeResponse(500)])
+
+    dead_letters = DeadLetterStore(path=tmp_path / "dead.jsonl")
+    dispatcher = AlertDispatcher(
+        max_workers=2, dead_letters=dead_letters, max_retries=1, backoff_factor=0
+    )
+
+    futures = dispatcher.dispatch(alert, [webhook, FailingTarget()])
+    assert [future.result(timeout=5) for future in futures] == [False, False]
+    assert webhook.session.calls == 2
+    assert len(dead_letters) == 2
+
+    lines = (tmp_path / "dead.jsonl").read_text().splitlines()
+    assert {json.loads(line)["target"] for line in lines} == {
+        "AlertWebhookTarget",
+        "FailingTarget",
+    }
+
+    webhook.session = FakeSession([FakeResponse(200)])
+    dispatcher.retry_dead_letters()
+    dispatcher.flush(timeout=5)
+    dispatcher.shutdown()
+
+    assert len(dead_letters) == 1
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from mate.drift import (
+    _FeatureWindow,
+    jensen_shannon_divergence,
+    ks_statistic,
+    population_stability_index,
+)
+from mate.sketches import Histogram, QuantileSketch
+
+
+@pytest.fixture
+def sketch():
+    sketch = QuantileSketch()
+    sketch.update(np.random.default_rng(0).normal(size=10_000))
+    return sketch
+
+
+def test_metrics(sketch):
+    histogram = Histogram.from_sketch(sketch)
+    same = np.random.default_rng(1).normal(size=2000)
+    shifted = same + 1.0
+
+    def counts(values):
+        window = _FeatureWindow(len(values), histogram, sketch)
+        window.add(values)
+        return window.counts.astype(float)
+
+    assert population_stability_index(histogram.counts, counts(same)) < 0.05
+    assert population_stability_index(histogram.counts, counts(shifted)) > 0.5
+    assert jensen_shannon_divergence(histogram.counts, counts(same)) < 0.01
+    assert jensen_shannon_divergence(histogram.counts, counts(shifted)) > 0.1
+    assert ks_statistic(sketch, same) < 0.05
+    assert ks_statistic(sketch, shifted) > 0.3
+    # ties: every value at the median is far from the baseline CDF
+    assert ks_statistic(sketch, np.zeros(100)) == pytest.approx(0.5, abs=0.02)
+
+
+def test_feature_window_evicts_oldest(sketch):
+    histogram = Histogram(np.array([0.0, 1.0, 2.0, 3.0]), np.ones(3))
+    window = _FeatureWindow(4, histogram, sketch)
+
+    window.add(np.array([-5.0, 0.5, 1.5]))
+    window.add(np.array([2.5, 9.0]))
+
+    assert len(window) == 4
+    assert sorted(window.window().tolist()) == [0.5, 1.5, 2.5, 9.0]
+    assert window.counts.tolist() == [1, 1, 2]
@@ -1,3 +1,6 @@
+import numpy as np
+import pytest
+
 from mate import generators
 from mate.stats import FeatureStatistics, FeatureType
 
@@ -21,3 +24,40 @@ def test_infer_feature_type(df):
     for name, feature_series in df.iteritems():
         feature_type = generators._infer_feature_type(feature_series)
         assert feature_type == mapping[name]
+
+
+def test_gen_statistics_from_chunks(df):
+    df = df.copy()
+    df.loc[::7, "bmi"] = None  # missing values in some chunks only
+
+    expected = generators._gen_statistics(df)
+    chunks = np.array_split(df, 14)
+    statistics = generators._gen_statistics_from_chunks(chunks)
+
+    assert statistics.item_count == expected.item_count
+    assert len(statistics.features) == len(expected.features)
+
+    for feature, expected_feature in zip(statistics.features, expected.features):
+        assert feature.name == expected_feature.name
+        assert feature.inferred_type == expected_feature.inferred_type
+
+        if expected_feature.numerical_statistics:
+            stats = feature.numerical_statistics
+            expected_stats = expected_feature.numerical_statistics
+            assert stats.common == expected_stats.common
+            assert stats.mean == pytest.approx(expected_stats.mean)
+            assert stats.std_dev == pytest.approx(expected_stats.std_dev)
+            assert stats.sum == pytest.approx(expected_stats.sum)
+            assert stats.min == expected_stats.min
+            assert stats.max == expected_stats.max
+
+        if expected_feature.string_statistics:
+            assert feature.string_statistics == expected_feature.string_statistics
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_gen_statistics_parallel(df, executor):
+    expected = generators._gen_statistics(df)
+    statistics = generators._gen_statistics(df, workers=4, executor=executor)
+
+    assert statistics == expected
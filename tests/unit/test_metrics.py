@@ -0,0 +1,65 @@
+import socket
+import urllib.request
+
+from mate.metrics import MetricsRegistry, PrometheusMetrics, StatsdMetrics
+
+
+def test_metrics_registry():
+    registry = MetricsRegistry(buckets=(0.001, 0.01))
+
+    for value in (0.0005, 0.001, 0.005, 0.5):
+        registry.observe("latency", value, {"phase": "checks"})
+    registry.increment("alerts", tags={"kind": "bound"})
+    registry.increment("alerts", 2, tags={"kind": "bound"})
+    registry.gauge("depth", 3)
+
+    histogram = registry.histogram("latency", {"phase": "checks"})
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4 and histogram.sum == 0.5065
+    assert registry.histogram("latency", {"phase": "save"}) is None
+    assert registry.counter("alerts", {"kind": "bound"}) == 3
+    assert registry.counter("alerts", {"kind": "null"}) == 0
+    assert registry.get_gauge("depth") == 3
+
+
+def test_prometheus_exposition():
+    metrics = PrometheusMetrics(buckets=(0.01,))
+    metrics.observe("mate_phase_seconds", 0.002, {"mate": "m", "phase": "checks"})
+    metrics.observe("mate_phase_seconds", 0.2, {"mate": "m", "phase": "checks"})
+    metrics.increment("mate_feature_alerts_total", tags={"kind": 'a"b'})
+
+    assert metrics.exposition().splitlines() == [
+        "# TYPE mate_phase_seconds histogram",
+        'mate_phase_seconds_bucket{mate="m",phase="checks",le="0.01"} 1',
+        'mate_phase_seconds_bucket{mate="m",phase="checks",le="+Inf"} 2',
+        'mate_phase_seconds_sum{mate="m",phase="checks"} 0.202',
+        'mate_phase_seconds_count{mate="m",phase="checks"} 2',
+        "# TYPE mate_feature_alerts_total counter",
+        'mate_feature_alerts_total{kind="a\\"b"} 1',
+    ]
+
+    port = metrics.serve(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.read().decode() == metrics.exposition()
+    finally:
+        metrics.shutdown()
+
+
+def test_statsd_metrics():
+    # a local UDP socket stands in for the StatsD agent
+    agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    agent.bind(("127.0.0.1", 0))
+    agent.settimeout(5)
+
+    metrics = StatsdMetrics(port=agent.getsockname()[1], prefix="svc.")
+    metrics.observe("mate_phase_seconds", 0.0015, {"phase": "checks"})
+    metrics.increment("mate_feature_alerts_total", tags={"kind": "bound"})
+    metrics.gauge("mate_queue_depth", 7)
+
+    assert [agent.recv(1024).decode() for _ in range(3)] == [
+        "svc.mate_phase_seconds:1.5000|ms|#phase:checks",
+        "svc.mate_feature_alerts_total:1|c|#kind:bound",
+        "svc.mate_queue_depth:7|g",
+    ]
+    agent.close()
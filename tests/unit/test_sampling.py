@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from mate.sampling import SamplingPolicy
+
+
+def test_sampling_rates():
+    policy = SamplingPolicy(rate=0.1, feature_rates={"age": 0.5}, seed=0)
+    draws = policy.draw(100_000)
+
+    age = policy.sample("age", draws)
+    bmi = policy.sample("bmi", draws)
+
+    assert age.mean() == pytest.approx(0.5, abs=0.01)
+    assert bmi.mean() == pytest.approx(0.1, abs=0.01)
+    # rows kept for a lower rate are a subset of those kept for a higher one
+    assert not (bmi & ~age).any()
+
+
+def test_sampling_by_request_key():
+    keys = [f"request-{i}" for i in range(10_000)]
+
+    draws = SamplingPolicy().draw(len(keys), keys)
+
+    assert np.array_equal(draws, SamplingPolicy(seed=1).draw(len(keys), keys))
+    assert (draws >= 0).all() and (draws < 1).all()
+    assert (draws < 0.25).mean() == pytest.approx(0.25, abs=0.02)
+    assert SamplingPolicy().draw(3, "request-5").tolist() == [draws[5]] * 3
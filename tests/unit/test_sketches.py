@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd  # type: ignore
+import pytest
+
+from mate.generators import BASELINE_SKETCH_K
+from mate.sketches import Histogram, HyperLogLog, QuantileSketch, TopK
+
+
+@pytest.mark.parametrize("n", [1, 100, 10_000, 200_000])
+def test_hyperloglog_count(n):
+    sketch = HyperLogLog()
+    sketch.update(pd.Series(np.arange(n)).astype(str))
+
+    assert sketch.count() == pytest.approx(n, rel=0.05)
+
+
+def test_hyperloglog_merge_and_serialize():
+    a, b, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    values = pd.Series(np.arange(5000)).astype(str)
+
+    a.update(values[:3000])
+    b.update(values[2000:])
+    both.update(values)
+    a.merge(b)
+
+    assert a == both
+    assert HyperLogLog.from_bytes(a.to_bytes()) == a
+
+
+def test_top_k():
+    top_k = TopK(capacity=3)
+    top_k.update(pd.Series(["a", "a", "a", "b", "b", None]))
+
+    assert top_k.complete
+    assert top_k.categories() == {"a", "b"}
+
+    top_k.update(pd.Series(["c", "d", "d", "a"]))
+
+    assert not top_k.complete
+    assert top_k.categories() is None
+    assert top_k.most_common(1) == [("a", 4)]
+    assert TopK.from_bytes(top_k.to_bytes()) == top_k
+
+
+def test_top_k_counts_are_upper_bounds():
+    top_k = TopK(capacity=3)
+    top_k.update(pd.Series(list("aaaaabbbbcccdd")))
+    assert top_k.min_count == 3
+
+    # "d" was evicted with 2, so it restarts from the smallest count
+    top_k.update(pd.Series(["d"] * 10))
+    assert top_k.counts["d"] == 13 and top_k.errors["d"] == 3
+    assert top_k.counts["d"] - top_k.errors["d"] <= 12 <= top_k.counts["d"]
+
+    other = TopK(capacity=3)
+    other.update(pd.Series(list("eeeeeeeeb")))
+    top_k.merge(other)
+
+    # true counts: d 12, e 8, a 5, b 5, c 3
+    for value, count in {"d": 12, "e": 8, "a": 5, "b": 5}.items():
+        if value in top_k.counts:
+            assert top_k.counts[value] - top_k.errors[value] <= count
+            assert count <= top_k.counts[value]
+        else:
+            assert count <= top_k.min_count
+
+
+def test_quantile_sketch_accuracy_and_merge():
+    values = np.random.default_rng(0).normal(size=200_000)
+    sorted_values = np.sort(values)
+    q = np.linspace(0.005, 0.995, 199)
+
+    merged = QuantileSketch()
+    for chunk in np.array_split(values, 20):
+        sketch = QuantileSketch()
+        sketch.update(chunk)
+        merged.merge(sketch)
+
+    ranks = np.searchsorted(sorted_values, merged.quantile(q)) / len(values)
+
+    assert merged.count == len(values)
+    assert np.abs(ranks - q).max() < 0.01
+    assert merged.cdf(0.0) == pytest.approx(0.5, abs=0.01)
+    assert QuantileSketch.from_bytes(merged.to_bytes()) == merged
+    # 0.6745 for a standard normal distribution
+    assert merged.median_absolute_deviation() == pytest.approx(
+        np.median(np.abs(values - np.median(values))), abs=0.02
+    )
+
+
+def test_baseline_sketch_tail_accuracy():
+    values = np.random.default_rng(0).lognormal(size=1_000_000)
+
+    merged = QuantileSketch(k=BASELINE_SKETCH_K)
+    for chunk in np.array_split(values, 20):
+        sketch = QuantileSketch(k=BASELINE_SKETCH_K)
+        sketch.update(chunk)
+        merged.merge(sketch)
+
+    lower, upper = merged.quantile([0.005, 0.995])
+
+    # the share of values outside p0.5/p99.5 bounds, within 10% of 0.5%
+    assert (values < lower).mean() == pytest.approx(0.005, rel=0.1)
+    assert (values > upper).mean() == pytest.approx(0.005, rel=0.1)
+
+
+def test_histogram_from_sketch():
+    sketch = QuantileSketch()
+    sketch.update(np.array([1.0, 2.0, 2.0, 3.0, np.nan]))
+
+    histogram = Histogram.from_sketch(sketch, bins=2)
+
+    assert histogram.edges.tolist() == [1.0, 2.0, 3.0]
+    assert histogram.counts.sum() == 4
+    assert Histogram.from_bytes(histogram.to_bytes()) == histogram